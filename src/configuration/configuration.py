@@ -205,6 +205,17 @@ class configuration(object):
             ('inp_norm', 'MINMAX', 'Input-Output', 'inp_norm'),
             ('out_norm', 'MINMAX', 'Input-Output', 'out_norm'),
 
+            ## memory-mapped loading of feature files: None, r (read-only) or c (copy-on-write)
+            ('mmap_mode', 'None', 'Input-Output', 'mmap_mode'),
+            ## write a header with the shape and stream layout into intermediate feature files
+            ('feature_headers', False, 'Input-Output', 'feature_headers'),
+            ## storage of normalised feature files: float32, float16, int16 or uint8
+            ('normalised_storage', 'float32', 'Input-Output', 'normalised_storage'),
+            ## feature files read ahead on background threads by the per-file loops (0 to disable),
+            ## and the memory in MB they may hold
+            ('prefetch_depth', 4, 'Input-Output', 'prefetch_depth'),
+            ('prefetch_memory', 512, 'Input-Output', 'prefetch_memory'),
+
             ## for joint duration
             ('in_seq_dur_dir' , os.path.join(self.work_dir, 'data/S2S_dur')  , 'Paths', 'in_seq_dur_dir'),
             ('in_dur_dir'     , os.path.join(self.work_dir, 'data/dur')      , 'Paths', 'in_dur_dir'),
@@ -212,6 +223,10 @@ class configuration(object):
 
             ('nn_norm_temp_dir', os.path.join(self.work_dir, 'data/step_hidden9'), 'Paths', 'nn_norm_temp_dir'),
 
+            ## intermediate feature directories to pack into a single file plus index each,
+            ## from binary_label, nn_no_silence_lab, nn_no_silence_lab_norm, nn and nn_norm
+            ('feature_archives', [], 'Paths', 'feature_archives'),
+
             ('process_labels_in_work_dir', False, 'Labels', 'process_labels_in_work_dir'),
 
 
@@ -241,6 +256,12 @@ class configuration(object):
 
             ('precompile_xpaths', True, 'Labels', 'precompile_xpaths'),
             ('iterate_over_frames', True, 'Labels', 'iterate_over_frames'),
+            ## also keeps the non-silent frame ranges of the alignment and binary label files
+            ('label_cache_dir', 'None', 'Labels', 'label_cache_dir'),
+            ('label_context_table', False, 'Labels', 'label_context_table'),
+            ('sparse_label_files', False, 'Labels', 'sparse_label_files'),
+            ('label_normalisation_backend', 'auto', 'Labels', 'label_normalisation_backend'),
+            ('label_normalisation_workers', 0, 'Labels', 'label_normalisation_workers'),
 
             ('appended_input_dim'   ,  0                   ,  'Labels'       ,  'appended_input_dim'),
 
@@ -249,6 +270,16 @@ class configuration(object):
             ('train_file_number', impossible_int, 'Data','train_file_number'),
             ('valid_file_number', impossible_int, 'Data','valid_file_number'),
             ('test_file_number' , impossible_int, 'Data','test_file_number'),
+            ## worker processes for feature normalisation: its statistics pass and the (de)normalisation of the files (0 uses all cores)
+            ('normalisation_workers', 1, 'Data', 'normalisation_workers'),
+            ## remove silence (with HTS labels), gather statistics and normalise while composing the acoustic features
+            ('fused_cmp_normalisation', False, 'Data', 'fused_cmp_normalisation'),
+            ## worker processes for the acoustic composition (MAKECMP); 0 uses all the CPUs available, within any container CPU quota
+            ('composition_workers', 0, 'Data', 'composition_workers'),
+            ## keep the silence-trimmed reference features in memory for CALMCD instead of writing them to ref_data
+            ('keep_reference_data_in_memory', False, 'Data', 'keep_reference_data_in_memory'),
+            ## threads reading and scoring the utterances for CALMCD (0 uses all cores)
+            ('evaluation_workers', 0, 'Data', 'evaluation_workers'),
 
             ('log_path', os.path.join(self.work_dir, 'log'), 'Paths', 'log_path'),
             ('log_file', '', 'Paths','log_file'),
@@ -349,6 +380,7 @@ class configuration(object):
             ('delta_win'        , [-0.5, 0.0, 0.5]  , 'Outputs', 'delta_win'),
             ('acc_win'          , [1.0, -2.0, 1.0]  , 'Outputs', 'acc_win'),
             ('do_MLPG'          , True              , 'Outputs', 'do_MLPG'),
+            ('param_gen_workers', 1                 , 'Outputs', 'param_gen_workers'),
 
             ## for GlottHMM:
             ('F0_dim' ,1     ,'Outputs','F0'),
@@ -395,6 +427,9 @@ class configuration(object):
             ('dur_feat_size' , 'phoneme' , 'Outputs', 'dur_feat_size'),
 
             ('output_feature_normalisation', 'MVN', 'Outputs', 'output_feature_normalisation'),
+            ## per-stream methods (MVN, MINMAX or none), e.g. {'mgc': 'MVN', 'vuv': 'none', 'bap': 'MINMAX'};
+            ## streams left out use output_feature_normalisation
+            ('output_stream_normalisation', {}, 'Outputs', 'output_stream_normalisation'),
 
             ('multistream_switch'  , False , 'Streams', 'multistream_switch'),
 #            ('use_private_hidden'  , False, 'Streams', 'use_private_hidden'),
@@ -901,6 +936,21 @@ class configuration(object):
 
         logger.info('multistream dimensions: %s' %(self.multistream_outs))
 
+        ## a per-stream scheme replaces the single output normalisation; hmpd pdd values are in 0 to 1
+        ## and left as they are unless configured otherwise
+        if self.output_stream_normalisation:
+            stream_methods = {}
+            for feature_name in list(self.out_dimension_dict.keys()):
+                if feature_name in self.output_stream_normalisation:
+                    stream_methods[feature_name] = self.output_stream_normalisation[feature_name]
+                elif feature_name == 'pdd' and self.vocoder_type == 'hmpd':
+                    stream_methods[feature_name] = 'none'
+                else:
+                    stream_methods[feature_name] = self.output_feature_normalisation
+            self.output_stream_normalisation = stream_methods
+            self.output_feature_normalisation = 'STREAM'
+            logger.info('per-stream output normalisation: %s' %(self.output_stream_normalisation))
+
         # to check whether all the input and output features' file extensions are here
         self.file_extension_dict = {}
         self.file_extension_dict['mgc'] = self.mgc_ext
@@ -54,6 +54,9 @@ class   AcousticBase(object):
         self.out_dimension = 0
         self.record_vuv    = False
 
+        ## (output file, seconds) of each utterance of the last prepare_nn_data call
+        self.file_timings = []
+
         self.delta_win = delta_win
         self.acc_win   = acc_win
 
@@ -69,7 +72,15 @@ class   AcousticBase(object):
         DIY     : raw data without header, such the data to compose CMP files
         CMP_DIY : mix of CMP and DIY data
     '''
-    def prepare_nn_data(self, in_file_list_dict, out_file_list, in_dimension_dict, out_dimension_dict):
+    def prepare_nn_data(self, in_file_list_dict, out_file_list, in_dimension_dict, out_dimension_dict,
+                        silence_remover=None, align_file_list=None, statistics_flags=None, normaliser=None, norm_file_list=None):
+        '''
+        composes the input streams of each utterance into out_file_list. The optional arguments fuse
+        the following steps into the same pass over the composed features, so they need not be read back:
+            silence_remover, align_file_list: keep only the non-silent frames of each utterance
+            statistics_flags: returns the FeatureStatistics of the files whose flag is True
+            normaliser, norm_file_list: also writes the features normalised by normaliser.normalise_features
+        '''
 
         self.file_number = len(out_file_list)
 
@@ -119,46 +130,75 @@ class   AcousticBase(object):
             self.out_dimension += out_dimension_dict[data_stream_name]
 
         ### merge the data: like the cmp file
-        self.prepare_data(in_file_list_dict, out_file_list, in_dimension_dict, out_dimension_dict)
+        return  self.prepare_data(in_file_list_dict, out_file_list, in_dimension_dict, out_dimension_dict,
+                                  silence_remover, align_file_list, statistics_flags, normaliser, norm_file_list)
 
     ### the real function to do the work
     ### need to be implemented for a specific format
-    def prepare_data(self, in_file_list_dict, out_file_list, in_dimension_dict, out_dimension_dict):
+    def prepare_data(self, in_file_list_dict, out_file_list, in_dimension_dict, out_dimension_dict,
+                     silence_remover=None, align_file_list=None, statistics_flags=None, normaliser=None, norm_file_list=None):
         pass
 
     ### interpolate F0, if F0 has already been interpolated, nothing will be changed after passing this function
     def interpolate_f0(self, data):
+        ## each run of unvoiced frames is interpolated linearly between the voiced frames around it,
+        ## or filled with the next voiced value if there is none before it; a run reaching the last or
+        ## the one-but-last frame is filled, up to the last frame, with the voiced value before it
 
-        data = numpy.reshape(data, (data.size, 1))
+        ## interpolated in a copy: the features may be a read-only memory map (BinaryIOCollection.mmap_mode)
+        data = numpy.array(data).reshape((data.size, 1))
 
         vuv_vector = numpy.zeros((data.size, 1))
         vuv_vector[data > 0.0] = 1.0
         vuv_vector[data <= 0.0] = 0.0
 
         ip_data = data
+        values = ip_data[:, 0]
 
         frame_number = data.size
-        last_value = 0.0
-        for i in range(frame_number):
-            if data[i] <= 0.0:
-                j = i+1
-                for j in range(i+1, frame_number):
-                    if data[j] > 0.0:
-                        break
-                if j < frame_number-1:
-                    if last_value > 0.0:
-                        step = (data[j] - data[i-1]) / float(j - i + 1)
-                        for k in range(i, j):
-                            ip_data[k] = data[i-1] + step * (k - i + 1)
-                    else:
-                        for k in range(i, j):
-                            ip_data[k] = data[j]
-                else:
-                    for k in range(i, frame_number):
-                        ip_data[k] = last_value
-            else:
-                ip_data[i] = data[i]
-                last_value = data[i]
+        unvoiced_index = numpy.flatnonzero(values <= 0.0)
+        if unvoiced_index.size == 0:
+            return  ip_data, vuv_vector
+
+        ## runs [run_starts, run_ends) from an unvoiced frame up to the next voiced (> 0) one; other
+        ## values that are not > 0 (NaN) inside a run are overwritten too
+        segment_edges = numpy.flatnonzero(numpy.diff(numpy.concatenate(([0], (~(values > 0.0)).astype(numpy.int8), [0]))))
+        segment_starts = segment_edges[0::2]
+        segment_ends = segment_edges[1::2]
+        (segment_index, first_unvoiced) = numpy.unique(numpy.searchsorted(segment_starts, unvoiced_index, side='right') - 1, return_index=True)
+        run_starts = unvoiced_index[first_unvoiced]
+        run_ends = segment_ends[segment_index]
+
+        ## the voiced value before each run, 0 for a run at the start
+        last_values = numpy.zeros(run_starts.size, dtype=values.dtype)
+        last_values[run_starts > 0] = values[run_starts[run_starts > 0] - 1]
+
+        trailing_value = None
+        if run_ends[-1] >= frame_number - 1:
+            trailing_start = run_starts[-1]
+            trailing_value = last_values[-1]
+            run_starts = run_starts[:-1]
+            run_ends = run_ends[:-1]
+            last_values = last_values[:-1]
+
+        if run_starts.size > 0:
+            run_lengths = run_ends - run_starts
+            next_values = values[run_ends]
+
+            ## every frame of the runs, with the values of its run
+            run_index = numpy.repeat(numpy.arange(run_starts.size), run_lengths)
+            frame_index = numpy.arange(run_lengths.sum()) - numpy.repeat(numpy.cumsum(run_lengths) - run_lengths, run_lengths)
+            frame_last_values = last_values[run_index]
+            frame_next_values = next_values[run_index]
+
+            step = (frame_next_values - frame_last_values) / (run_lengths[run_index] + 1).astype(values.dtype)
+            run_values = numpy.where(frame_last_values > 0.0,
+                                     frame_last_values + step * (frame_index + 1).astype(values.dtype),
+                                     frame_next_values)
+            values[run_starts[run_index] + frame_index] = run_values
+
+        if trailing_value is not None:
+            values[trailing_start:] = trailing_value
 
         return  ip_data, vuv_vector
 
@@ -168,28 +208,20 @@ class   AcousticBase(object):
 
         vector = numpy.reshape(vector, (frame_number, 1))
 
-        win_length = len(dynamic_win)
-        win_width = int(win_length/2)
-        temp_vector = numpy.zeros((frame_number + 2 * win_width, 1))
-        delta_vector = numpy.zeros((frame_number, 1))
-
-        temp_vector[win_width:frame_number+win_width] = vector
-        for w in range(win_width):
-            temp_vector[w, 0] = vector[0, 0]
-            temp_vector[frame_number+win_width+w, 0] = vector[frame_number-1, 0]
-
-        for i in range(frame_number):
-            for w in range(win_length):
-                delta_vector[i] += temp_vector[i+w, 0] * dynamic_win[w]
-
-        return  delta_vector
+        return  self.compute_dynamic_matrix(vector, dynamic_win, frame_number, 1)
 
     ### compute dynamic features for a data matrix
     def compute_dynamic_matrix(self, data_matrix, dynamic_win, frame_number, dimension):
-        dynamic_matrix = numpy.zeros((frame_number, dimension))
+        ## all dimensions at once: the window is correlated with the frames, padded at both ends
+        ## by repeating the first and last frame
+        data_matrix = numpy.reshape(data_matrix, (frame_number, dimension))
+
+        win_length = len(dynamic_win)
+        win_width = int(win_length/2)
+        temp_matrix = numpy.pad(numpy.asarray(data_matrix, dtype=numpy.float64), ((win_width, win_width), (0, 0)), mode='edge')
 
-        ###compute dynamic feature dimension by dimension
-        for dim in range(dimension):
-            dynamic_matrix[:, dim:dim+1] = self.compute_dynamic_vector(data_matrix[:, dim], dynamic_win, frame_number)
+        dynamic_matrix = numpy.zeros((frame_number, dimension))
+        for w in range(win_length):
+            dynamic_matrix += temp_matrix[w:w+frame_number] * dynamic_win[w]
 
         return  dynamic_matrix
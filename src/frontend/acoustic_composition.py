@@ -39,12 +39,16 @@
 
 try:
     from io_funcs.binary_io import BinaryIOCollection
+    from io_funcs.prefetch_reader import PrefetchReader
 except ModuleNotFoundError:
     from ..io_funcs.binary_io import BinaryIOCollection
+    from ..io_funcs.prefetch_reader import PrefetchReader
 import numpy
 import logging
 from .acoustic_base import AcousticBase
-import os
+from .feature_statistics import FeatureStatistics
+from .silence_remover import select_frame_ranges
+import os, time
 #io_funcs.
 
 class   AcousticComposition(AcousticBase):
@@ -74,26 +78,30 @@ class   AcousticComposition(AcousticBase):
             in_file_name = in_file_list[i]
             in_data_stream_name = in_file_name.split('.')[-1]
             in_feature_dim = in_dimension_dict[in_data_stream_name]
-            in_features, in_frame_number = io_funcs.load_binary_file_frame(in_file_name, in_feature_dim)
+            in_frame_number, in_feature_dim = io_funcs.stat_features(in_file_name, in_feature_dim)
 
             ref_file_name = ref_file_list[i]
             ref_data_stream_name = ref_file_name.split('.')[-1]
             ref_feature_dim = in_dimension_dict[ref_data_stream_name]
-            ref_features, ref_frame_number = io_funcs.load_binary_file_frame(ref_file_name, ref_feature_dim)
+            ref_frame_number, ref_feature_dim = io_funcs.stat_features(ref_file_name, ref_feature_dim)
 
-            target_features = numpy.zeros((ref_frame_number, in_feature_dim))
             if in_frame_number == ref_frame_number:
                 continue;
-            elif in_frame_number > ref_frame_number:
+            in_features, in_frame_number = io_funcs.load_binary_file_frame(in_file_name, in_feature_dim)
+
+            target_features = numpy.zeros((ref_frame_number, in_feature_dim))
+            if in_frame_number > ref_frame_number:
                 target_features[0:ref_frame_number, ] = in_features[0:ref_frame_number, ]
             elif in_frame_number < ref_frame_number:
                 target_features[0:in_frame_number, ] = in_features[0:in_frame_number, ]
-            io_funcs.array_to_binary_file(target_features, in_file_name)
+            ## these are the input acoustic features, which external tools read too
+            io_funcs.array_to_binary_file(target_features, in_file_name, header=False)
 
         logger.info('Finished: made equal rows in data stream %s with reference to data stream %s ' %(in_data_stream_name, ref_data_stream_name))
 
 
-    def prepare_data(self, in_file_list_dict, out_file_list, in_dimension_dict, out_dimension_dict):
+    def prepare_data(self, in_file_list_dict, out_file_list, in_dimension_dict, out_dimension_dict,
+                     silence_remover=None, align_file_list=None, statistics_flags=None, normaliser=None, norm_file_list=None):
 
         logger = logging.getLogger("acoustic_comp")
 
@@ -105,9 +113,22 @@ class   AcousticComposition(AcousticBase):
 
             stream_dim_index += out_dimension_dict[stream_name]
 
+        ## the columns of the output files, recorded in their header
+        stream_layout = [(stream_name, out_dimension_dict[stream_name]) for stream_name in stream_start_index]
+
         io_funcs = BinaryIOCollection()
 
-        for i in range(self.file_number):
+        statistics = None
+        if statistics_flags is not None:
+            statistics = FeatureStatistics(self.out_dimension)
+
+        ## all the streams of an utterance are read ahead together
+        file_reader = PrefetchReader(range(self.file_number), lambda i: [io_funcs.load_binary_file_frame(in_file_list_dict[data_stream_name][i], in_dimension_dict[data_stream_name])
+                                                                         for data_stream_name in self.data_stream_list])
+        ## seconds spent on each utterance, including waiting for its streams to be read
+        self.file_timings = []
+        start_time = time.time()
+        for (i, stream_features) in enumerate(file_reader):
             out_file_name = out_file_list[i]
 
             #if os.path.isfile(out_file_name):
@@ -122,13 +143,12 @@ class   AcousticComposition(AcousticBase):
 
             for k in range(self.data_stream_number):
                 data_stream_name = self.data_stream_list[k]
-                in_file_name   = in_file_list_dict[data_stream_name][i]
                 in_feature_dim = in_dimension_dict[data_stream_name]
-                features, frame_number = io_funcs.load_binary_file_frame(in_file_name, in_feature_dim)
+                features, frame_number = stream_features[k]
 
                 if k == 0:
                     out_frame_number = frame_number
-                    out_data_matrix = numpy.zeros((out_frame_number, self.out_dimension))
+                    out_data_matrix = numpy.zeros((out_frame_number, self.out_dimension), dtype=numpy.float32)
 
                 if frame_number > out_frame_number:
                     features = features[0:out_frame_number, ]
@@ -164,9 +184,26 @@ class   AcousticComposition(AcousticBase):
 
                     out_data_matrix[0:out_frame_number, dim_index:dim_index+in_feature_dim] = acc_features
 
+            if silence_remover is not None:
+                nonsilence_ranges = silence_remover.nonsilence_frame_ranges(align_file_list[i], out_frame_number)
+                out_data_matrix = select_frame_ranges(out_data_matrix, nonsilence_ranges)
+
             ### write data to file
-            io_funcs.array_to_binary_file(out_data_matrix, out_file_name)
-            logger.debug(' wrote %d frames of features',out_frame_number )
+            io_funcs.array_to_binary_file(out_data_matrix, out_file_name, stream_layout=stream_layout)
+            logger.debug(' wrote %d frames of features',out_data_matrix.shape[0] )
+
+            if statistics is not None and statistics_flags[i]:
+                statistics.update(out_data_matrix)
+
+            if normaliser is not None:
+                norm_features = normaliser.normalise_features(out_data_matrix, in_place=True)
+                io_funcs.array_to_binary_file(norm_features, norm_file_list[i], storage=io_funcs.normalised_storage)
+
+            end_time = time.time()
+            self.file_timings.append((out_file_name, end_time - start_time))
+            start_time = end_time
+
+        return  statistics
 
     def acoustic_decomposition(self, in_file_list, out_dimension_dict, file_extension_dict):
 
@@ -74,7 +74,8 @@ class CMPNormalisation(object):
 
     def interpolate_f0(self, data):
 
-        data = numpy.reshape(data, (data.size, 1))
+        ## interpolated in a copy: the features may be a read-only memory map (BinaryIOCollection.mmap_mode)
+        data = numpy.array(data).reshape((data.size, 1))
 
         vuv_vector = numpy.zeros((data.size, 1))
         vuv_vector[data > 0.0] = 1.0
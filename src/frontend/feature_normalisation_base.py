@@ -41,8 +41,10 @@
 import numpy
 try:
     from io_funcs.binary_io import BinaryIOCollection
+    from io_funcs.prefetch_reader import PrefetchReader
 except ModuleNotFoundError:
     from ..io_funcs.binary_io import BinaryIOCollection
+    from ..io_funcs.prefetch_reader import PrefetchReader
 
 import logging
 
@@ -78,16 +80,15 @@ class FeatureNormBase(object):
         io_funcs = BinaryIOCollection()
         file_number = len(in_file_list)
 
-        for i in range(file_number):
-
-            features, current_frame_number = io_funcs.load_binary_file_frame(in_file_list[i], self.feature_dimension)
+        file_reader = PrefetchReader(in_file_list, lambda file_name: io_funcs.load_binary_file_frame(file_name, self.feature_dimension))
+        for (i, (features, current_frame_number)) in enumerate(file_reader):
 
             mean_matrix = numpy.tile(mean_vector, (current_frame_number, 1))
             std_matrix = numpy.tile(std_vector, (current_frame_number, 1))
 
             norm_features = (features - mean_matrix) / std_matrix
 
-            io_funcs.array_to_binary_file(norm_features, out_file_list[i])
+            io_funcs.array_to_binary_file(norm_features, out_file_list[i], storage=io_funcs.normalised_storage)
 
         return  mean_vector, std_vector
 
@@ -99,8 +100,8 @@ class FeatureNormBase(object):
         min_value_matrix = numpy.zeros((file_number, local_feature_dimension))
         max_value_matrix = numpy.zeros((file_number, local_feature_dimension))
         io_funcs = BinaryIOCollection()
-        for i in range(file_number):
-            features = io_funcs.load_binary_file(in_file_list[i], self.feature_dimension)
+        file_reader = PrefetchReader(in_file_list, lambda file_name: io_funcs.load_binary_file(file_name, self.feature_dimension))
+        for (i, features) in enumerate(file_reader):
 
             temp_min = numpy.amin(features[:, start_index:end_index], axis = 0)
             temp_max = numpy.amax(features[:, start_index:end_index], axis = 0)
@@ -129,8 +130,8 @@ class FeatureNormBase(object):
         all_frame_number = 0
 
         io_funcs = BinaryIOCollection()
-        for file_name in file_list:
-            features, current_frame_number = io_funcs.load_binary_file_frame(file_name, self.feature_dimension)
+        file_reader = PrefetchReader(file_list, lambda file_name: io_funcs.load_binary_file_frame(file_name, self.feature_dimension))
+        for (features, current_frame_number) in file_reader:
 
             mean_vector += numpy.reshape(numpy.sum(features[:, start_index:end_index], axis=0), (1, local_feature_dimension))
             all_frame_number += current_frame_number
@@ -153,8 +154,8 @@ class FeatureNormBase(object):
         all_frame_number = 0
 
         io_funcs = BinaryIOCollection()
-        for file_name in file_list:
-            features, current_frame_number = io_funcs.load_binary_file_frame(file_name, self.feature_dimension)
+        file_reader = PrefetchReader(file_list, lambda file_name: io_funcs.load_binary_file_frame(file_name, self.feature_dimension))
+        for (features, current_frame_number) in file_reader:
 
             mean_matrix = numpy.tile(mean_vector, (current_frame_number, 1))
 
@@ -0,0 +1,138 @@
+################################################################################
+#           The Neural Network (NN) based Speech Synthesis System
+#                https://svn.ecdf.ed.ac.uk/repo/inf/dnn_tts/
+#
+#                Centre for Speech Technology Research
+#                     University of Edinburgh, UK
+#                      Copyright (c) 2014-2015
+#                        All Rights Reserved.
+#
+# The system as a whole and most of the files in it are distributed
+# under the following copyright and conditions
+#
+#  Permission is hereby granted, free of charge, to use and distribute
+#  this software and its documentation without restriction, including
+#  without limitation the rights to use, copy, modify, merge, publish,
+#  distribute, sublicense, and/or sell copies of this work, and to
+#  permit persons to whom this work is furnished to do so, subject to
+#  the following conditions:
+#
+#   - Redistributions of source code must retain the above copyright
+#     notice, this list of conditions and the following disclaimer.
+#   - Redistributions in binary form must reproduce the above
+#     copyright notice, this list of conditions and the following
+#     disclaimer in the documentation and/or other materials provided
+#     with the distribution.
+#   - The authors' names may not be used to endorse or promote products derived
+#     from this software without specific prior written permission.
+#
+#  THE UNIVERSITY OF EDINBURGH AND THE CONTRIBUTORS TO THIS WORK
+#  DISCLAIM ALL WARRANTIES WITH REGARD TO THIS SOFTWARE, INCLUDING
+#  ALL IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS, IN NO EVENT
+#  SHALL THE UNIVERSITY OF EDINBURGH NOR THE CONTRIBUTORS BE LIABLE
+#  FOR ANY SPECIAL, INDIRECT OR CONSEQUENTIAL DAMAGES OR ANY DAMAGES
+#  WHATSOEVER RESULTING FROM LOSS OF USE, DATA OR PROFITS, WHETHER IN
+#  AN ACTION OF CONTRACT, NEGLIGENCE OR OTHER TORTIOUS ACTION,
+#  ARISING OUT OF OR IN CONNECTION WITH THE USE OR PERFORMANCE OF
+#  THIS SOFTWARE.
+################################################################################
+
+
+import multiprocessing
+import numpy
+try:
+    from io_funcs.binary_io import BinaryIOCollection
+    from io_funcs.prefetch_reader import PrefetchReader
+    from utils.utils import effective_cpu_count
+except ModuleNotFoundError:
+    from ..io_funcs.binary_io import BinaryIOCollection
+    from ..io_funcs.prefetch_reader import PrefetchReader
+    from ..utils.utils import effective_cpu_count
+
+
+def _file_list_statistics(args):
+    (file_list, dimension) = args
+    io_funcs = BinaryIOCollection()
+    statistics = FeatureStatistics(dimension)
+    for features in PrefetchReader(file_list, lambda file_name: io_funcs.load_binary_file(file_name, dimension)):
+        statistics.update(features)
+    return statistics
+
+def compute_file_statistics(file_list, dimension, num_workers=1):
+    '''
+    FeatureStatistics of all frames of the feature files in file_list, each read once.
+    With num_workers other than 1 the files are split over that many worker processes
+    (0 uses all cores), whose partial statistics are merged in file order.
+    '''
+    if num_workers == 0:
+        num_workers = effective_cpu_count()
+    if num_workers <= 1 or len(file_list) < 2:
+        return _file_list_statistics((file_list, dimension))
+
+    ## several chunks per worker so that workers finishing early pick up more
+    chunk_number = min(len(file_list), num_workers * 4)
+    chunk_bounds = numpy.linspace(0, len(file_list), chunk_number + 1).astype(int)
+    chunks = [(file_list[chunk_bounds[k]:chunk_bounds[k+1]], dimension) for k in range(chunk_number)]
+
+    pool = multiprocessing.Pool(num_workers)
+    statistics = FeatureStatistics(dimension)
+    for chunk_statistics in pool.imap(_file_list_statistics, chunks):
+        statistics.merge(chunk_statistics)
+    pool.close()
+    pool.join()
+
+    return statistics
+
+
+class FeatureStatistics(object):
+    '''
+    Frame count, mean, variance, minimum and maximum per dimension of a set of feature
+    frames, accumulated in a single pass over the data. update() adds a block of frames and
+    merge() adds the statistics of another, disjoint set of frames, using the pairwise update
+    of Chan et al. for the mean and the sum of squared deviations, so partial statistics
+    computed in separate processes can be combined.
+    '''
+    def __init__(self, dimension):
+        self.dimension = dimension
+        self.frame_number = 0
+        self.mean_vector = numpy.zeros(dimension)
+        ## sum of squared deviations from the mean
+        self.square_sum_vector = numpy.zeros(dimension)
+        self.min_vector = numpy.full(dimension, numpy.inf)
+        self.max_vector = numpy.full(dimension, -numpy.inf)
+
+    def update(self, features):
+        features = numpy.asarray(features, dtype=numpy.float64).reshape((-1, self.dimension))
+        if features.shape[0] == 0:
+            return self
+
+        block_statistics = FeatureStatistics(self.dimension)
+        block_statistics.frame_number = features.shape[0]
+        block_statistics.mean_vector = numpy.mean(features, axis=0)
+        block_statistics.square_sum_vector = numpy.sum((features - block_statistics.mean_vector) ** 2, axis=0)
+        block_statistics.min_vector = numpy.amin(features, axis=0)
+        block_statistics.max_vector = numpy.amax(features, axis=0)
+
+        return self.merge(block_statistics)
+
+    def merge(self, other):
+        if other.frame_number == 0:
+            return self
+
+        frame_number = self.frame_number + other.frame_number
+        delta_vector = other.mean_vector - self.mean_vector
+        self.mean_vector = self.mean_vector + delta_vector * (other.frame_number / float(frame_number))
+        self.square_sum_vector = self.square_sum_vector + other.square_sum_vector + \
+                                 delta_vector ** 2 * (self.frame_number * float(other.frame_number) / frame_number)
+        self.min_vector = numpy.minimum(self.min_vector, other.min_vector)
+        self.max_vector = numpy.maximum(self.max_vector, other.max_vector)
+        self.frame_number = frame_number
+
+        return self
+
+    def variance(self):
+        ## the population variance, as used for MVN
+        return self.square_sum_vector / float(self.frame_number)
+
+    def std(self):
+        return numpy.sqrt(self.variance())
@@ -1,6 +1,8 @@
 
 import os
 import numpy, re, sys
+import hashlib, pickle, threading
+from collections import OrderedDict
 from multiprocessing import Pool
 
 try:
@@ -9,6 +11,7 @@ except ModuleNotFoundError:
     from ..io_funcs.binary_io import BinaryIOCollection
 
 from .linguistic_base import LinguisticBase
+from .question_matcher import HTSQuestionMatcher
 
 from scipy.stats import norm
 
@@ -22,6 +25,9 @@ class LabelNormalisation(LinguisticBase):
     # this class only knows how to deal with a single style of labels (XML or HTS)
     # (to deal with composite labels, use LabelComposer instead)
 
+    ## write binary label files in the sparse format of BinaryIOCollection.array_to_binary_file
+    sparse_label_files = False
+
     def __init__(self, question_file_name=None,xpath_file_name=None):
         pass
 
@@ -35,7 +41,11 @@ class LabelNormalisation(LinguisticBase):
 
         if out_file_name:
             io_funcs = BinaryIOCollection()
-            io_funcs.array_to_binary_file(A, out_file_name)
+            if self.sparse_label_files:
+                ## the question features are constant over the frames of each state or phone
+                io_funcs.array_to_binary_file(A, out_file_name, sparse_dim=self.dict_size)
+            else:
+                io_funcs.array_to_binary_file(A, out_file_name)
         else:
             return A
 
@@ -70,7 +80,8 @@ class HTSLabelNormalisation(LabelNormalisation):
 
     # this subclass support HTS labels, which include time alignments
 
-    def __init__(self, question_file_name=None, add_frame_features=True, subphone_feats='full', continuous_flag=True):
+    def __init__(self, question_file_name=None, add_frame_features=True, subphone_feats='full', continuous_flag=True,
+                 label_cache_size=100000, label_cache_dir=None, context_table=False, sparse_label_files=False):
 
         logger = logging.getLogger("labels")
 
@@ -90,6 +101,7 @@ class HTSLabelNormalisation(LabelNormalisation):
         self.dict_size = len(self.discrete_dict) + len(self.continuous_dict)
         self.add_frame_features = add_frame_features
         self.subphone_feats = subphone_feats
+        self.sparse_label_files = sparse_label_files
 
         if self.subphone_feats == 'full':
             self.frame_feature_size = 9   ## zhizheng's original 5 state features + 4 phoneme features
@@ -119,6 +131,258 @@ class HTSLabelNormalisation(LabelNormalisation):
 
         logger.debug('HTS-derived input feature dimension is %d + %d = %d' % (self.dict_size, self.frame_feature_size, self.dimension) )
 
+        ## question-set matching results memoised per full-context label (without state suffix):
+        ## the same contexts recur on every state line and across the corpus
+        self.label_cache = OrderedDict()
+        self.label_cache_size = label_cache_size
+        self.label_cache_lock = threading.Lock()
+        self.label_cache_hits = 0
+        self.label_cache_misses = 0
+        ## labels matched in a worker process since its last take_worker_state, which are
+        ## not otherwise seen by the parent's cache; None outside worker processes
+        self.label_cache_new = None
+
+        ## optional on-disk copy of the memo, only valid for an identical question file
+        self.label_cache_file = None
+        if label_cache_dir and label_cache_size > 0:
+            self.label_cache_file = os.path.join(label_cache_dir, 'label_cache_%s.pkl' % self.question_set_hash(question_file_name))
+            self.load_label_cache()
+
+        ## corpus-level table of distinct contexts (see build_context_table), filled before
+        ## normalisation and duration preparation when context_table is set
+        self.use_context_table = context_table
+        self.context_index = {}
+        self.context_binary = numpy.zeros((0, len(self.discrete_dict)), dtype=bool)
+        self.context_continuous = numpy.zeros((0, len(self.continuous_dict)))
+        ## (label file, label_type) -> table row of each of its label lines
+        self.file_context_rows = {}
+
+    def question_set_hash(self, question_file_name):
+        fid = open(question_file_name, 'rb')
+        digest = hashlib.sha1(fid.read()).hexdigest()
+        fid.close()
+        return digest
+
+    def load_label_cache(self):
+        logger = logging.getLogger("labels")
+        if not os.path.isfile(self.label_cache_file):
+            return
+        fid = open(self.label_cache_file, 'rb')
+        cached_labels = pickle.load(fid)
+        fid.close()
+        for label, label_vectors in list(cached_labels.items())[-self.label_cache_size:]:
+            for vector in label_vectors:
+                vector.setflags(write=False)
+            self.label_cache[label] = label_vectors
+        logger.info('loaded %d cached labels from %s' % (len(self.label_cache), self.label_cache_file))
+
+    def save_label_cache(self):
+        logger = logging.getLogger("labels")
+        if not self.label_cache_file:
+            return
+        label_cache_dir = os.path.dirname(self.label_cache_file)
+        if label_cache_dir and not os.path.isdir(label_cache_dir):
+            os.makedirs(label_cache_dir)
+        temp_file_name = '%s.tmp%d' % (self.label_cache_file, os.getpid())
+        fid = open(temp_file_name, 'wb')
+        with self.label_cache_lock:
+            pickle.dump(dict(self.label_cache), fid, protocol=pickle.HIGHEST_PROTOCOL)
+        fid.close()
+        os.replace(temp_file_name, self.label_cache_file)
+        logger.info('saved %d cached labels to %s' % (len(self.label_cache), self.label_cache_file))
+
+    def label_cache_stats(self):
+        return {'hits': self.label_cache_hits, 'misses': self.label_cache_misses, 'size': len(self.label_cache),
+                'contexts': len(self.context_index)}
+
+    def log_label_cache_stats(self):
+        logger = logging.getLogger("labels")
+        stats = self.label_cache_stats()
+        lookups = stats['hits'] + stats['misses']
+        logger.info('label cache: %d hits, %d misses (%.1f%% hit rate), %d labels cached, %d contexts in table' %
+                    (stats['hits'], stats['misses'], 100.0 * stats['hits'] / max(lookups, 1), stats['size'], stats['contexts']))
+
+    def read_label_contexts(self, file_name, label_type="state_align"):
+        ## the full-context labels of a label file, as passed to pattern_matching_label
+        contexts = []
+        with open(file_name) as fid:
+            for line in fid:
+                line = line.strip()
+                if len(line) < 1:
+                    continue
+                temp_list = re.split('\s+', line)
+                if len(temp_list) == 1:
+                    contexts.append(temp_list[0])
+                elif label_type == "state_align":
+                    contexts.append(temp_list[2][0:len(temp_list[2])-3])  # remove state information [k]
+                else:
+                    contexts.append(temp_list[2])
+        return contexts
+
+    ## distinct contexts matched per task when build_context_table is given a pool
+    context_chunk_size = 500
+
+    def build_context_table(self, file_list, label_type="state_align", pool=None):
+        '''
+        collects the distinct full-context labels of all the files and evaluates the question set
+        once for each new one, in chunks on the workers of pool (see LinguisticBase.map_on_workers)
+        if one is given, into a dense table of context vectors. The row of each label line of each file
+        is kept, so that file_label_vectors gathers the vectors of a whole utterance at once.
+        The table is extended by later calls.
+        '''
+        logger = logging.getLogger("labels")
+
+        new_contexts = {}
+        for file_name in file_list:
+            rows = []
+            for context in self.read_label_contexts(file_name, label_type):
+                row = self.context_index.get(context)
+                if row is None:
+                    row = new_contexts.setdefault(context, len(self.context_index) + len(new_contexts))
+                rows.append(row)
+            self.file_context_rows[(file_name, label_type)] = numpy.array(rows, dtype=int)
+
+        contexts = list(new_contexts)
+        context_chunks = [(contexts[k:k+self.context_chunk_size],) for k in range(0, len(contexts), self.context_chunk_size)]
+        matched_chunks = self.map_on_workers(pool, 'match_contexts', context_chunks)
+
+        self.context_binary = numpy.concatenate([self.context_binary] + [chunk_binary for (chunk_binary, _) in matched_chunks], axis=0)
+        self.context_continuous = numpy.concatenate([self.context_continuous] + [chunk_continuous for (_, chunk_continuous) in matched_chunks], axis=0)
+        self.context_continuous.setflags(write=False)
+        self.context_index.update(new_contexts)
+
+        logger.info('context table: %d distinct contexts in %d files (%d new)' % (len(self.context_index), len(file_list), len(new_contexts)))
+
+    def match_contexts(self, contexts):
+        ## the binary and continuous question vectors of each of contexts, as rows of the context table
+        context_binary = numpy.zeros((len(contexts), self.context_binary.shape[1]), dtype=bool)
+        context_continuous = numpy.zeros((len(contexts), self.context_continuous.shape[1]))
+        for (row, context) in enumerate(contexts):
+            label_binary_vector, label_continuous_vector = self.question_matcher.match(context)
+            context_binary[row] = label_binary_vector[0]
+            context_continuous[row] = label_continuous_vector[0]
+        return context_binary, context_continuous
+
+    def file_label_vectors(self, file_name, label_type):
+        '''
+        the binary and continuous question vectors of every label line of file_name, gathered from
+        the context table, or None if build_context_table has not seen the file
+        '''
+        rows = self.file_context_rows.get((file_name, label_type))
+        if rows is None:
+            return None
+        return self.context_binary[rows].astype(numpy.float64), self.context_continuous[rows]
+
+    def line_label_vectors(self, label, utterance_vectors, line_number):
+        ## the question vectors of one label line, from the file_label_vectors of its file if there are any
+        if utterance_vectors is None:
+            return self.pattern_matching_label(label)
+        return utterance_vectors[0][line_number:line_number+1], utterance_vectors[1][line_number:line_number+1]
+
+    def pattern_matching_label(self, label):
+        '''
+        returns the binary and continuous question vectors for one full-context label,
+        memoised so that each distinct label is only matched against the question set once.
+        The returned arrays are shared and read-only.
+        '''
+        with self.label_cache_lock:
+            label_vectors = self.label_cache.get(label)
+            if label_vectors is not None:
+                self.label_cache.move_to_end(label)
+                self.label_cache_hits += 1
+                return label_vectors
+            self.label_cache_misses += 1
+
+        # same result as pattern_matching_binary and pattern_matching_continous_position;
+        # if there is no CQS question, the label_continuous_vector will become to empty
+        label_binary_vector, label_continuous_vector = self.question_matcher.match(label)
+        label_binary_vector.setflags(write=False)
+        label_continuous_vector.setflags(write=False)
+        label_vectors = (label_binary_vector, label_continuous_vector)
+
+        if self.label_cache_size > 0:
+            with self.label_cache_lock:
+                self.add_cached_label(label, label_vectors)
+                if self.label_cache_new is not None:
+                    ## no more than the parent's cache would keep
+                    self.label_cache_new[label] = label_vectors
+                    if len(self.label_cache_new) > self.label_cache_size:
+                        self.label_cache_new.popitem(last=False)
+
+        return label_vectors
+
+    def add_cached_label(self, label, label_vectors):
+        ## called with label_cache_lock held
+        self.label_cache[label] = label_vectors
+        self.label_cache.move_to_end(label)
+        if len(self.label_cache) > self.label_cache_size:
+            self.label_cache.popitem(last=False)
+
+    def start_worker(self):
+        ## the counters of a worker process only count its own lookups
+        self.label_cache_hits = 0
+        self.label_cache_misses = 0
+        self.label_cache_new = OrderedDict()
+
+    def take_worker_state(self):
+        with self.label_cache_lock:
+            worker_state = {'hits': self.label_cache_hits, 'misses': self.label_cache_misses, 'labels': self.label_cache_new}
+            self.label_cache_hits = 0
+            self.label_cache_misses = 0
+            self.label_cache_new = OrderedDict()
+        return worker_state
+
+    def merge_worker_state(self, worker_state):
+        with self.label_cache_lock:
+            self.label_cache_hits += worker_state['hits']
+            self.label_cache_misses += worker_state['misses']
+            if self.label_cache_size > 0:
+                for (label, label_vectors) in worker_state['labels'].items():
+                    for vector in label_vectors:
+                        vector.setflags(write=False)
+                    self.add_cached_label(label, label_vectors)
+
+    def perform_normalisation(self, ori_file_list, output_file_list, label_type="state_align", dur_file_list=None,
+                              backend='thread', num_workers=0):
+        worker_timings = super(HTSLabelNormalisation, self).perform_normalisation(ori_file_list, output_file_list, label_type, dur_file_list,
+                                                                                   backend=backend, num_workers=num_workers)
+        self.log_label_cache_stats()
+        self.save_label_cache()
+        return worker_timings
+
+    def prepare_normalisation(self, pool, file_tasks, label_type):
+        if self.use_context_table:
+            self.build_context_table([in_file_name for (in_file_name, _, _) in file_tasks], label_type, pool)
+
+    def chunk_state(self, file_tasks, label_type):
+        ## the rows of the context table used by the files of a chunk, rather than the whole table
+        keys = [(in_file_name, label_type) for (in_file_name, _, _) in file_tasks if (in_file_name, label_type) in self.file_context_rows]
+        if len(keys) == 0:
+            return None
+        rows = numpy.unique(numpy.concatenate([self.file_context_rows[key] for key in keys]))
+        return {'file_context_rows': {key: numpy.searchsorted(rows, self.file_context_rows[key]) for key in keys},
+                'context_binary': self.context_binary[rows], 'context_continuous': self.context_continuous[rows]}
+
+    def set_chunk_state(self, chunk_state):
+        self.file_context_rows = chunk_state['file_context_rows']
+        self.context_binary = chunk_state['context_binary']
+        self.context_continuous = chunk_state['context_continuous']
+
+    def __getstate__(self):
+        ## sent once to each worker process of perform_normalisation(backend='process'), without
+        ## the context table: each chunk of files comes with the rows it uses (see chunk_state)
+        state = self.__dict__.copy()
+        del state['label_cache_lock']
+        state['context_index'] = {}
+        state['file_context_rows'] = {}
+        state['context_binary'] = self.context_binary[0:0]
+        state['context_continuous'] = self.context_continuous[0:0]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.label_cache_lock = threading.Lock()
+
     def prepare_dur_data(self, ori_file_list, output_file_list, label_type="state_align", feature_type=None, unit_size=None, feat_size=None):
         '''
         extracting duration binary features or numerical features.
@@ -150,9 +414,15 @@ class HTSLabelNormalisation(LabelNormalisation):
             logger.critical("Unknown feature type: %s \n Please use one of the following: binary, numerical\n" %(feature_type))
             sys.exit(1)
 
+        if self.use_context_table and label_type == "state_align":
+            self.build_context_table(ori_file_list, label_type)
+
         for i in range(utt_number):
             self.extract_dur_features(ori_file_list[i], output_file_list[i], label_type, feature_type, unit_size, feat_size)
 
+        self.log_label_cache_stats()
+        self.save_label_cache()
+
     def extract_dur_features(self, in_file_name, out_file_name=None, label_type="state_align", feature_type=None, unit_size=None, feat_size=None):
         logger = logging.getLogger("dur")
         if label_type=="phone_align":
@@ -190,6 +460,7 @@ class HTSLabelNormalisation(LabelNormalisation):
 
         label_number = len(utt_labels)
         logger.info('loaded %s, %3d labels' % (file_name, label_number) )
+        utterance_vectors = self.file_label_vectors(file_name, "state_align")
 
         MLU_dur = [[],[],[]]
         list_of_silences=['#', 'sil', 'pau', 'SIL']
@@ -210,6 +481,7 @@ class HTSLabelNormalisation(LabelNormalisation):
             full_label_length = len(full_label) - 3  # remove state information [k]
             state_index = full_label[full_label_length + 1]
             state_index = int(state_index) - 1
+            context_label = full_label[0:full_label_length]
             current_phone = full_label[full_label.index('-') + 1:full_label.index('+')]
 
             frame_number = int(end_time/50000) - int(start_time/50000)
@@ -226,8 +498,7 @@ class HTSLabelNormalisation(LabelNormalisation):
                 word_duration+=phone_duration
 
                 ### for syllable and word positional information ###
-                label_binary_vector = self.pattern_matching_binary(full_label)
-                label_continuous_vector = self.pattern_matching_continous_position(full_label)
+                label_binary_vector, label_continuous_vector = self.line_label_vectors(context_label, utterance_vectors, current_index)
 
                 ### syllable ending information ###
                 syl_end = 0        
@@ -392,8 +663,11 @@ class HTSLabelNormalisation(LabelNormalisation):
 
         label_feature_matrix = numpy.empty((100000, self.dimension))
 
+        utterance_vectors = self.file_label_vectors(file_name, "phone_align")
         ph_count=0
         label_feature_index = 0
+        phone_vectors = []
+        phone_frame_numbers = []
         with open(file_name) as fid:
             all_data = fid.readlines()
         for line in all_data:
@@ -413,54 +687,30 @@ class HTSLabelNormalisation(LabelNormalisation):
                 # to do - support different frame shift - currently hardwired to 5msec
                 # currently under beta testing: support different frame shift
                 if dur_file_name:
-                    frame_number = manual_dur_data[ph_count]
+                    frame_number = int(manual_dur_data[ph_count, 0])
                 else:
                     frame_number = int(end_time/50000) - int(start_time/50000)
 
-                if self.subphone_feats == "coarse_coding":
-                    cc_feat_matrix = self.extract_coarse_coding_features_relative(frame_number)
-
-            ph_count = ph_count+1
             #label_binary_vector = self.pattern_matching(full_label)
-            label_binary_vector = self.pattern_matching_binary(full_label)
-
-            # if there is no CQS question, the label_continuous_vector will become to empty
-            label_continuous_vector = self.pattern_matching_continous_position(full_label)
+            label_binary_vector, label_continuous_vector = self.line_label_vectors(full_label, utterance_vectors, ph_count)
+            ph_count = ph_count+1
             label_vector = numpy.concatenate([label_binary_vector, label_continuous_vector], axis = 1)
 
             if self.add_frame_features:
-                current_block_binary_array = numpy.zeros((frame_number, self.dict_size+self.frame_feature_size))
-                for i in range(frame_number):
-                    current_block_binary_array[i, 0:self.dict_size] = label_vector
-
-                    if self.subphone_feats == 'minimal_phoneme':
-                        ## features which distinguish frame position in phoneme
-                        current_block_binary_array[i, self.dict_size] = float(i+1)/float(frame_number) # fraction through phone forwards
-                        current_block_binary_array[i, self.dict_size+1] = float(frame_number - i)/float(frame_number) # fraction through phone backwards
-                        current_block_binary_array[i, self.dict_size+2] = float(frame_number) # phone duration
-
-                    elif self.subphone_feats == 'coarse_coding':
-                        ## features which distinguish frame position in phoneme using three continous numerical features
-                        current_block_binary_array[i, self.dict_size+0] = cc_feat_matrix[i, 0]
-                        current_block_binary_array[i, self.dict_size+1] = cc_feat_matrix[i, 1]
-                        current_block_binary_array[i, self.dict_size+2] = cc_feat_matrix[i, 2]
-                        current_block_binary_array[i, self.dict_size+3] = float(frame_number)
-
-                    elif self.subphone_feats == 'none':
-                        pass
-
-                    else:
-                        sys.exit('unknown subphone_feats type')
-
-                label_feature_matrix[label_feature_index:label_feature_index+frame_number,] = current_block_binary_array
-                label_feature_index = label_feature_index + frame_number
+                ## frame-level features are expanded for the whole utterance at once below
+                phone_vectors.append(label_vector)
+                phone_frame_numbers.append(frame_number)
 
             elif self.subphone_feats == 'none':
                 current_block_binary_array = label_vector
                 label_feature_matrix[label_feature_index:label_feature_index+1,] = current_block_binary_array
                 label_feature_index = label_feature_index + 1
 
-        label_feature_matrix = label_feature_matrix[0:label_feature_index,]
+        if self.add_frame_features:
+            label_feature_matrix = self.expand_frame_features(phone_vectors, phone_frame_numbers,
+                                                              self.compute_phone_frame_features(phone_frame_numbers))
+        else:
+            label_feature_matrix = label_feature_matrix[0:label_feature_index,]
 
         logger.info('loaded %s, %3d labels' % (file_name, ph_count) )
         logger.debug('made label matrix of %d frames x %d labels' % label_feature_matrix.shape )
@@ -493,9 +743,15 @@ class HTSLabelNormalisation(LabelNormalisation):
         current_index = 0
         label_number = len(utt_labels)
         logger.info('loaded %s, %3d labels' % (file_name, label_number) )
+        utterance_vectors = self.file_label_vectors(file_name, "state_align")
 
         phone_duration = 0
         state_duration_base = 0
+        state_vectors = []
+        state_frame_numbers = []
+        state_indices = []
+        phone_durations = []
+        state_duration_bases = []
         for line in utt_labels:
             line = line.strip()
 
@@ -517,19 +773,14 @@ class HTSLabelNormalisation(LabelNormalisation):
                 state_index = full_label[full_label_length + 1]
 
                 state_index = int(state_index) - 1
-                state_index_backward = 6 - state_index
                 full_label = full_label[0:full_label_length]
 
             if state_index == 1:
-                current_frame_number = 0
                 phone_duration = frame_number
                 state_duration_base = 0
 
 #                label_binary_vector = self.pattern_matching(full_label)
-                label_binary_vector = self.pattern_matching_binary(full_label)
-
-                # if there is no CQS question, the label_continuous_vector will become to empty
-                label_continuous_vector = self.pattern_matching_continous_position(full_label)
+                label_binary_vector, label_continuous_vector = self.line_label_vectors(full_label, utterance_vectors, current_index)
                 label_vector = numpy.concatenate([label_binary_vector, label_continuous_vector], axis = 1)
 
                 if len(temp_list)==1:
@@ -540,62 +791,13 @@ class HTSLabelNormalisation(LabelNormalisation):
                         temp_list = re.split('\s+', line)
                         phone_duration += int((int(temp_list[1]) - int(temp_list[0]))/50000)
 
-                    if self.subphone_feats == "coarse_coding":
-                        cc_feat_matrix = self.extract_coarse_coding_features_relative(phone_duration)
-
             if self.add_frame_features:
-                current_block_binary_array = numpy.zeros((frame_number, self.dict_size+self.frame_feature_size))
-                for i in range(frame_number):
-                    current_block_binary_array[i, 0:self.dict_size] = label_vector
-
-                    if self.subphone_feats == 'full':
-                        ## Zhizheng's original 9 subphone features:
-                        current_block_binary_array[i, self.dict_size] = float(i+1) / float(frame_number)   ## fraction through state (forwards)
-                        current_block_binary_array[i, self.dict_size+1] = float(frame_number - i) / float(frame_number)  ## fraction through state (backwards)
-                        current_block_binary_array[i, self.dict_size+2] = float(frame_number)  ## length of state in frames
-                        current_block_binary_array[i, self.dict_size+3] = float(state_index)   ## state index (counting forwards)
-                        current_block_binary_array[i, self.dict_size+4] = float(state_index_backward) ## state index (counting backwards)
-
-                        current_block_binary_array[i, self.dict_size+5] = float(phone_duration)   ## length of phone in frames
-                        current_block_binary_array[i, self.dict_size+6] = float(frame_number) / float(phone_duration)   ## fraction of the phone made up by current state
-                        current_block_binary_array[i, self.dict_size+7] = float(phone_duration - i - state_duration_base) / float(phone_duration) ## fraction through phone (backwards)
-                        current_block_binary_array[i, self.dict_size+8] = float(state_duration_base + i + 1) / float(phone_duration)  ## fraction through phone (forwards)
-
-                    elif self.subphone_feats == 'state_only':
-                        ## features which only distinguish state:
-                        current_block_binary_array[i, self.dict_size] = float(state_index)   ## state index (counting forwards)
-
-                    elif self.subphone_feats == 'frame_only':
-                        ## features which distinguish frame position in phoneme:
-                        current_frame_number += 1
-                        current_block_binary_array[i, self.dict_size] = float(current_frame_number) / float(phone_duration)   ## fraction through phone (counting forwards)
-
-                    elif self.subphone_feats == 'uniform_state':
-                        ## features which distinguish frame position in phoneme:
-                        current_frame_number += 1
-                        current_block_binary_array[i, self.dict_size] = float(current_frame_number) / float(phone_duration)   ## fraction through phone (counting forwards)
-                        new_state_index = max(1, round(float(current_frame_number)/float(phone_duration)*5))
-                        current_block_binary_array[i, self.dict_size+1] = float(new_state_index)   ## state index (counting forwards)
-
-                    elif self.subphone_feats == "coarse_coding":
-                        ## features which distinguish frame position in phoneme using three continous numerical features
-                        current_block_binary_array[i, self.dict_size+0] = cc_feat_matrix[current_frame_number, 0]
-                        current_block_binary_array[i, self.dict_size+1] = cc_feat_matrix[current_frame_number, 1]
-                        current_block_binary_array[i, self.dict_size+2] = cc_feat_matrix[current_frame_number, 2]
-                        current_block_binary_array[i, self.dict_size+3] = float(phone_duration)
-                        current_frame_number += 1
-
-                    elif self.subphone_feats == 'minimal_frame':
-                        ## features which distinguish state and minimally frame position in state:
-                        current_block_binary_array[i, self.dict_size] = float(i+1) / float(frame_number)   ## fraction through state (forwards)
-                        current_block_binary_array[i, self.dict_size+1] = float(state_index)   ## state index (counting forwards)
-                    elif self.subphone_feats == 'none':
-                        pass
-                    else:
-                        sys.exit('unknown subphone_feats type')
-
-                label_feature_matrix[label_feature_index:label_feature_index+frame_number,] = current_block_binary_array
-                label_feature_index = label_feature_index + frame_number
+                ## frame-level features are expanded for the whole utterance at once below
+                state_vectors.append(label_vector)
+                state_frame_numbers.append(frame_number)
+                state_indices.append(state_index)
+                phone_durations.append(phone_duration)
+                state_duration_bases.append(state_duration_base)
             elif self.subphone_feats == 'state_only' and state_index == state_number:
                 current_block_binary_array = numpy.zeros((state_number, self.dict_size+self.frame_feature_size))
                 for i in range(state_number):
@@ -612,7 +814,11 @@ class HTSLabelNormalisation(LabelNormalisation):
 
             current_index += 1
 
-        label_feature_matrix = label_feature_matrix[0:label_feature_index,]
+        if self.add_frame_features:
+            frame_features = self.compute_state_frame_features(state_frame_numbers, state_indices, phone_durations, state_duration_bases)
+            label_feature_matrix = self.expand_frame_features(state_vectors, state_frame_numbers, frame_features)
+        else:
+            label_feature_matrix = label_feature_matrix[0:label_feature_index,]
         logger.debug('made label matrix of %d frames x %d labels' % label_feature_matrix.shape )
         return  label_feature_matrix
 
@@ -624,44 +830,25 @@ class HTSLabelNormalisation(LabelNormalisation):
             dur_data = io_funcs.load_binary_file(dur_file_name, dur_dim)
 
         ph_count = len(dur_data)
-        total_num_of_frames = int(sum(dur_data))
+        total_num_of_frames = int(numpy.sum(dur_data))
 
         duration_feature_array = numpy.zeros((total_num_of_frames, self.frame_feature_size))
 
-        frame_index=0
-        for i in range(ph_count):
-            frame_number = int(dur_data[i])
-            if self.subphone_feats == "coarse_coding":
-                cc_feat_matrix = self.extract_coarse_coding_features_relative(frame_number)
-
-                for j in range(frame_number):
-                    duration_feature_array[frame_index, 0] = cc_feat_matrix[j, 0]
-                    duration_feature_array[frame_index, 1] = cc_feat_matrix[j, 1]
-                    duration_feature_array[frame_index, 2] = cc_feat_matrix[j, 2]
-                    duration_feature_array[frame_index, 3] = float(frame_number)
-                    frame_index+=1
-
-            elif self.subphone_feats == 'full':
-                state_number = 5 # hard coded here 
-                phone_duration = sum(dur_data[i, :])
-                state_duration_base = 0
-                for state_index in range(1, state_number+1):
-                    state_index_backward = (state_number - state_index) + 1
-                    frame_number = int(dur_data[i][state_index-1])
-                    for j in range(frame_number):
-                        duration_feature_array[frame_index, 0] = float(j+1) / float(frame_number)   ## fraction through state (forwards)
-                        duration_feature_array[frame_index, 1] = float(frame_number - j) / float(frame_number)  ## fraction through state (backwards)
-                        duration_feature_array[frame_index, 2] = float(frame_number)  ## length of state in frames
-                        duration_feature_array[frame_index, 3] = float(state_index)   ## state index (counting forwards)
-                        duration_feature_array[frame_index, 4] = float(state_index_backward) ## state index (counting backwards)
-    
-                        duration_feature_array[frame_index, 5] = float(phone_duration)   ## length of phone in frames
-                        duration_feature_array[frame_index, 6] = float(frame_number) / float(phone_duration)   ## fraction of the phone made up by current state
-                        duration_feature_array[frame_index, 7] = float(phone_duration - j - state_duration_base) / float(phone_duration) ## fraction through phone (forwards)
-                        duration_feature_array[frame_index, 8] = float(state_duration_base + j + 1) / float(phone_duration)  ## fraction through phone (backwards)
-                        frame_index+=1
-                    
-                    state_duration_base += frame_number
+        if self.subphone_feats == "coarse_coding":
+            frame_numbers = numpy.asarray(dur_data).reshape(ph_count).astype(int)
+            frame_features = self.compute_phone_frame_features(frame_numbers)
+            duration_feature_array[0:len(frame_features),] = frame_features
+
+        elif self.subphone_feats == 'full':
+            state_number = 5 # hard coded here
+            state_durations = numpy.asarray(dur_data).reshape(ph_count, state_number)
+            frame_numbers = state_durations.astype(int)
+            phone_durations = numpy.repeat(state_durations.sum(axis=1), state_number)
+            state_indices = numpy.tile(numpy.arange(1, state_number+1), ph_count)
+            state_duration_bases = numpy.cumsum(frame_numbers, axis=1) - frame_numbers
+
+            frame_features = self.compute_state_frame_features(frame_numbers.ravel(), state_indices, phone_durations, state_duration_bases.ravel())
+            duration_feature_array[0:len(frame_features),] = frame_features
 
         return duration_feature_array
 
@@ -690,16 +877,131 @@ class HTSLabelNormalisation(LabelNormalisation):
     def extract_coarse_coding_features_relative(self, phone_duration):
         dur = int(phone_duration)
 
-        cc_feat_matrix = numpy.zeros((dur, 3))
+        return self.coarse_coding_frame_features(numpy.full(dur, dur), numpy.arange(dur))
 
-        for i in range(dur):
-            rel_indx = int((200/float(dur))*i)
-            cc_feat_matrix[i,0] = self.cc_features[0, 300+rel_indx]
-            cc_feat_matrix[i,1] = self.cc_features[1, 200+rel_indx]
-            cc_feat_matrix[i,2] = self.cc_features[2, 100+rel_indx]
+    def coarse_coding_frame_features(self, phone_durations, frame_positions):
+        ## coarse coding features of frames at the given positions in phones of the given durations
+        rel_indx = ((200 / phone_durations.astype(float)) * frame_positions).astype(int)
+
+        cc_feat_matrix = numpy.zeros((len(rel_indx), 3))
+        cc_feat_matrix[:, 0] = self.cc_features[0, 300+rel_indx]
+        cc_feat_matrix[:, 1] = self.cc_features[1, 200+rel_indx]
+        cc_feat_matrix[:, 2] = self.cc_features[2, 100+rel_indx]
 
         return cc_feat_matrix
 
+    def segment_frame_positions(self, frame_numbers):
+        '''
+        for segments of the given lengths in frames, returns the segment index of every
+        frame and the position of the frame within its segment
+        '''
+        frame_numbers = numpy.asarray(frame_numbers, dtype=int)
+        segment_index = numpy.repeat(numpy.arange(len(frame_numbers)), frame_numbers)
+        segment_start = numpy.cumsum(frame_numbers) - frame_numbers
+        frame_position = numpy.arange(len(segment_index)) - segment_start[segment_index]
+
+        return segment_index, frame_position
+
+    def expand_frame_features(self, segment_vectors, frame_numbers, frame_features):
+        '''
+        repeats each segment's linguistic vector over its frames and appends the frame features
+        '''
+        label_feature_matrix = numpy.empty((len(frame_features), self.dict_size+self.frame_feature_size))
+        if len(segment_vectors) > 0:
+            label_feature_matrix[:, 0:self.dict_size] = numpy.repeat(numpy.concatenate(segment_vectors, axis=0),
+                                                                     numpy.asarray(frame_numbers, dtype=int), axis=0)
+        label_feature_matrix[:, self.dict_size:] = frame_features
+
+        return label_feature_matrix
+
+    def compute_state_frame_features(self, frame_numbers, state_indices, phone_durations, state_duration_bases, state_number=5):
+        '''
+        subphone features of every frame of state-aligned segments, computed for all frames at once;
+        state_indices count from 1 and state_duration_bases are the frames of the phone before each state
+        '''
+        segment_index, i = self.segment_frame_positions(frame_numbers)
+
+        frame_number = numpy.asarray(frame_numbers, dtype=int)[segment_index]
+        state_index = numpy.asarray(state_indices, dtype=int)[segment_index]
+        phone_duration = numpy.asarray(phone_durations)[segment_index]
+        state_duration_base = numpy.asarray(state_duration_bases, dtype=int)[segment_index]
+        current_frame_number = state_duration_base + i   ## frames of the phone before this one
+
+        frame_features = numpy.zeros((len(i), self.frame_feature_size))
+
+        if self.subphone_feats == 'full':
+            ## Zhizheng's original 9 subphone features:
+            frame_features[:, 0] = (i + 1) / frame_number   ## fraction through state (forwards)
+            frame_features[:, 1] = (frame_number - i) / frame_number  ## fraction through state (backwards)
+            frame_features[:, 2] = frame_number  ## length of state in frames
+            frame_features[:, 3] = state_index   ## state index (counting forwards)
+            frame_features[:, 4] = state_number + 1 - state_index ## state index (counting backwards)
+
+            frame_features[:, 5] = phone_duration   ## length of phone in frames
+            frame_features[:, 6] = frame_number / phone_duration   ## fraction of the phone made up by current state
+            frame_features[:, 7] = (phone_duration - i - state_duration_base) / phone_duration ## fraction through phone (backwards)
+            frame_features[:, 8] = (state_duration_base + i + 1) / phone_duration  ## fraction through phone (forwards)
+
+        elif self.subphone_feats == 'state_only':
+            ## features which only distinguish state:
+            frame_features[:, 0] = state_index   ## state index (counting forwards)
+
+        elif self.subphone_feats == 'frame_only':
+            ## features which distinguish frame position in phoneme:
+            frame_features[:, 0] = (current_frame_number + 1) / phone_duration   ## fraction through phone (counting forwards)
+
+        elif self.subphone_feats == 'uniform_state':
+            ## features which distinguish frame position in phoneme:
+            frame_features[:, 0] = (current_frame_number + 1) / phone_duration   ## fraction through phone (counting forwards)
+            frame_features[:, 1] = numpy.maximum(1, numpy.round(frame_features[:, 0] * 5))   ## state index (counting forwards)
+
+        elif self.subphone_feats == "coarse_coding":
+            ## features which distinguish frame position in phoneme using three continous numerical features
+            frame_features[:, 0:3] = self.coarse_coding_frame_features(phone_duration, current_frame_number)
+            frame_features[:, 3] = phone_duration
+
+        elif self.subphone_feats == 'minimal_frame':
+            ## features which distinguish state and minimally frame position in state:
+            frame_features[:, 0] = (i + 1) / frame_number   ## fraction through state (forwards)
+            frame_features[:, 1] = state_index   ## state index (counting forwards)
+
+        elif self.subphone_feats == 'none':
+            pass
+
+        elif len(i) > 0:
+            sys.exit('unknown subphone_feats type')
+
+        return frame_features
+
+    def compute_phone_frame_features(self, frame_numbers):
+        '''
+        subphone features of every frame of phone-aligned segments, computed for all frames at once
+        '''
+        segment_index, i = self.segment_frame_positions(frame_numbers)
+
+        frame_number = numpy.asarray(frame_numbers, dtype=int)[segment_index]
+
+        frame_features = numpy.zeros((len(i), self.frame_feature_size))
+
+        if self.subphone_feats == 'minimal_phoneme':
+            ## features which distinguish frame position in phoneme
+            frame_features[:, 0] = (i + 1) / frame_number # fraction through phone forwards
+            frame_features[:, 1] = (frame_number - i) / frame_number # fraction through phone backwards
+            frame_features[:, 2] = frame_number # phone duration
+
+        elif self.subphone_feats == 'coarse_coding':
+            ## features which distinguish frame position in phoneme using three continous numerical features
+            frame_features[:, 0:3] = self.coarse_coding_frame_features(frame_number, i)
+            frame_features[:, 3] = frame_number
+
+        elif self.subphone_feats == 'none':
+            pass
+
+        elif len(i) > 0:
+            sys.exit('unknown subphone_feats type')
+
+        return frame_features
+
     ### this function is not used now
     def extract_coarse_coding_features_absolute(self, phone_duration):
         dur = int(phone_duration)
@@ -847,6 +1149,8 @@ class HTSLabelNormalisation(LabelNormalisation):
         continuous_qs_index = 0
         binary_dict = {}
         continuous_dict = {}
+        binary_questions = []
+        continuous_questions = []
         LL=re.compile(re.escape('LL-'))
         LAST_QUESTION = re.compile(re.escape('(\d+)') + '$') # regex for last question
 
@@ -870,6 +1174,7 @@ class HTSLabelNormalisation(LabelNormalisation):
                     if LAST_QUESTION.search(question_list[0]):
                         processed_question = processed_question + '$' # last question must only match at end of HTS label string
                     continuous_dict[str(continuous_qs_index)] = re.compile(processed_question) #save pre-compiled regular expression
+                    continuous_questions.append((question_list[0], continuous_dict[str(continuous_qs_index)]))
                     continuous_qs_index = continuous_qs_index + 1
                 elif temp_list[0] == 'QS':
                     re_list = []
@@ -880,12 +1185,18 @@ class HTSLabelNormalisation(LabelNormalisation):
                         re_list.append(re.compile(processed_question))
 
                     binary_dict[str(binary_qs_index)] = re_list
+                    binary_questions.append((question_key, question_list, re_list))
                     binary_qs_index = binary_qs_index + 1
                 else:
                     logger.critical('The question set is not defined correctly: %s' %(line))
                     raise Exception
 
 #                question_index = question_index + 1
+        fid.close()
+
+        ## field-lookup form of the same questions, used by pattern_matching_label
+        self.question_matcher = HTSQuestionMatcher(binary_questions, continuous_questions)
+
         return  binary_dict, continuous_dict
 
 
@@ -963,10 +1274,7 @@ class HTSDurationLabelNormalisation(HTSLabelNormalisation):
             temp_list = re.split('\s+', line.strip())
             full_label = temp_list[-1]  ## take last entry -- ignore timings if present
 
-            label_binary_vector = self.pattern_matching_binary(full_label)
-
-            # if there is no CQS question, the label_continuous_vector will become to empty
-            label_continuous_vector = self.pattern_matching_continous_position(full_label)
+            label_binary_vector, label_continuous_vector = self.pattern_matching_label(full_label)
             label_vector = numpy.concatenate([label_binary_vector, label_continuous_vector], axis = 1)
 
             label_feature_matrix[line_number, :] = label_vector[:]
@@ -39,8 +39,44 @@
 
 
 import logging
-import sys
+import os, sys, time
+import threading
+import multiprocessing
 from multiprocessing.pool import ThreadPool as Pool
+try:
+    from utils.utils import effective_cpu_count
+except ModuleNotFoundError:
+    from ..utils.utils import effective_cpu_count
+
+
+## per-process normaliser of the process backend, set up once per worker by
+## _init_normalisation_worker so the compiled question set is not pickled for every task
+_worker_normaliser = None
+
+def _init_normalisation_worker(normaliser):
+    global _worker_normaliser
+    _worker_normaliser = normaliser
+    _worker_normaliser.start_worker()
+
+def _run_normalisation_chunk(args):
+    (file_tasks, label_type, chunk_state) = args
+    if chunk_state is not None:
+        _worker_normaliser.set_chunk_state(chunk_state)
+    (worker_name, file_number, elapsed, _) = _normalise_files(_worker_normaliser, file_tasks, label_type, multiprocessing.current_process().name)
+    return worker_name, file_number, elapsed, _worker_normaliser.take_worker_state()
+
+def _run_worker_method(args):
+    (method_name, method_args) = args
+    return getattr(_worker_normaliser, method_name)(*method_args)
+
+def _normalise_files(normaliser, file_tasks, label_type, worker_name):
+    start_time = time.time()
+    for (in_file_name, out_file_name, dur_file_name) in file_tasks:
+        if dur_file_name is None:
+            normaliser.extract_linguistic_features(in_file_name, out_file_name, label_type)
+        else:
+            normaliser.extract_linguistic_features(in_file_name, out_file_name, label_type, dur_file_name)
+    return worker_name, len(file_tasks), time.time() - start_time, None
 
 
 ## a generic class of linguistic feature extraction
@@ -52,10 +88,17 @@ class LinguisticBase(object):
         ## the number of utterances to be normalised
         self.utterance_num = 0
 
+    ## smallest job for which perform_normalisation(backend='auto') uses worker processes
+    process_backend_min_files = 100
+
     ## the ori_file_list contains the file paths of the raw linguistic data
     ## the output_file_list contains the file paths of the normalised linguistic data
     ##
-    def perform_normalisation(self, ori_file_list, output_file_list, label_type="state_align", dur_file_list=None):
+    ## backend is 'thread', 'process' or 'auto' (processes for jobs of at least process_backend_min_files files);
+    ## num_workers = 0 uses all cores. Returns the number of files and seconds spent per worker.
+    ##
+    def perform_normalisation(self, ori_file_list, output_file_list, label_type="state_align", dur_file_list=None,
+                              backend='thread', num_workers=0):
 
         logger = logging.getLogger("perform_normalisation")
         logger.info('perform linguistic feature extraction')
@@ -64,17 +107,109 @@ class LinguisticBase(object):
             logger.error('the number of input and output linguistic files should be the same!\n')
             sys.exit(1)
 
-        def _perform_normalisation(i):
+        file_tasks = []
+        for i in range(self.utterance_num):
             if not dur_file_list:
-                self.extract_linguistic_features(ori_file_list[i], output_file_list[i], label_type)
+                file_tasks.append((ori_file_list[i], output_file_list[i], None))
             else:
-                self.extract_linguistic_features(ori_file_list[i], output_file_list[i], label_type, dur_file_list[i])
+                file_tasks.append((ori_file_list[i], output_file_list[i], dur_file_list[i]))
+
+        if num_workers == 0:
+            num_workers = effective_cpu_count()
+        if backend == 'auto':
+            ## worker start-up is only worth paying for on larger jobs
+            backend = 'process' if self.utterance_num >= self.process_backend_min_files else 'thread'
+
+        chunks = self.make_balanced_chunks(file_tasks, num_workers)
+        logger.debug('normalising %d files in %d chunks on %d %s workers' % (self.utterance_num, len(chunks), num_workers, backend))
+
+        if backend == 'process':
+            pool = multiprocessing.Pool(num_workers, initializer=_init_normalisation_worker, initargs=(self,))
+        elif backend == 'thread':
+            pool = Pool(num_workers)
+        else:
+            logger.critical('unknown label normalisation backend: %s' % (backend))
+            raise ValueError(backend)
 
-        pool = Pool()
-        pool.map(_perform_normalisation, range(self.utterance_num))
+        self.prepare_normalisation(pool, file_tasks, label_type)
+        if backend == 'process':
+            results = list(pool.imap_unordered(_run_normalisation_chunk, [(chunk, label_type, self.chunk_state(chunk, label_type)) for chunk in chunks]))
+        else:
+            results = pool.map(lambda chunk: _normalise_files(self, chunk, label_type, threading.current_thread().name), chunks, chunksize=1)
         pool.close()
         pool.join()
 
+        worker_timings = {}
+        for (worker_name, file_number, elapsed, worker_state) in results:
+            if worker_state is not None:
+                self.merge_worker_state(worker_state)
+            timing = worker_timings.setdefault(worker_name, {'files': 0, 'seconds': 0.0})
+            timing['files'] += file_number
+            timing['seconds'] += elapsed
+        for worker_name in sorted(worker_timings):
+            logger.info('%s normalised %d files in %.2f seconds' % (worker_name, worker_timings[worker_name]['files'], worker_timings[worker_name]['seconds']))
+
+        return worker_timings
+
+    ## calls method_name of the normaliser with each tuple of args_list, on the workers of pool if one is
+    ## given, and returns the results in order; worker processes call it on their own copy of the normaliser
+    def map_on_workers(self, pool, method_name, args_list):
+        if pool is None:
+            return [getattr(self, method_name)(*method_args) for method_args in args_list]
+        if isinstance(pool, Pool):
+            return pool.map(lambda method_args: getattr(self, method_name)(*method_args), args_list)
+        return pool.map(_run_worker_method, [(method_name, method_args) for method_args in args_list])
+
+    ## called by perform_normalisation once its workers are started, before any file is normalised;
+    ## pool can be used with map_on_workers
+    def prepare_normalisation(self, pool, file_tasks, label_type):
+        pass
+
+    ## state that a worker process of perform_normalisation(backend='process') gathers on its own copy of
+    ## the normaliser, such as cached results: start_worker is called once in each worker, take_worker_state
+    ## after each of its chunks, and the parent passes what that returns to merge_worker_state.
+    ## chunk_state is what the parent sends with a chunk of files to set_chunk_state in the worker
+    def chunk_state(self, file_tasks, label_type):
+        return None
+
+    def set_chunk_state(self, chunk_state):
+        pass
+
+    def start_worker(self):
+        pass
+
+    def take_worker_state(self):
+        return None
+
+    def merge_worker_state(self, worker_state):
+        pass
+
+    ## splits the files into chunks of roughly equal total label file size, largest files first,
+    ## several chunks per worker so that the last chunks to finish are small ones
+    def make_balanced_chunks(self, file_tasks, num_workers, chunks_per_worker=4):
+        if len(file_tasks) == 0:
+            return []
+
+        file_sizes = [os.path.getsize(in_file_name) if os.path.isfile(in_file_name) else 0 for (in_file_name, _, _) in file_tasks]
+        order = sorted(range(len(file_tasks)), key=lambda i: file_sizes[i], reverse=True)
+        chunk_number = min(len(file_tasks), max(1, num_workers * chunks_per_worker))
+        target_size = sum(file_sizes) / float(chunk_number)
+
+        chunks = []
+        current_chunk = []
+        current_size = 0
+        for i in order:
+            current_chunk.append(file_tasks[i])
+            current_size += file_sizes[i]
+            if current_size >= target_size:
+                chunks.append(current_chunk)
+                current_chunk = []
+                current_size = 0
+        if current_chunk:
+            chunks.append(current_chunk)
+
+        return chunks
+
     ## the exact function to do the work
     ## need to be implemented in the specific class
     ## the function will write the linguistic features directly to the output file
@@ -40,12 +40,16 @@
 
 try:
     from io_funcs.binary_io import BinaryIOCollection
+    from io_funcs.prefetch_reader import PrefetchReader
 except ModuleNotFoundError:
     from ..io_funcs.binary_io import BinaryIOCollection
+    from ..io_funcs.prefetch_reader import PrefetchReader
 import  logging
 import  numpy
 
 from .feature_normalisation_base import FeatureNormBase
+from .feature_statistics import compute_file_statistics
+from .normalisation_kernels import AffineKernel, transform_file_list
 
 class   MeanVarianceNorm(FeatureNormBase):
     '''
@@ -59,7 +63,8 @@ class   MeanVarianceNorm(FeatureNormBase):
         self.std_vector  = None
         self.feature_dimension = feature_dimension
 
-    def feature_normalisation(self, in_file_list, out_file_list):
+    def feature_normalisation(self, in_file_list, out_file_list, num_workers=1):
+        ## num_workers processes normalise the files (0 uses all cores)
         logger = logging.getLogger('feature_normalisation')
 
 #        self.feature_dimension = feature_dimension
@@ -69,28 +74,27 @@ class   MeanVarianceNorm(FeatureNormBase):
             logger.critical('The input and output file numbers are not the same! %d vs %d' %(len(in_file_list), len(out_file_list)))
             raise
 
+        if self.mean_vector is None and self.std_vector is None:
+            self.compute_mean_std(in_file_list, 0, self.feature_dimension, num_workers=num_workers)
         if self.mean_vector is None:
             self.mean_vector = self.compute_mean(in_file_list, 0, self.feature_dimension)
         if self.std_vector  is None:
             self.std_vector = self.compute_std(in_file_list, self.mean_vector, 0, self.feature_dimension)
 
-        io_funcs = BinaryIOCollection()
-        file_number = len(in_file_list)
-        for i in range(file_number):
-            features, current_frame_number = io_funcs.load_binary_file_frame(in_file_list[i], self.feature_dimension)
-
-            mean_matrix = numpy.tile(self.mean_vector, (current_frame_number, 1))
-            std_matrix = numpy.tile(self.std_vector, (current_frame_number, 1))
+        transform_file_list(self.normalisation_kernel(), in_file_list, out_file_list,
+                            storage=BinaryIOCollection.normalised_storage, num_workers=num_workers)
 
-            norm_features = (features - mean_matrix) / std_matrix
+        return  self.mean_vector, self.std_vector
 
-            io_funcs.array_to_binary_file(norm_features, out_file_list[i])
+    def normalise_features(self, features, in_place=False):
+        ## normalises the frames of one utterance with the current mean and std vectors
+        return  self.normalisation_kernel().apply(features, in_place)
 
-        return  self.mean_vector, self.std_vector
+    def normalisation_kernel(self):
+        ## (features - mean) / std
+        return  AffineKernel(self.mean_vector, 1.0 / numpy.asarray(self.std_vector, dtype=numpy.float64), 0.0)
 
-    def feature_denormalisation(self, in_file_list, out_file_list, mean_vector, std_vector):
-        io_funcs = BinaryIOCollection()
-        file_number = len(in_file_list)
+    def feature_denormalisation(self, in_file_list, out_file_list, mean_vector, std_vector, num_workers=1):
         try:
             assert len(in_file_list) == len(out_file_list)
         except  AssertionError:
@@ -103,15 +107,8 @@ class   MeanVarianceNorm(FeatureNormBase):
             # logger.critical('the dimensionalities of the mean and standard derivation vectors are not the same as the dimensionality of the feature')
             raise AssertionError('the dimensionalities of the mean and standard derivation vectors are not the same as the dimensionality of the feature')
 
-        for i in range(file_number):
-            features, current_frame_number = io_funcs.load_binary_file_frame(in_file_list[i], self.feature_dimension)
-
-            mean_matrix = numpy.tile(mean_vector, (current_frame_number, 1))
-            std_matrix = numpy.tile(std_vector, (current_frame_number, 1))
-
-            norm_features = features * std_matrix + mean_matrix
-
-            io_funcs.array_to_binary_file(norm_features, out_file_list[i])
+        ## features * std + mean
+        transform_file_list(AffineKernel(0.0, std_vector, mean_vector), in_file_list, out_file_list, num_workers=num_workers)
 
     def load_mean_std_values(self, acoustic_norm_file):
 
@@ -126,6 +123,35 @@ class   MeanVarianceNorm(FeatureNormBase):
         logger.info('Loaded mean std values from the trained data for feature dimension of %d' % self.feature_dimension)
         return self.mean_vector, self.std_vector
 
+    def compute_mean_std(self, file_list, start_index, end_index, num_workers=1):
+        '''
+        computes the mean and std vectors of compute_mean and compute_std in a single pass over
+        the files, split over num_workers processes (0 uses all cores)
+        '''
+        logger = logging.getLogger('feature_normalisation')
+
+        statistics = compute_file_statistics(file_list, self.feature_dimension, num_workers)
+
+        return  self.set_mean_std(statistics, start_index, end_index)
+
+    def set_mean_std(self, statistics, start_index, end_index):
+        '''
+        sets the mean and std vectors from a FeatureStatistics gathered elsewhere, e.g. while
+        the features were being composed
+        '''
+        logger = logging.getLogger('feature_normalisation')
+
+        local_feature_dimension = end_index - start_index
+
+        self.mean_vector = numpy.reshape(statistics.mean_vector[start_index:end_index], (1, local_feature_dimension))
+        self.std_vector = numpy.reshape(statistics.std()[start_index:end_index], (1, local_feature_dimension))
+
+        logger.info('computed mean and std vectors of length %d over %d frames' % (local_feature_dimension, statistics.frame_number))
+        logger.info(' mean: %s' % self.mean_vector)
+        logger.info('  std: %s' % self.std_vector)
+
+        return  self.mean_vector, self.std_vector
+
     def compute_mean(self, file_list, start_index, end_index):
 
         logger = logging.getLogger('feature_normalisation')
@@ -136,8 +162,8 @@ class   MeanVarianceNorm(FeatureNormBase):
         all_frame_number = 0
 
         io_funcs = BinaryIOCollection()
-        for file_name in file_list:
-            features, current_frame_number = io_funcs.load_binary_file_frame(file_name, self.feature_dimension)
+        file_reader = PrefetchReader(file_list, lambda file_name: io_funcs.load_binary_file_frame(file_name, self.feature_dimension))
+        for (features, current_frame_number) in file_reader:
 
             mean_vector += numpy.reshape(numpy.sum(features[:, start_index:end_index], axis=0), (1, local_feature_dimension))
             all_frame_number += current_frame_number
@@ -167,8 +193,8 @@ class   MeanVarianceNorm(FeatureNormBase):
         all_frame_number = 0
 
         io_funcs = BinaryIOCollection()
-        for file_name in file_list:
-            features, current_frame_number = io_funcs.load_binary_file_frame(file_name, self.feature_dimension)
+        file_reader = PrefetchReader(file_list, lambda file_name: io_funcs.load_binary_file_frame(file_name, self.feature_dimension))
+        for (features, current_frame_number) in file_reader:
 
             mean_matrix = numpy.tile(mean_vector, (current_frame_number, 1))
 
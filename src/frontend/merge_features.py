@@ -2,8 +2,10 @@
 import numpy, sys
 try:
     from io_funcs.binary_io import BinaryIOCollection
+    from io_funcs.prefetch_reader import PrefetchReader
 except ModuleNotFoundError:
     from ..io_funcs.binary_io import BinaryIOCollection
+    from ..io_funcs.prefetch_reader import PrefetchReader
 
 import logging
 
@@ -30,14 +32,11 @@ class MergeFeat(object):
         new_feat_ext   = new_feat_file_list[0].split('/')[-1].split('.')[1]
 
         io_funcs = BinaryIOCollection()
-        for i in range(utt_number):
-            lab_file_name = binary_label_file_list[i]
-            new_feat_file_name = new_feat_file_list[i]
+        file_reader = PrefetchReader(list(zip(binary_label_file_list, new_feat_file_list)),
+                                     lambda file_names: (io_funcs.load_binary_file_frame(file_names[0], self.lab_dim), io_funcs.load_binary_file_frame(file_names[1], self.feat_dim)))
+        for (i, ((lab_features, lab_frame_number), (new_features, feat_frame_number))) in enumerate(file_reader):
             out_feat_file_name = out_feat_file_list[i]
 
-            lab_features, lab_frame_number  = io_funcs.load_binary_file_frame(lab_file_name, self.lab_dim)
-            new_features, feat_frame_number = io_funcs.load_binary_file_frame(new_feat_file_name, self.feat_dim)
-
 
             if (lab_frame_number - feat_frame_number)>5:
                 base_file_name = new_feat_file_list[i].split('/')[-1].split('.')[0]
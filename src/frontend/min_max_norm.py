@@ -41,10 +41,14 @@
 import numpy
 try:
     from io_funcs.binary_io import BinaryIOCollection
+    from io_funcs.prefetch_reader import PrefetchReader
 except ModuleNotFoundError:
     from ..io_funcs.binary_io import BinaryIOCollection
+    from ..io_funcs.prefetch_reader import PrefetchReader
 
 import logging
+from .feature_statistics import compute_file_statistics
+from .normalisation_kernels import AffineKernel, transform_file_list
 
 class MinMaxNormalisation(object):
     def __init__(self, feature_dimension, min_value = 0.01, max_value = 0.99, min_vector = 0.0, max_vector = 0.0, exclude_columns=[]):
@@ -90,127 +94,80 @@ class MinMaxNormalisation(object):
 
         logger.info('Loaded min max values from the trained data for feature dimension of %d' % self.feature_dimension)
 
-    def find_min_max_values(self, in_file_list):
+    def find_min_max_values(self, in_file_list, num_workers=1):
+        ## num_workers processes read the files (0 uses all cores)
 
         logger = logging.getLogger("acoustic_norm")
 
         file_number = len(in_file_list)
-        min_value_matrix = numpy.zeros((file_number, self.feature_dimension))
-        max_value_matrix = numpy.zeros((file_number, self.feature_dimension))
-        io_funcs = BinaryIOCollection()
-        for i in range(file_number):
-            features = io_funcs.load_binary_file(in_file_list[i], self.feature_dimension)
+        statistics = compute_file_statistics(in_file_list, self.feature_dimension, num_workers)
+        if statistics.frame_number == 0:
+            logger.error('no frames found in %d files to find min/max values' % (file_number))
 
-            try:
-                temp_min = numpy.amin(features, axis = 0)
-                temp_max = numpy.amax(features, axis = 0)
+        self.set_min_max_values(statistics)
 
-                min_value_matrix[i, ] = temp_min;
-                max_value_matrix[i, ] = temp_max;
-            except ValueError:
-                logger.error(f"File \"merlin/src/frontend/min_max_norm.py\", line 100, in find_min_max_values FAILED, no min or max for {in_file_list[i]}")
+    def set_min_max_values(self, statistics):
+        ## sets the min and max vectors from a FeatureStatistics, which may have been gathered
+        ## while the features were being composed
+        logger = logging.getLogger("acoustic_norm")
 
-        self.min_vector = numpy.amin(min_value_matrix, axis = 0)
-        self.max_vector = numpy.amax(max_value_matrix, axis = 0)
+        self.min_vector = statistics.min_vector
+        self.max_vector = statistics.max_vector
         self.min_vector = numpy.reshape(self.min_vector, (1, self.feature_dimension))
         self.max_vector = numpy.reshape(self.max_vector, (1, self.feature_dimension))
 
         # po=numpy.get_printoptions()
         # numpy.set_printoptions(precision=2, threshold=20, linewidth=1000, edgeitems=4)
-        logger.info('across %d files found min/max values of length %d:' % (file_number,self.feature_dimension) )
+        logger.info('across %d frames found min/max values of length %d:' % (statistics.frame_number,self.feature_dimension) )
         logger.info('  min: %s' % self.min_vector)
         logger.info('  max: %s' % self.max_vector)
         # restore the print options
         # numpy.set_printoptions(po)
 
-    def normalise_data(self, in_file_list, out_file_list):
-        file_number = len(in_file_list)
+    def normalise_data(self, in_file_list, out_file_list, num_workers=1):
+        ## num_workers processes normalise the files (0 uses all cores)
+        transform_file_list(self.normalisation_kernel(), in_file_list, out_file_list,
+                            storage=BinaryIOCollection.normalised_storage, num_workers=num_workers)
 
-        fea_max_min_diff = self.max_vector - self.min_vector
-        diff_value = self.target_max_value - self.target_min_value
-        fea_max_min_diff = numpy.reshape(fea_max_min_diff, (1, self.feature_dimension))
+    def normalise_features(self, features, in_place=False):
+        ## normalises the frames of one utterance with the current min and max vectors
+        return  self.normalisation_kernel().apply(features, in_place)
 
-        target_max_min_diff = numpy.zeros((1, self.feature_dimension))
-        target_max_min_diff.fill(diff_value)
+    def target_scale_vectors(self):
+        ## the ranges of the features and of their normalised values, 1 in both for constant features
+        fea_max_min_diff = numpy.reshape(self.max_vector - self.min_vector, (self.feature_dimension, ))
+        target_max_min_diff = numpy.zeros(self.feature_dimension)
+        target_max_min_diff.fill(self.target_max_value - self.target_min_value)
 
         target_max_min_diff[fea_max_min_diff <= 0.0] = 1.0
-        fea_max_min_diff[fea_max_min_diff <= 0.0] = 1.0
-
-        io_funcs = BinaryIOCollection()
-        for i in range(file_number):
-            features = io_funcs.load_binary_file(in_file_list[i], self.feature_dimension)
+        fea_max_min_diff = numpy.where(fea_max_min_diff <= 0.0, 1.0, fea_max_min_diff)
 
-            frame_number = features.size // self.feature_dimension
-            fea_min_matrix = numpy.tile(self.min_vector, (frame_number, 1))
-            target_min_matrix = numpy.tile(self.target_min_value, (frame_number, self.feature_dimension))
+        return  fea_max_min_diff, target_max_min_diff
 
-            fea_diff_matrix = numpy.tile(fea_max_min_diff, (frame_number, 1))
-            diff_norm_matrix = numpy.tile(target_max_min_diff, (frame_number, 1)) / fea_diff_matrix
+    def normalisation_kernel(self):
+        ## (features - min) * target range / feature range + target min, except in the exclude_columns
+        fea_max_min_diff, target_max_min_diff = self.target_scale_vectors()
+        return  AffineKernel(self.min_vector, target_max_min_diff / fea_max_min_diff, self.target_min_value, self.exclude_columns)
 
-            norm_features = diff_norm_matrix * (features - fea_min_matrix) + target_min_matrix
+    def denormalisation_kernel(self):
+        fea_max_min_diff, target_max_min_diff = self.target_scale_vectors()
+        return  AffineKernel(self.target_min_value, fea_max_min_diff / target_max_min_diff, self.min_vector)
 
-            ## If we are to keep some columns unnormalised, use advanced indexing to
-            ## reinstate original values:
-            m,n = numpy.shape(features)
-            for col in self.exclude_columns:
-                norm_features[list(range(m)),[col]*m] = features[list(range(m)),[col]*m]
-
-            io_funcs.array_to_binary_file(norm_features, out_file_list[i])
-
-#            norm_features = numpy.array(norm_features, 'float32')
-#            fid = open(out_file_list[i], 'wb')
-#            norm_features.tofile(fid)
-#            fid.close()
-
-    def denormalise_data(self, in_file_list, out_file_list):
+    def denormalise_data(self, in_file_list, out_file_list, num_workers=1):
 
         logger = logging.getLogger("acoustic_norm")
 
         file_number = len(in_file_list)
         logger.info('MinMaxNormalisation.denormalise_data for %d files' % file_number)
 
-        # print   self.max_vector, self.min_vector
-        fea_max_min_diff = self.max_vector - self.min_vector
-        diff_value = self.target_max_value - self.target_min_value
-        # logger.debug('reshaping fea_max_min_diff from shape %s to (1,%d)' % (fea_max_min_diff.shape, self.feature_dimension) )
-
-        fea_max_min_diff = numpy.reshape(fea_max_min_diff, (1, self.feature_dimension))
-
-        target_max_min_diff = numpy.zeros((1, self.feature_dimension))
-        target_max_min_diff.fill(diff_value)
-
-        target_max_min_diff[fea_max_min_diff <= 0.0] = 1.0
-        fea_max_min_diff[fea_max_min_diff <= 0.0] = 1.0
-
-        io_funcs = BinaryIOCollection()
-        for i in range(file_number):
-            features = io_funcs.load_binary_file(in_file_list[i], self.feature_dimension)
-
-            frame_number = features.size // self.feature_dimension
-            fea_min_matrix = numpy.tile(self.min_vector, (frame_number, 1))
-            target_min_matrix = numpy.tile(self.target_min_value, (frame_number, self.feature_dimension))
-
-            fea_diff_matrix = numpy.tile(fea_max_min_diff, (frame_number, 1))
-            diff_norm_matrix = fea_diff_matrix / numpy.tile(target_max_min_diff, (frame_number, 1))
-            norm_features = diff_norm_matrix * (features - target_min_matrix) + fea_min_matrix
-            io_funcs.array_to_binary_file(norm_features, out_file_list[i])
+        transform_file_list(self.denormalisation_kernel(), in_file_list, out_file_list, num_workers=num_workers)
 
     def normal_standardization(self, in_file_list, out_file_list):
-        mean_vector = self.compute_mean(in_file_list)
-        std_vector = self.compute_std(in_file_list, mean_vector)
-
-        io_funcs = BinaryIOCollection()
-        file_number = len(in_file_list)
-        for i in range(file_number):
-            features = io_funcs.load_binary_file(in_file_list[i], self.feature_dimension)
-            current_frame_number = features.size // self.feature_dimension
-
-            mean_matrix = numpy.tile(mean_vector, (current_frame_number, 1))
-            std_matrix = numpy.tile(std_vector, (current_frame_number, 1))
-
-            norm_features = (features - mean_matrix) / std_matrix
+        statistics = compute_file_statistics(in_file_list, self.feature_dimension)
+        mean_vector = numpy.reshape(statistics.mean_vector, (1, self.feature_dimension))
+        std_vector = numpy.reshape(statistics.std(), (1, self.feature_dimension))
 
-            io_funcs.array_to_binary_file(norm_features, out_file_list[i])
+        transform_file_list(AffineKernel(mean_vector, 1.0 / std_vector, 0.0), in_file_list, out_file_list)
 
     def compute_mean(self, file_list):
 
@@ -220,8 +177,8 @@ class MinMaxNormalisation(object):
         all_frame_number = 0
 
         io_funcs = BinaryIOCollection()
-        for file_name in file_list:
-            features = io_funcs.load_binary_file(file_name, self.feature_dimension)
+        file_reader = PrefetchReader(file_list, lambda file_name: io_funcs.load_binary_file(file_name, self.feature_dimension))
+        for features in file_reader:
             current_frame_number = features.size // self.feature_dimension
             mean_vector += numpy.reshape(numpy.sum(features, axis=0), (1, self.feature_dimension))
             all_frame_number += current_frame_number
@@ -245,8 +202,8 @@ class MinMaxNormalisation(object):
         all_frame_number = 0
 
         io_funcs = BinaryIOCollection()
-        for file_name in file_list:
-            features = io_funcs.load_binary_file(file_name, self.feature_dimension)
+        file_reader = PrefetchReader(file_list, lambda file_name: io_funcs.load_binary_file(file_name, self.feature_dimension))
+        for features in file_reader:
             current_frame_number = features.size // self.feature_dimension
             mean_matrix = numpy.tile(mean_vector, (current_frame_number, 1))
 
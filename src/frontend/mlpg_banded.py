@@ -0,0 +1,278 @@
+################################################################################
+#           The Neural Network (NN) based Speech Synthesis System
+#                https://svn.ecdf.ed.ac.uk/repo/inf/dnn_tts/
+#
+#                Centre for Speech Technology Research
+#                     University of Edinburgh, UK
+#                      Copyright (c) 2014-2015
+#                        All Rights Reserved.
+#
+# The system as a whole and most of the files in it are distributed
+# under the following copyright and conditions
+#
+#  Permission is hereby granted, free of charge, to use and distribute
+#  this software and its documentation without restriction, including
+#  without limitation the rights to use, copy, modify, merge, publish,
+#  distribute, sublicense, and/or sell copies of this work, and to
+#  permit persons to whom this work is furnished to do so, subject to
+#  the following conditions:
+#
+#   - Redistributions of source code must retain the above copyright
+#     notice, this list of conditions and the following disclaimer.
+#   - Redistributions in binary form must reproduce the above
+#     copyright notice, this list of conditions and the following
+#     disclaimer in the documentation and/or other materials provided
+#     with the distribution.
+#   - The authors' names may not be used to endorse or promote products derived
+#     from this software without specific prior written permission.
+#
+#  THE UNIVERSITY OF EDINBURGH AND THE CONTRIBUTORS TO THIS WORK
+#  DISCLAIM ALL WARRANTIES WITH REGARD TO THIS SOFTWARE, INCLUDING
+#  ALL IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS, IN NO EVENT
+#  SHALL THE UNIVERSITY OF EDINBURGH NOR THE CONTRIBUTORS BE LIABLE
+#  FOR ANY SPECIAL, INDIRECT OR CONSEQUENTIAL DAMAGES OR ANY DAMAGES
+#  WHATSOEVER RESULTING FROM LOSS OF USE, DATA OR PROFITS, WHETHER IN
+#  AN ACTION OF CONTRACT, NEGLIGENCE OR OTHER TORTIOUS ACTION,
+#  ARISING OUT OF OR IN CONNECTION WITH THE USE OR PERFORMANCE OF
+#  THIS SOFTWARE.
+################################################################################
+
+import logging
+import numpy as np
+from scipy.linalg import solveh_banded, cholesky_banded, cho_solve_banded
+
+class MLParameterGeneration(object):
+    """
+    Maximum Likelihood Parameter Generation using banded Cholesky solves.
+
+    With the standard static/delta/acceleration windows the precision matrix
+    P = sum_i W_i^T D_i W_i has only two non-zero diagonals either side of the
+    main diagonal. This implementation never forms P as a T x T matrix: the
+    lower band of P and the vector b are accumulated for every static dimension
+    of a stream at once, in a single vectorized pass over the windows, and each
+    dimension is then solved with LAPACK's banded Cholesky routine in O(T).
+
+    When the variance is time-invariant (a global variance vector tiled over
+    the frames, as in ParameterGeneration.acoustic_decomposition) P depends
+    only on the variance and the number of frames, so with cache_factors set
+    its Cholesky factor is computed once per stream and reused by every later
+    call: the leading rows of the factor are the same for any utterance length,
+    and only the last two rows, which see the end-of-utterance boundary, are
+    recomputed. Each call then costs just the triangular solves.
+
+    The results match mlpg_fast2.MLParameterGeneration to numerical precision.
+    """
+
+    def __init__(self, delta_win=[-0.5, 0.0, 0.5], acc_win=[1.0, -2.0, 1.0], cache_factors=True):
+        self.delta_win = delta_win
+        self.acc_win = acc_win
+        self.win_length = int(len(delta_win) / 2)
+
+        # Window definitions for static, delta, and acceleration features
+        self.windows = [
+            (0, 0, np.array([1.0])),                      # Static
+            (1, 1, np.array(delta_win, dtype=np.float64)),  # Delta
+            (1, 1, np.array(acc_win, dtype=np.float64)),    # Acceleration
+        ]
+        self.band_width = max(l + u for l, u, _ in self.windows)
+
+        # Cholesky factors of time-invariant precision matrices, keyed by the
+        # variance vector; each entry holds the factor for the longest
+        # utterance seen so far, shaped (static_dim, band_width + 1, num_frames)
+        self.cache_factors = cache_factors
+        self.factor_cache = {}
+
+    def _split_windows(self, features, covariance, static_dimension):
+        """
+        Rearranges interleaved [static, delta, acc] columns into per-window blocks.
+
+        Args:
+            features (numpy.ndarray): Means (num_frames x (static_dim * 3)).
+            covariance (numpy.ndarray): Variances (num_frames x (static_dim * 3)).
+            static_dimension (int): The number of static feature dimensions.
+
+        Returns:
+            (numpy.ndarray, numpy.ndarray): Means and variances, each shaped
+                (num_windows, static_dim, num_frames).
+        """
+        num_windows = len(self.windows)
+        num_frames = features.shape[0]
+        num_columns = num_windows * static_dimension
+
+        mu_frames = np.asarray(features[:, :num_columns], dtype=np.float64)
+        mu_frames = mu_frames.reshape(num_frames, num_windows, static_dimension).transpose(1, 2, 0)
+
+        var_frames = np.array(covariance[:, :num_columns], dtype=np.float64)
+        var_frames = var_frames.reshape(num_frames, num_windows, static_dimension).transpose(1, 2, 0)
+
+        # Set high variance at boundaries for delta/acc to de-constrain them.
+        var_frames[1:, :, 0] = 1.0e11
+        var_frames[1:, :, -1] = 1.0e11
+
+        return mu_frames, var_frames
+
+    def _build_b(self, b_frames):
+        """
+        Builds b = sum(W_i^T * b_frames_i) for all static dimensions together.
+
+        Args:
+            b_frames (numpy.ndarray): Precision-weighted means (num_windows, static_dim, num_frames).
+
+        Returns:
+            numpy.ndarray: b with shape (static_dim, num_frames).
+        """
+        num_windows, static_dimension, num_frames = b_frames.shape
+
+        b = np.zeros((static_dimension, num_frames))
+
+        for (l, u, win_coeff), b_win in zip(self.windows, b_frames):
+            # row t of W_i has coefficient win_coeff[i] at column t + i - l
+            for i, coeff_i in enumerate(win_coeff):
+                offset_i = i - l
+                start = max(0, -offset_i)
+                end = min(num_frames, num_frames - offset_i)
+                if start >= end:
+                    continue
+                b[:, start + offset_i:end + offset_i] += coeff_i * b_win[:, start:end]
+
+        return b
+
+    def _build_prec_bands(self, tau_frames):
+        """
+        Builds the lower band of P = sum(W_i^T * D_i * W_i) for all static
+        dimensions together.
+
+        Args:
+            tau_frames (numpy.ndarray): Precisions (num_windows, static_dim, num_frames).
+
+        Returns:
+            numpy.ndarray: P in LAPACK lower band storage with shape
+                (static_dim, band_width + 1, num_frames), i.e. prec_bands[d, k, t] = P_d[t + k, t].
+        """
+        num_windows, static_dimension, num_frames = tau_frames.shape
+
+        prec_bands = np.zeros((static_dimension, self.band_width + 1, num_frames))
+
+        for (l, u, win_coeff), tau_win in zip(self.windows, tau_frames):
+            for i, coeff_i in enumerate(win_coeff):
+                offset_i = i - l
+                start = max(0, -offset_i)
+                for j in range(i, len(win_coeff)):
+                    offset_j = j - l
+                    end = min(num_frames, num_frames - offset_j)
+                    if start >= end:
+                        continue
+                    prec_bands[:, j - i, start + offset_i:end + offset_i] += \
+                        (coeff_i * win_coeff[j]) * tau_win[:, start:end]
+
+        return prec_bands
+
+    def _factorise(self, prec_bands):
+        """
+        Computes the banded Cholesky factor L of P for every static dimension.
+
+        Returns:
+            numpy.ndarray: L in lower band storage, shaped like prec_bands.
+        """
+        chol_bands = np.empty_like(prec_bands)
+        for d in range(prec_bands.shape[0]):
+            chol_bands[d] = cholesky_banded(prec_bands[d], lower=True, check_finite=False)
+        return chol_bands
+
+    def _truncate_factor(self, chol_bands, tau_frames):
+        """
+        Derives the Cholesky factor for a shorter utterance from a cached one.
+
+        Rows 0 .. T-3 of P are identical for every utterance length T (with the
+        same time-invariant variance), and so are the corresponding rows of its
+        Cholesky factor. Only rows T-2 and T-1, which include the
+        end-of-utterance boundary, are recomputed here.
+
+        Args:
+            chol_bands (numpy.ndarray): Cached factor for at least num_frames frames.
+            tau_frames (numpy.ndarray): Precisions (num_windows, static_dim, num_frames).
+
+        Returns:
+            numpy.ndarray: The factor for num_frames frames in lower band storage.
+        """
+        num_frames = tau_frames.shape[2]
+
+        # rows T-2 and T-1 of P only involve the last four frames
+        tail_bands = self._build_prec_bands(tau_frames[:, :, -4:])
+        chol = chol_bands[:, :, :num_frames].copy()
+
+        for row in (num_frames - 2, num_frames - 1):
+            tail_row = row - (num_frames - 4)
+            l_row_2 = tail_bands[:, 2, tail_row - 2] / chol[:, 0, row - 2]
+            l_row_1 = (tail_bands[:, 1, tail_row - 1] - l_row_2 * chol[:, 1, row - 2]) / chol[:, 0, row - 1]
+            chol[:, 2, row - 2] = l_row_2
+            chol[:, 1, row - 1] = l_row_1
+            chol[:, 0, row] = np.sqrt(tail_bands[:, 0, tail_row] - l_row_2 ** 2 - l_row_1 ** 2)
+
+        # entries that would refer to rows beyond the end are not used
+        chol[:, 1, -1] = 0.0
+        chol[:, 2, -2:] = 0.0
+
+        return chol
+
+    def _cached_factor(self, variance, tau_frames):
+        """
+        Returns the Cholesky factor of a time-invariant precision matrix,
+        reusing and updating the factor cache.
+
+        Args:
+            variance (numpy.ndarray): The variance vector shared by all frames.
+            tau_frames (numpy.ndarray): Precisions (num_windows, static_dim, num_frames).
+        """
+        num_frames = tau_frames.shape[2]
+        cache_key = np.asarray(variance, dtype=np.float64).tobytes()
+        chol_bands = self.factor_cache.get(cache_key)
+
+        if num_frames < 4 or self.band_width != 2:
+            return self._factorise(self._build_prec_bands(tau_frames))
+
+        if chol_bands is None or chol_bands.shape[2] < num_frames:
+            chol_bands = self._factorise(self._build_prec_bands(tau_frames))
+            self.factor_cache[cache_key] = chol_bands
+            return chol_bands
+
+        if chol_bands.shape[2] == num_frames:
+            return chol_bands
+
+        return self._truncate_factor(chol_bands, tau_frames)
+
+    def generation(self, features, covariance, static_dimension):
+        """
+        Generates a smooth parameter trajectory using MLPG.
+
+        Args:
+            features (numpy.ndarray): Input features (num_frames x (static_dim * 3)).
+            covariance (numpy.ndarray): Covariance/variance (num_frames x (static_dim * 3)).
+            static_dimension (int): The number of static feature dimensions.
+
+        Returns:
+            numpy.ndarray: The smoothed static parameter trajectory (num_frames x static_dim).
+        """
+        logger = logging.getLogger('param_generation')
+        logger.debug('starting MLParameterGeneration.generation')
+
+        mu_frames, var_frames = self._split_windows(features, covariance, static_dimension)
+
+        tau_frames = 1.0 / var_frames
+        b_frames = mu_frames * tau_frames
+
+        b = self._build_b(b_frames)
+
+        gen_parameter = np.empty((static_dimension, features.shape[0]))
+
+        num_columns = len(self.windows) * static_dimension
+        if self.cache_factors and np.all(covariance[:, :num_columns] == covariance[:1, :num_columns]):
+            chol_bands = self._cached_factor(covariance[0, :num_columns], tau_frames)
+            for d in range(static_dimension):
+                gen_parameter[d] = cho_solve_banded((chol_bands[d], True), b[d], check_finite=False)
+        else:
+            prec_bands = self._build_prec_bands(tau_frames)
+            for d in range(static_dimension):
+                gen_parameter[d] = solveh_banded(prec_bands[d], b[d], lower=True, check_finite=False)
+
+        return np.ascontiguousarray(gen_parameter.T)
@@ -182,4 +182,136 @@ class MLParameterGeneration(object):
 
             gen_parameter[:, d] = mean_traj
 
-        return gen_parameter
\ No newline at end of file
+        return gen_parameter
+
+class StreamingMLParameterGeneration(object):
+    """
+    Low-latency MLPG over a stream of frame chunks with a bounded look-ahead.
+
+    Frames are pushed in chunks as the acoustic model produces them. A frame is
+    emitted once look_ahead further frames have arrived: MLPG is then solved
+    over a window that also keeps up to look_back already-emitted frames as
+    left context, so each call costs O(look_back + chunk + look_ahead) and
+    time-to-first-output no longer depends on the utterance length. The
+    influence of frames beyond the window decays quickly, so with 20-50
+    frames of look-ahead the output is close to the full-utterance solution;
+    deviation_from_full measures how close.
+    """
+
+    def __init__(self, generator=None, look_ahead=30, look_back=30):
+        """
+        Args:
+            generator: The MLPG engine used for each window; defaults to
+                MLParameterGeneration from this module.
+            look_ahead (int): Number of future frames required before a frame is emitted.
+            look_back (int): Number of already-emitted frames kept as left context.
+        """
+        if generator is None:
+            generator = MLParameterGeneration()
+        self.generator = generator
+        self.look_ahead = look_ahead
+        self.look_back = look_back
+        self.reset()
+
+    def reset(self):
+        """
+        Starts a new utterance.
+        """
+        self.features = None
+        self.covariance = None
+        self.buffer_start = 0    # utterance frame index of the first buffered frame
+        self.num_emitted = 0     # number of frames emitted so far
+        self.num_received = 0    # number of frames pushed so far
+
+    def _emit(self, emit_end, static_dimension):
+        """
+        Solves MLPG over the buffered window and returns frames [num_emitted, emit_end).
+        """
+        window = self.generator.generation(self.features, self.covariance, static_dimension)
+        gen_parameter = window[self.num_emitted - self.buffer_start:emit_end - self.buffer_start]
+        self.num_emitted = emit_end
+
+        # keep only look_back frames of left context for the next window
+        keep_from = max(self.buffer_start, self.num_emitted - self.look_back)
+        self.features = self.features[keep_from - self.buffer_start:]
+        self.covariance = self.covariance[keep_from - self.buffer_start:]
+        self.buffer_start = keep_from
+
+        return gen_parameter
+
+    def push(self, features, covariance, static_dimension):
+        """
+        Adds a chunk of frames and returns any static frames that can now be emitted.
+
+        Args:
+            features (numpy.ndarray): Chunk of means (chunk_frames x (static_dim * 3)).
+            covariance (numpy.ndarray): Chunk of variances (chunk_frames x (static_dim * 3)).
+            static_dimension (int): The number of static feature dimensions.
+
+        Returns:
+            numpy.ndarray: Newly emitted static frames (possibly zero rows).
+        """
+        if self.features is None:
+            self.features = np.array(features)
+            self.covariance = np.array(covariance)
+        else:
+            self.features = np.concatenate((self.features, features), axis=0)
+            self.covariance = np.concatenate((self.covariance, covariance), axis=0)
+        self.num_received += features.shape[0]
+
+        emit_end = self.num_received - self.look_ahead
+        if emit_end <= self.num_emitted:
+            return np.zeros((0, static_dimension))
+
+        return self._emit(emit_end, static_dimension)
+
+    def flush(self, static_dimension):
+        """
+        Ends the utterance and returns all frames not yet emitted.
+        """
+        if self.num_received <= self.num_emitted:
+            gen_parameter = np.zeros((0, static_dimension))
+        else:
+            gen_parameter = self._emit(self.num_received, static_dimension)
+        self.reset()
+        return gen_parameter
+
+    def generation(self, features, covariance, static_dimension, chunk_size=20):
+        """
+        Runs a whole utterance through the streaming generator chunk by chunk.
+
+        Returns:
+            numpy.ndarray: The static parameter trajectory (num_frames x static_dim).
+        """
+        self.reset()
+        num_frames = features.shape[0]
+        gen_parameter = []
+        for start in range(0, num_frames, chunk_size):
+            gen_parameter.append(self.push(features[start:start + chunk_size],
+                                           covariance[start:start + chunk_size], static_dimension))
+        gen_parameter.append(self.flush(static_dimension))
+
+        return np.concatenate(gen_parameter, axis=0)
+
+    def deviation_from_full(self, features, covariance, static_dimension, chunk_size=20):
+        """
+        Compares streaming output with the full-utterance MLPG solution.
+
+        Returns:
+            dict: 'max_abs_error' and 'rms_error' over all frames and dimensions,
+                and 'max_abs_error_per_dim', a vector with one entry per static dimension.
+        """
+        logger = logging.getLogger('param_generation')
+
+        streamed = self.generation(features, covariance, static_dimension, chunk_size)
+        full = self.generator.generation(features, covariance, static_dimension)
+
+        error = np.abs(streamed - full)
+        deviation = {'max_abs_error': float(error.max()) if error.size else 0.0,
+                     'rms_error': float(np.sqrt(np.mean(error ** 2))) if error.size else 0.0,
+                     'max_abs_error_per_dim': error.max(axis=0) if error.size else np.zeros(static_dimension)}
+
+        logger.info('streaming MLPG (chunk %d, look-ahead %d, look-back %d): max abs error %.3e, rms error %.3e' %
+                    (chunk_size, self.look_ahead, self.look_back, deviation['max_abs_error'], deviation['rms_error']))
+
+        return deviation
@@ -0,0 +1,124 @@
+################################################################################
+#           The Neural Network (NN) based Speech Synthesis System
+#                https://svn.ecdf.ed.ac.uk/repo/inf/dnn_tts/
+#
+#                Centre for Speech Technology Research
+#                     University of Edinburgh, UK
+#                      Copyright (c) 2014-2015
+#                        All Rights Reserved.
+#
+# The system as a whole and most of the files in it are distributed
+# under the following copyright and conditions
+#
+#  Permission is hereby granted, free of charge, to use and distribute
+#  this software and its documentation without restriction, including
+#  without limitation the rights to use, copy, modify, merge, publish,
+#  distribute, sublicense, and/or sell copies of this work, and to
+#  permit persons to whom this work is furnished to do so, subject to
+#  the following conditions:
+#
+#   - Redistributions of source code must retain the above copyright
+#     notice, this list of conditions and the following disclaimer.
+#   - Redistributions in binary form must reproduce the above
+#     copyright notice, this list of conditions and the following
+#     disclaimer in the documentation and/or other materials provided
+#     with the distribution.
+#   - The authors' names may not be used to endorse or promote products derived
+#     from this software without specific prior written permission.
+#
+#  THE UNIVERSITY OF EDINBURGH AND THE CONTRIBUTORS TO THIS WORK
+#  DISCLAIM ALL WARRANTIES WITH REGARD TO THIS SOFTWARE, INCLUDING
+#  ALL IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS, IN NO EVENT
+#  SHALL THE UNIVERSITY OF EDINBURGH NOR THE CONTRIBUTORS BE LIABLE
+#  FOR ANY SPECIAL, INDIRECT OR CONSEQUENTIAL DAMAGES OR ANY DAMAGES
+#  WHATSOEVER RESULTING FROM LOSS OF USE, DATA OR PROFITS, WHETHER IN
+#  AN ACTION OF CONTRACT, NEGLIGENCE OR OTHER TORTIOUS ACTION,
+#  ARISING OUT OF OR IN CONNECTION WITH THE USE OR PERFORMANCE OF
+#  THIS SOFTWARE.
+################################################################################
+
+import multiprocessing
+import numpy
+try:
+    from io_funcs.binary_io import BinaryIOCollection
+    from io_funcs.prefetch_reader import PrefetchReader
+    from utils.utils import effective_cpu_count
+except ModuleNotFoundError:
+    from ..io_funcs.binary_io import BinaryIOCollection
+    from ..io_funcs.prefetch_reader import PrefetchReader
+    from ..utils.utils import effective_cpu_count
+
+
+def _transform_file_list(args):
+    (kernel, in_file_list, out_file_list, storage) = args
+    io_funcs = BinaryIOCollection()
+    file_reader = PrefetchReader(in_file_list, lambda file_name: io_funcs.load_binary_file(file_name, kernel.dimension))
+    for (i, features) in enumerate(file_reader):
+        ## the loaded features are not used again, so they are overwritten
+        io_funcs.array_to_binary_file(kernel.apply(features, in_place=True), out_file_list[i], storage=storage)
+
+def transform_file_list(kernel, in_file_list, out_file_list, storage=None, num_workers=1):
+    '''
+    applies kernel to every file of in_file_list, writing to out_file_list. With num_workers other
+    than 1 the files are split over that many worker processes (0 uses all cores).
+    '''
+    assert len(in_file_list) == len(out_file_list), \
+        'The input and output file numbers are not the same! %d vs %d' %(len(in_file_list), len(out_file_list))
+
+    if num_workers == 0:
+        num_workers = effective_cpu_count()
+    if num_workers <= 1 or len(in_file_list) < 2:
+        _transform_file_list((kernel, in_file_list, out_file_list, storage))
+        return
+
+    ## several chunks per worker so that workers finishing early pick up more
+    chunk_number = min(len(in_file_list), num_workers * 4)
+    chunk_bounds = numpy.linspace(0, len(in_file_list), chunk_number + 1).astype(int)
+    chunks = [(kernel, in_file_list[chunk_bounds[k]:chunk_bounds[k+1]], out_file_list[chunk_bounds[k]:chunk_bounds[k+1]], storage)
+              for k in range(chunk_number)]
+
+    pool = multiprocessing.Pool(num_workers)
+    for _ in pool.imap_unordered(_transform_file_list, chunks):
+        pass
+    pool.close()
+    pool.join()
+
+
+class AffineKernel(object):
+    '''
+    The per-dimension transform (features - centre_vector) * scale_vector + offset_vector behind the
+    min-max and mean-variance (de)normalisations, with the vectors computed once. It is applied in
+    float32 with broadcasting, so no frames x dim matrices other than the result are made, and in
+    place when the caller no longer needs the input. The exclude_columns are passed through unchanged.
+    '''
+    def __init__(self, centre_vector, scale_vector, offset_vector, exclude_columns=[]):
+        self.dimension = numpy.size(scale_vector)
+
+        exclude_mask = numpy.zeros(self.dimension, dtype=bool)
+        exclude_mask[list(exclude_columns)] = True
+
+        vectors = []
+        for (vector, identity) in [(centre_vector, 0.0), (scale_vector, 1.0), (offset_vector, 0.0)]:
+            vector = numpy.array(numpy.broadcast_to(vector, (1, self.dimension)), dtype=numpy.float64).reshape(-1)
+            vector[exclude_mask] = identity
+            vectors.append(vector.astype(numpy.float32))
+        (self.centre_vector, self.scale_vector, self.offset_vector) = vectors
+
+    def apply(self, features, in_place=False):
+        ## returns the transformed (frames x dim) float32 features; with in_place the input is
+        ## overwritten if it is a writable float32 array
+        float_features = numpy.asarray(features, dtype=numpy.float32).reshape((-1, self.dimension))
+        if (in_place or not numpy.may_share_memory(float_features, features)) and float_features.flags.writeable:
+            out = float_features
+        else:
+            out = None
+
+        if self.centre_vector.any():
+            out = numpy.subtract(float_features, self.centre_vector, out=out)
+            out = numpy.multiply(out, self.scale_vector, out=out)
+        else:
+            out = numpy.multiply(float_features, self.scale_vector, out=out)
+        if self.offset_vector.any():
+            out = numpy.add(out, self.offset_vector, out=out)
+
+        return  out
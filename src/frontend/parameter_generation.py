@@ -39,23 +39,47 @@
 
 try:
     from io_funcs.binary_io import BinaryIOCollection
+    from utils.utils import effective_cpu_count
 except ModuleNotFoundError:
     from ..io_funcs.binary_io import BinaryIOCollection
+    from ..utils.utils import effective_cpu_count
 import os, re, sys
 import numpy
 import logging
+import multiprocessing
 
 try:
-    from .mlpg_fast2 import MLParameterGeneration
+    from .mlpg_banded import MLParameterGeneration
 except (ModuleNotFoundError, ImportError):
-    from mlpg_fast import MLParameterGeneration
+    try:
+        from .mlpg_fast2 import MLParameterGeneration
+    except (ModuleNotFoundError, ImportError):
+        from mlpg_fast import MLParameterGeneration
+
+## per-process state of the parameter generation workers, set up once per worker
+## by _init_generation_worker so the covariance is not reloaded for every task
+_worker_generator = None
+
+def _init_generation_worker(generator, var_file_dict, out_dimension_dict):
+    global _worker_generator
+    _worker_generator = generator
+    if var_file_dict:
+        _worker_generator.load_covariance(var_file_dict, out_dimension_dict)
+
+def _run_generation_task(args):
+    (method_name, task_args) = args
+    return getattr(_worker_generator, method_name)(*task_args)
+
 
 class   ParameterGeneration(object):
 
-    def __init__(self, gen_wav_features = ['mgc', 'lf0', 'bap'], enforce_silence=False):
+    def __init__(self, gen_wav_features = ['mgc', 'lf0', 'bap'], enforce_silence=False, num_workers=1):
         self.gen_wav_features = gen_wav_features
         self.enforce_silence  = enforce_silence
 
+        ## number of worker processes; 1 runs everything in this process, 0 uses all CPUs
+        self.num_workers = num_workers
+
         # Debug:
         self.inf_float = -1.0e+10
         #self.inf_float = -50000
@@ -65,44 +89,82 @@ class   ParameterGeneration(object):
 
         self.var = {}
 
+        ## created on first use, so that each worker keeps its own MLPG factor cache
+        self.mlpg_algo = None
+
+    def worker_number(self, task_number):
+        ## the number of worker processes for task_number tasks: num_workers, where 0 means one
+        ## per available CPU, and no more than there are tasks
+        num_workers = self.num_workers
+        if num_workers == 0:
+            num_workers = effective_cpu_count()
+        return  max(1, min(num_workers, task_number))
+
+    def run_tasks(self, method_name, task_list, var_file_dict=None, out_dimension_dict=None):
+        """ Runs self.<method_name>(*task_args) for every task_args in task_list,
+            either serially or fanned out over a pool of worker processes.
+        """
+        logger = logging.getLogger('param_generation')
+
+        num_workers = self.worker_number(len(task_list))
+
+        if num_workers <= 1:
+            if var_file_dict:
+                self.load_covariance(var_file_dict, out_dimension_dict)
+            return [getattr(self, method_name)(*task_args) for task_args in task_list]
+
+        logger.info('running %d %s tasks on %d worker processes' % (len(task_list), method_name, num_workers))
+
+        pool = multiprocessing.Pool(num_workers, initializer=_init_generation_worker,
+                                    initargs=(ParameterGeneration(self.gen_wav_features, self.enforce_silence), var_file_dict, out_dimension_dict))
+        results = pool.map(_run_generation_task, [(method_name, task_args) for task_args in task_list], chunksize=1)
+        pool.close()
+        pool.join()
+
+        return results
+
     def duration_decomposition(self, in_file_list, dimension, out_dimension_dict, file_extension_dict):
 
         logger = logging.getLogger('param_generation')
 
         logger.debug('duration_decomposition for %d files' % len(in_file_list) )
 
-        state_number = 5  ## hard coding, try removing in future?
-
         if len(list(out_dimension_dict.keys()))>1:
             logger.critical("we don't support any additional features along with duration as of now.")
             sys.exit(1)
         else:
             feature_name = list(out_dimension_dict.keys())[0]
 
-        io_funcs = BinaryIOCollection()
-
-        findex=0
         flen=len(in_file_list)
-        for file_name in in_file_list:
+        task_list = [(file_name, findex+1, flen, dimension, file_extension_dict[feature_name])
+                     for findex, file_name in enumerate(in_file_list)]
 
-            findex=findex+1
+        self.run_tasks('decompose_duration_file', task_list)
 
-            dir_name = os.path.dirname(file_name)
-            file_id = os.path.splitext(os.path.basename(file_name))[0]
+    def decompose_duration_file(self, file_name, findex, flen, dimension, file_extension):
 
-            features, frame_number = io_funcs.load_binary_file_frame(file_name, dimension)
-            gen_features = numpy.int32(numpy.round(features))
-            gen_features[gen_features<1]=1
+        logger = logging.getLogger('param_generation')
 
-            if dimension > state_number:
-                gen_features = gen_features[:, state_number]
+        state_number = 5  ## hard coding, try removing in future?
 
-            logger.info('processing %4d of %4d: %s' % (findex,flen,file_name) )
+        io_funcs = BinaryIOCollection()
 
-            new_file_name = os.path.join(dir_name, file_id + file_extension_dict[feature_name])
-            io_funcs.array_to_binary_file(gen_features, new_file_name)
+        dir_name = os.path.dirname(file_name)
+        file_id = os.path.splitext(os.path.basename(file_name))[0]
+
+        features, frame_number = io_funcs.load_binary_file_frame(file_name, dimension)
+        gen_features = numpy.int32(numpy.round(features))
+        gen_features[gen_features<1]=1
+
+        if dimension > state_number:
+            gen_features = gen_features[:, state_number]
+
+        logger.info('processing %4d of %4d: %s' % (findex,flen,file_name) )
 
-            logger.debug('wrote to file %s' % new_file_name)
+        new_file_name = os.path.join(dir_name, file_id + file_extension)
+        io_funcs.array_to_binary_file(gen_features, new_file_name, atomic=True, header=False)
+
+        logger.debug('wrote to file %s' % new_file_name)
 
     def acoustic_decomposition(self, in_file_list, dimension, out_dimension_dict, file_extension_dict, var_file_dict, do_MLPG=True, cfg=None):
 
@@ -110,8 +172,6 @@ class   ParameterGeneration(object):
 
         logger.debug('acoustic_decomposition for %d files' % len(in_file_list) )
 
-        self.load_covariance(var_file_dict, out_dimension_dict)
-
         stream_start_index = {}
         dimension_index = 0
         recorded_vuv = False
@@ -126,79 +186,98 @@ class   ParameterGeneration(object):
 
             dimension_index += out_dimension_dict[feature_name]
 
-        io_funcs = BinaryIOCollection()
+        silence_pattern = None
+        label_align_dir = None
+        if self.enforce_silence:
+            silence_pattern = cfg.silence_pattern
+            label_align_dir = cfg.in_label_align_dir
 
-        mlpg_algo = MLParameterGeneration()
+        ## in parallel mode each (file, stream) pair is a separate task; serially
+        ## all streams of a file are generated together so the file is read once
+        if self.worker_number(len(in_file_list) * len(self.gen_wav_features)) == 1:
+            stream_groups = [self.gen_wav_features]
+        else:
+            stream_groups = [[feature_name] for feature_name in self.gen_wav_features]
 
-        findex=0
         flen=len(in_file_list)
-        for file_name in in_file_list:
+        task_list = [(file_name, findex+1, flen, feature_names, dimension, out_dimension_dict, file_extension_dict,
+                      stream_start_index, do_MLPG, silence_pattern, label_align_dir)
+                     for findex, file_name in enumerate(in_file_list) for feature_names in stream_groups]
 
-            findex=findex+1
+        self.run_tasks('decompose_acoustic_file', task_list, var_file_dict, out_dimension_dict)
 
-            dir_name = os.path.dirname(file_name)
-            file_id = os.path.splitext(os.path.basename(file_name))[0]
+    def decompose_acoustic_file(self, file_name, findex, flen, feature_names, dimension, out_dimension_dict, file_extension_dict,
+                                stream_start_index, do_MLPG=True, silence_pattern=None, label_align_dir=None):
 
-            features, frame_number = io_funcs.load_binary_file_frame(file_name, dimension)
+        logger = logging.getLogger('param_generation')
+
+        if self.mlpg_algo is None:
+            self.mlpg_algo = MLParameterGeneration()
+
+        io_funcs = BinaryIOCollection()
 
-            logger.info('processing %4d of %4d: %s' % (findex,flen,file_name) )
+        dir_name = os.path.dirname(file_name)
+        file_id = os.path.splitext(os.path.basename(file_name))[0]
 
-            for feature_name in self.gen_wav_features:
+        features, frame_number = io_funcs.load_binary_file_frame(file_name, dimension)
 
-                logger.debug(' feature: %s' % feature_name)
+        logger.info('processing %4d of %4d: %s' % (findex,flen,file_name) )
 
-                current_features = features[:, stream_start_index[feature_name]:stream_start_index[feature_name]+out_dimension_dict[feature_name]]
-                ### fast version wants variance per frame, not single global one:
-                var = self.var[feature_name]
-                var = numpy.transpose(numpy.tile(var,frame_number))
+        for feature_name in feature_names:
 
+            logger.debug(' feature: %s' % feature_name)
 
-#                print  var.shape[1]
-                if do_MLPG == False:
-                    gen_features = current_features
-                else:
-                    gen_features = mlpg_algo.generation(current_features, var, out_dimension_dict[feature_name]//3)
-#                else:
-#                    self.logger.critical("the dimensions do not match for MLPG: %d vs %d" %(var.shape[1], out_dimension_dict[feature_name]))
-#                    raise
+            current_features = features[:, stream_start_index[feature_name]:stream_start_index[feature_name]+out_dimension_dict[feature_name]]
+            ### fast version wants variance per frame, not single global one:
+            var = self.var[feature_name]
+            var = numpy.transpose(numpy.tile(var,frame_number))
 
-                logger.debug(' feature dimensions: %d by %d' %(gen_features.shape[0], gen_features.shape[1]))
 
-                if feature_name in ['lf0', 'F0']:
-                    if 'vuv' in stream_start_index:
-                        vuv_feature = features[:, stream_start_index['vuv']:stream_start_index['vuv']+1]
+#            print  var.shape[1]
+            if do_MLPG == False:
+                gen_features = current_features
+            else:
+                gen_features = self.mlpg_algo.generation(current_features, var, out_dimension_dict[feature_name]//3)
+#            else:
+#                self.logger.critical("the dimensions do not match for MLPG: %d vs %d" %(var.shape[1], out_dimension_dict[feature_name]))
+#                raise
+
+            logger.debug(' feature dimensions: %d by %d' %(gen_features.shape[0], gen_features.shape[1]))
 
-                        for i in range(frame_number):
-                            if vuv_feature[i, 0] < 0.5 or gen_features[i, 0] < numpy.log(20):
-                                gen_features[i, 0] = self.inf_float
+            if feature_name in ['lf0', 'F0']:
+                if 'vuv' in stream_start_index:
+                    vuv_feature = features[:, stream_start_index['vuv']:stream_start_index['vuv']+1]
 
-                new_file_name = os.path.join(dir_name, file_id + file_extension_dict[feature_name])
+                    for i in range(frame_number):
+                        if vuv_feature[i, 0] < 0.5 or gen_features[i, 0] < numpy.log(20):
+                            gen_features[i, 0] = self.inf_float
+
+            new_file_name = os.path.join(dir_name, file_id + file_extension_dict[feature_name])
 
-                if self.enforce_silence:
-                    silence_pattern = cfg.silence_pattern
-                    label_align_dir = cfg.in_label_align_dir
-                    in_f = open(label_align_dir+'/'+file_id+'.lab','r')
-                    for line in in_f.readlines():
-                        line = line.strip()
+            if self.enforce_silence:
+                in_f = open(label_align_dir+'/'+file_id+'.lab','r')
+                for line in in_f.readlines():
+                    line = line.strip()
 
-                        if len(line) < 1:
-                            continue
-                        temp_list  = re.split('\s+', line)
-                        start_time = int(int(temp_list[0])*(10**-4)/5)
-                        end_time   = int(int(temp_list[1])*(10**-4)/5)
+                    if len(line) < 1:
+                        continue
+                    temp_list  = re.split('\s+', line)
+                    start_time = int(int(temp_list[0])*(10**-4)/5)
+                    end_time   = int(int(temp_list[1])*(10**-4)/5)
 
-                        full_label = temp_list[2]
+                    full_label = temp_list[2]
 
-                        label_binary_flag = self.check_silence_pattern(full_label, silence_pattern)
+                    label_binary_flag = self.check_silence_pattern(full_label, silence_pattern)
 
-                        if label_binary_flag:
-                            if feature_name in ['lf0', 'F0', 'mag']:
-                                gen_features[start_time:end_time, :] = self.inf_float
-                            else:
-                                gen_features[start_time:end_time, :] = 0.0
+                    if label_binary_flag:
+                        if feature_name in ['lf0', 'F0', 'mag']:
+                            gen_features[start_time:end_time, :] = self.inf_float
+                        else:
+                            gen_features[start_time:end_time, :] = 0.0
+                in_f.close()
 
-                io_funcs.array_to_binary_file(gen_features, new_file_name)
-                logger.debug(' wrote to file %s' % new_file_name)
+            io_funcs.array_to_binary_file(gen_features, new_file_name, atomic=True, header=False)
+            logger.debug(' wrote to file %s' % new_file_name)
 
 
     def load_covariance(self, var_file_dict, out_dimension_dict):
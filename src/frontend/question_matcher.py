@@ -0,0 +1,226 @@
+################################################################################
+#           The Neural Network (NN) based Speech Synthesis System
+#                https://svn.ecdf.ed.ac.uk/repo/inf/dnn_tts/
+#
+#                Centre for Speech Technology Research
+#                     University of Edinburgh, UK
+#                      Copyright (c) 2014-2015
+#                        All Rights Reserved.
+#
+# The system as a whole and most of the files in it are distributed
+# under the following copyright and conditions
+#
+#  Permission is hereby granted, free of charge, to use and distribute
+#  this software and its documentation without restriction, including
+#  without limitation the rights to use, copy, modify, merge, publish,
+#  distribute, sublicense, and/or sell copies of this work, and to
+#  permit persons to whom this work is furnished to do so, subject to
+#  the following conditions:
+#
+#   - Redistributions of source code must retain the above copyright
+#     notice, this list of conditions and the following disclaimer.
+#   - Redistributions in binary form must reproduce the above
+#     copyright notice, this list of conditions and the following
+#     disclaimer in the documentation and/or other materials provided
+#     with the distribution.
+#   - The authors' names may not be used to endorse or promote products derived
+#     from this software without specific prior written permission.
+#
+#  THE UNIVERSITY OF EDINBURGH AND THE CONTRIBUTORS TO THIS WORK
+#  DISCLAIM ALL WARRANTIES WITH REGARD TO THIS SOFTWARE, INCLUDING
+#  ALL IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS, IN NO EVENT
+#  SHALL THE UNIVERSITY OF EDINBURGH NOR THE CONTRIBUTORS BE LIABLE
+#  FOR ANY SPECIAL, INDIRECT OR CONSEQUENTIAL DAMAGES OR ANY DAMAGES
+#  WHATSOEVER RESULTING FROM LOSS OF USE, DATA OR PROFITS, WHETHER IN
+#  AN ACTION OF CONTRACT, NEGLIGENCE OR OTHER TORTIOUS ACTION,
+#  ARISING OUT OF OR IN CONNECTION WITH THE USE OR PERFORMANCE OF
+#  THIS SOFTWARE.
+################################################################################
+
+import logging
+import re
+import numpy
+
+## field delimiters in HTS full-context labels: single punctuation characters (^ - + = @ _ | ...)
+## or a part marker such as /A: (or /A/ in some label formats)
+LEFT_DELIMITER = re.compile(r'/[A-Za-z]+[:/]|[^0-9A-Za-z]')
+RIGHT_DELIMITER = re.compile(r'(/[A-Za-z]+[:/]|[^0-9A-Za-z])$')
+
+INTEGER_PATTERN = '(\\d+)'
+FLOAT_PATTERN = '([\\d\\.]+)'
+
+class HTSQuestionMatcher(object):
+    """
+    Answers an HTS question set by looking up the delimited fields of a label.
+
+    A QS alternative such as -aa+ is true exactly when one of the label's
+    (-, +) fields, i.e. the text between an occurrence of '-' and the next '+',
+    is 'aa'. Alternatives are therefore grouped by their (left, right)
+    delimiter pair into dictionaries from field value to question indices,
+    and each label is split once into the fields those pairs select. CQS
+    questions such as &(\\d+)+ take the first such field made up only of
+    digits. Questions that cannot be put in this form (inner wildcards, or a
+    value that the right delimiter could occur in) keep their compiled
+    regular expression, so the result is always identical to
+    HTSLabelNormalisation.pattern_matching_binary and
+    pattern_matching_continous_position.
+    """
+
+    def __init__(self, binary_questions, continuous_questions):
+        """
+        binary_questions: one (question_key, question_list, compiled_list) tuple per QS line
+        continuous_questions: one (question, compiled) tuple per CQS line
+        """
+        logger = logging.getLogger("labels")
+
+        self.binary_size = len(binary_questions)
+        self.continuous_size = len(continuous_questions)
+
+        ## left delimiter -> right delimiter -> [{field value: binary indices}, [(continuous index, allow decimal point)]]
+        ## None stands for the start (left) or end (right) of the label
+        self.field_lookup = {}
+        self.binary_fallback = []
+        self.continuous_fallback = []
+
+        for index, (question_key, question_list, compiled_list) in enumerate(binary_questions):
+            anchor_start = question_key.find('LL-') >= 0
+            for question, compiled in zip(question_list, compiled_list):
+                field = self.split_binary_question(question, anchor_start)
+                if field is None:
+                    self.binary_fallback.append((index, compiled))
+                    continue
+                left, value, right = field
+                value_map = self.field_entry(left, right)[0]
+                value_map.setdefault(value, []).append(index)
+
+        for index, (question, compiled) in enumerate(continuous_questions):
+            field = self.split_continuous_question(question)
+            if field is None:
+                self.continuous_fallback.append((index, compiled))
+                continue
+            left, allow_point, right = field
+            self.field_entry(left, right)[1].append((index, allow_point))
+
+        logger.debug('question matcher: %d field pairs, %d QS and %d CQS patterns left as regular expressions' %
+                     (sum(len(right_dict) for right_dict in self.field_lookup.values()), len(self.binary_fallback), len(self.continuous_fallback)))
+
+    def field_entry(self, left, right):
+        right_dict = self.field_lookup.setdefault(left, {})
+        if right not in right_dict:
+            right_dict[right] = [{}, []]
+        return right_dict[right]
+
+    def split_binary_question(self, question, anchor_start=False):
+        '''
+        splits a QS alternative into (left, value, right) so that the label contains it
+        exactly when value is one of the label's (left, right) fields, or returns None.
+        Anchoring follows wildcards2regex.
+        '''
+        if '*' in question:
+            anchor_start = anchor_start or not question.startswith('*')
+            anchor_end = not question.endswith('*')
+        else:
+            anchor_end = False
+        body = question.strip('*')
+        if '*' in body or '?' in body:
+            return None
+
+        if anchor_start:
+            left = None
+        else:
+            ms = LEFT_DELIMITER.match(body)
+            if ms is None:
+                return None
+            left = ms.group()
+            body = body[len(left):]
+
+        if anchor_end:
+            return left, body, None
+
+        ms = RIGHT_DELIMITER.search(body)
+        if ms is None:
+            return None
+        right = ms.group()
+        value = body[:ms.start()]
+        ## the field ends at the first occurrence of right, which must be the one after value
+        if (value + right).find(right) != len(value):
+            return None
+        return left, value, right
+
+    def split_continuous_question(self, question):
+        '''
+        splits a CQS question into (left, allow decimal point, right), or returns None
+        '''
+        if '*' in question or '?' in question:
+            return None
+        if question.count(INTEGER_PATTERN) + question.count(FLOAT_PATTERN) != 1:
+            return None
+
+        allow_point = FLOAT_PATTERN in question
+        left, right = question.split(FLOAT_PATTERN if allow_point else INTEGER_PATTERN)
+        if left == '':
+            return None
+        if right == '':
+            ## an integer pattern at the end is anchored to the end of the label
+            if allow_point:
+                return None
+            right = None
+        elif right[0].isdecimal() or (allow_point and right[0] == '.'):
+            return None
+        return left, allow_point, right
+
+    def label_fields(self, label, left, right_dict):
+        if left is None:
+            starts = [0]
+        else:
+            starts = []
+            position = label.find(left)
+            while position >= 0:
+                starts.append(position + len(left))
+                position = label.find(left, position + 1)
+
+        for right, entry in right_dict.items():
+            if right is None:
+                yield entry, [label[start:] for start in starts]
+            else:
+                fields = []
+                for start in starts:
+                    end = label.find(right, start)
+                    if end >= 0:
+                        fields.append(label[start:end])
+                yield entry, fields
+
+    def match(self, label):
+        '''
+        returns the binary and continuous question vectors for one label,
+        shaped (1, number of QS) and (1, number of CQS)
+        '''
+        lab_binary_vector = numpy.zeros((1, self.binary_size))
+        lab_continuous_vector = numpy.full((1, self.continuous_size), -1.0)
+
+        binary_indices = []
+        for left, right_dict in self.field_lookup.items():
+            for (value_map, continuous_entries), fields in self.label_fields(label, left, right_dict):
+                for field in fields:
+                    indices = value_map.get(field)
+                    if indices is not None:
+                        binary_indices.extend(indices)
+                for index, allow_point in continuous_entries:
+                    for field in fields:
+                        digits = field.replace('.', '') if allow_point else field
+                        if field and (digits == '' or digits.isdecimal()):
+                            lab_continuous_vector[0, index] = float(field)
+                            break
+
+        for index, compiled in self.binary_fallback:
+            if compiled.search(label) is not None:
+                binary_indices.append(index)
+
+        for index, compiled in self.continuous_fallback:
+            ms = compiled.search(label)
+            if ms is not None:
+                lab_continuous_vector[0, index] = ms.group(1)
+
+        lab_binary_vector[0, binary_indices] = 1
+
+        return lab_binary_vector, lab_continuous_vector
@@ -38,14 +38,117 @@
 ################################################################################
 
 
-import sys, numpy, re, math
+import sys, os, numpy, re, math, pickle, threading, logging
 try:
     from io_funcs.binary_io import BinaryIOCollection
+    from io_funcs.feature_archive import FeatureArchive, split_archive_path
 except ModuleNotFoundError:
     from ..io_funcs.binary_io import BinaryIOCollection
+    from ..io_funcs.feature_archive import FeatureArchive, split_archive_path
 from multiprocessing.dummy import Pool as ThreadPool
 
 
+def index_ranges(indices):
+    ## [start, end) rows covering runs of consecutive frame indices, in order
+    indices = numpy.asarray(indices, dtype=numpy.int64)
+    if indices.size == 0:
+        return  numpy.zeros((0, 2), dtype=numpy.int64)
+    breaks = numpy.flatnonzero(numpy.diff(indices) != 1) + 1
+    starts = indices[numpy.concatenate(([0], breaks))]
+    ends = indices[numpy.concatenate((breaks - 1, [indices.size - 1]))] + 1
+    return  numpy.stack((starts, ends), axis=1)
+
+def clip_ranges(ranges, frame_number):
+    ## the ranges restricted to frames below frame_number
+    ranges = ranges[ranges[:, 0] < frame_number]
+    return  numpy.stack((ranges[:, 0], numpy.minimum(ranges[:, 1], int(frame_number))), axis=1)
+
+def select_frame_ranges(data, ranges):
+    ## the rows of data in ranges, taken as slices
+    if ranges.shape[0] == 0:
+        return  data[0:0]
+    if ranges.shape[0] == 1:
+        return  data[ranges[0, 0]:ranges[0, 1]]
+    return  numpy.concatenate([data[start:end] for (start, end) in ranges])
+
+
+class SilenceRangeCache(object):
+    '''
+    Non-silent frame ranges of utterances, found once per alignment or binary label file and
+    shared by every SilenceRemover and trim_silence call in the process. Entries are keyed on the
+    file and on the settings that decide what is silence, and are found again when the file
+    changes. With cache_dir set the entries are also kept on disk, next to the label cache.
+    '''
+    ## for all instances, like BinaryIOCollection.mmap_mode
+    cache_dir = None
+
+    CACHE_FILE_NAME = 'silence_ranges.pkl'
+
+    entries = {}
+    loaded_dir = None
+    modified = False
+    lock = threading.Lock()
+
+    @classmethod
+    def cache_file(cls):
+        return  os.path.join(cls.cache_dir, cls.CACHE_FILE_NAME)
+
+    @classmethod
+    def load(cls):
+        ## called with the lock held
+        if cls.cache_dir is None or cls.loaded_dir == cls.cache_dir:
+            return
+        cls.loaded_dir = cls.cache_dir
+        if os.path.isfile(cls.cache_file()):
+            fid = open(cls.cache_file(), 'rb')
+            stored_entries = pickle.load(fid)
+            fid.close()
+            stored_entries.update(cls.entries)
+            cls.entries = stored_entries
+            logging.getLogger("labels").info('loaded %d silence ranges from %s' % (len(stored_entries), cls.cache_file()))
+
+    @classmethod
+    def save(cls):
+        if cls.cache_dir is None or not cls.modified:
+            return
+        if not os.path.isdir(cls.cache_dir):
+            os.makedirs(cls.cache_dir)
+        temp_file_name = '%s.tmp%d' % (cls.cache_file(), os.getpid())
+        fid = open(temp_file_name, 'wb')
+        with cls.lock:
+            pickle.dump(cls.entries, fid, protocol=pickle.HIGHEST_PROTOCOL)
+            cls.modified = False
+        fid.close()
+        os.replace(temp_file_name, cls.cache_file())
+
+    @classmethod
+    def file_stamp(cls, file_name):
+        ## what tells a changed file: for a file inside a feature archive, the archive and the
+        ## position of its record (a file written again gets a new record), otherwise its mtime and size
+        archive_path = split_archive_path(file_name)
+        if archive_path is not None:
+            (offset, length, frame_number, dimension) = FeatureArchive(archive_path[0]).locate(archive_path[1])
+            return  (os.stat(archive_path[0]).st_ino, offset, length)
+        file_stat = os.stat(file_name)
+        return  (file_stat.st_mtime, file_stat.st_size)
+
+    @classmethod
+    def get(cls, key, file_name, compute):
+        ## the cached value for key, or compute() if there is none for the current file_name
+        stamp = cls.file_stamp(file_name)
+        with cls.lock:
+            cls.load()
+            entry = cls.entries.get(key)
+        if entry is not None and entry[0] == stamp:
+            return  entry[1]
+
+        value = compute()
+        with cls.lock:
+            cls.entries[key] = (stamp, value)
+            cls.modified = True
+        return  value
+
+
 class SilenceRemover(object):
     def __init__(self, n_cmp, silence_pattern=['*-#+*'], label_type="state_align", remove_frame_features=True,
                  subphone_feats="none"):
@@ -70,35 +173,102 @@ class SilenceRemover(object):
         io_funcs = BinaryIOCollection()
 
         def _remove_silence(i):
-            if self.label_type == "phone_align":
-                if dur_file_list:
-                    dur_file_name = dur_file_list[i]
-                else:
-                    dur_file_name = None
-                nonsilence_indices = self.load_phone_alignment(in_align_list[i], dur_file_name)
+            if dur_file_list:
+                dur_file_name = dur_file_list[i]
             else:
-                nonsilence_indices = self.load_alignment(in_align_list[i])
+                dur_file_name = None
 
             ori_cmp_data = io_funcs.load_binary_file(in_data_list[i], self.n_cmp)
 
             frame_number = ori_cmp_data.size / self.n_cmp
 
-            if len(nonsilence_indices) == frame_number:
-                print('WARNING: no silence found!')
-                # previsouly: continue -- in fact we should keep non-silent data!
-
-            ## if labels have a few extra frames than audio, this can break the indexing, remove them:
-            nonsilence_indices = [ix for ix in nonsilence_indices if ix < frame_number]
+            nonsilence_ranges = self.nonsilence_frame_ranges(in_align_list[i], frame_number, dur_file_name)
 
-            new_cmp_data = ori_cmp_data[nonsilence_indices,]
+            new_cmp_data = select_frame_ranges(ori_cmp_data, nonsilence_ranges)
 
-            io_funcs.array_to_binary_file(new_cmp_data, out_data_list[i])
+            ## sparse label files stay sparse
+            io_funcs.array_to_binary_file(new_cmp_data, out_data_list[i], sparse_dim=io_funcs.sparse_label_dim(in_data_list[i]))
 
         pool = ThreadPool()
         pool.map(_remove_silence, range(file_number))
         pool.close()
         pool.join()
 
+        SilenceRangeCache.save()
+
+    def remove_silence_streams(self, in_data_list_dict, dimension_dict, in_align_list, out_data_list_dict=None):
+        '''
+        Removes silence from several streams of the same utterances in one pass: the alignment of
+        each utterance is looked up once and every stream is cut with it. The trimmed streams are
+        written to out_data_list_dict when it is given and are otherwise returned, as a dictionary
+        of lists of arrays in the order of in_align_list. n_cmp is not used.
+        '''
+        file_number = len(in_align_list)
+        for feature_name in in_data_list_dict:
+            if len(in_data_list_dict[feature_name]) != file_number:
+                print("The number of input and alignment files does not equal!\n")
+                sys.exit(1)
+            if out_data_list_dict and len(out_data_list_dict[feature_name]) != file_number:
+                print("The number of input and output files does not equal!\n")
+                sys.exit(1)
+
+        io_funcs = BinaryIOCollection()
+
+        trimmed_data_dict = {}
+        for feature_name in in_data_list_dict:
+            trimmed_data_dict[feature_name] = [None] * file_number
+
+        def _remove_silence_streams(i):
+            nonsilence_ranges = self.alignment_ranges(in_align_list[i])
+
+            for feature_name in in_data_list_dict:
+                in_file_name = in_data_list_dict[feature_name][i]
+                ori_data = io_funcs.load_binary_file(in_file_name, dimension_dict[feature_name])
+
+                frame_number = ori_data.size / dimension_dict[feature_name]
+
+                new_data = select_frame_ranges(ori_data, self.clip_nonsilence_ranges(nonsilence_ranges, frame_number))
+
+                if out_data_list_dict:
+                    io_funcs.array_to_binary_file(new_data, out_data_list_dict[feature_name][i], sparse_dim=io_funcs.sparse_label_dim(in_file_name))
+                else:
+                    trimmed_data_dict[feature_name][i] = new_data
+
+        pool = ThreadPool()
+        pool.map(_remove_silence_streams, range(file_number))
+        pool.close()
+        pool.join()
+
+        SilenceRangeCache.save()
+
+        if not out_data_list_dict:
+            return  trimmed_data_dict
+
+    def alignment_ranges(self, align_file_name, dur_file_name=None):
+        ## the non-silent frame ranges of an alignment file, parsed once per file and settings
+        key = ('alignment', os.path.abspath(align_file_name), self.label_type, tuple(self.silence_pattern),
+               bool(self.remove_frame_features), self.subphone_feats)
+        if self.label_type == "phone_align":
+            if dur_file_name:
+                ## durations given separately are not part of the cache key
+                return  index_ranges(self.load_phone_alignment(align_file_name, dur_file_name))
+            return  SilenceRangeCache.get(key, align_file_name, lambda: index_ranges(self.load_phone_alignment(align_file_name)))
+        else:
+            return  SilenceRangeCache.get(key, align_file_name, lambda: index_ranges(self.load_alignment(align_file_name)))
+
+    def nonsilence_frame_ranges(self, align_file_name, frame_number, dur_file_name=None):
+        ## [start, end) ranges of the non-silent frames among the frame_number frames of an utterance
+        return  self.clip_nonsilence_ranges(self.alignment_ranges(align_file_name, dur_file_name), frame_number)
+
+    def clip_nonsilence_ranges(self, nonsilence_ranges, frame_number):
+        ## the alignment ranges of an utterance, restricted to its frame_number frames
+        if numpy.sum(nonsilence_ranges[:, 1] - nonsilence_ranges[:, 0]) == frame_number:
+            print('WARNING: no silence found!')
+            # previsouly: continue -- in fact we should keep non-silent data!
+
+        ## if labels have a few extra frames than audio, this can break the indexing, remove them:
+        return  clip_ranges(nonsilence_ranges, frame_number)
+
     ## OSW: rewrote above more succintly
     def check_silence_pattern(self, label):
         for current_pattern in self.silence_pattern:
@@ -213,7 +383,7 @@ class SilenceRemover(object):
 
 
 def trim_silence(in_list, out_list, in_dimension, label_list, label_dimension, \
-                 silence_feature_index, percent_to_keep=0):
+                 silence_feature_index, percent_to_keep=0, header=None):
     '''
     Function to trim silence from binary label/speech files based on binary labels.
         in_list: list of binary label/speech files to trim
@@ -222,47 +392,21 @@ def trim_silence(in_list, out_list, in_dimension, label_list, label_dimension, \
         label_list: list of binary labels which contain trimming criterion
         label_dimesion:
         silence_feature_index: index of feature in labels which is silence: 1 means silence (trim), 0 means leave.
+        header: as for BinaryIOCollection.array_to_binary_file; header=False writes plain float32 files
     '''
     assert len(in_list) == len(out_list) == len(label_list)
     io_funcs = BinaryIOCollection()
     for (infile, outfile, label_file) in zip(in_list, out_list, label_list):
 
-        data = io_funcs.load_binary_file(infile, in_dimension)
-        label = io_funcs.load_binary_file(label_file, label_dimension)
-
-        audio_label_difference = data.shape[0] - label.shape[0]
-        assert math.fabs(audio_label_difference) < 3, '%s and %s contain different numbers of frames: %s %s' % (
-            infile, label_file, data.shape[0], label.shape[0])
-
-        ## In case they are different, resize -- keep label fixed as we assume this has
-        ## already been processed. (This problem only arose with STRAIGHT features.)
-        if audio_label_difference < 0:  ## label is longer -- pad audio to match by repeating last frame:
-            print('audio too short -- pad')
-            padding = numpy.vstack([data[-1, :]] * int(math.fabs(audio_label_difference)))
-            data = numpy.vstack([data, padding])
-        elif audio_label_difference > 0:  ## audio is longer -- cut it
-            print('audio too long -- trim')
-            new_length = label.shape[0]
-            data = data[:new_length, :]
-        # else: -- expected case -- lengths match, so do nothing
-
-        silence_flag = label[:, silence_feature_index]
-        #         print silence_flag
-        if not (numpy.unique(silence_flag) == numpy.array([0, 1])).all():
-            ## if it's all 0s or 1s, that's ok:
-            assert (numpy.unique(silence_flag) == numpy.array([0]).all()) or \
-                   (numpy.unique(silence_flag) == numpy.array([1]).all()), \
-                'dimension %s of %s contains values other than 0 and 1' % (silence_feature_index, infile)
-        print('Remove %d%% of frames (%s frames) as silence... ' % (
-            100 * numpy.sum(silence_flag / float(len(silence_flag))), int(numpy.sum(silence_flag))))
-        non_silence_indices = numpy.nonzero(
-            silence_flag == 0)  ## get the indices where silence_flag == 0 is True (i.e. != 0)
+        (label_frame_number, non_silence_ranges) = label_silence_ranges(label_file, label_dimension, silence_feature_index)
+
+        data = match_label_length(io_funcs.load_binary_file(infile, in_dimension), label_frame_number, infile, label_file)
+
+        print_silence_proportion(label_frame_number, non_silence_ranges)
         if percent_to_keep != 0:
             assert type(percent_to_keep) == int and percent_to_keep > 0
-            # print silence_flag
-            silence_indices = numpy.nonzero(silence_flag == 1)
-            ## nonzero returns a tuple of arrays, one for each dimension of input array
-            silence_indices = silence_indices[0]
+            non_silence_indices = numpy.concatenate([numpy.arange(start, end) for (start, end) in non_silence_ranges] + [numpy.zeros(0, dtype=int)])
+            silence_indices = numpy.setdiff1d(numpy.arange(label_frame_number), non_silence_indices)
             every_nth = 100 / percent_to_keep
             silence_indices_to_keep = silence_indices[::every_nth]  ## every_nth used +as step value in slice
             ## -1 due to weird error with STRAIGHT features at line 144:
@@ -275,11 +419,107 @@ def trim_silence(in_list, out_list, in_dimension, label_list, label_dimension, \
             ## Append to end of utt -- same function used for labels and audio
             ## means that violation of temporal order doesn't matter -- will be consistent.
             ## Later, frame shuffling will disperse silent frames evenly across minibatches:
-            non_silence_indices = (numpy.hstack([non_silence_indices[0], silence_indices_to_keep]))
-            ##  ^---- from tuple and back (see nonzero note above)
+            non_silence_ranges = index_ranges(numpy.hstack([non_silence_indices, silence_indices_to_keep]))
 
-        trimmed_data = data[non_silence_indices, :]  ## advanced integer indexing
-        io_funcs.array_to_binary_file(trimmed_data, outfile)
+        trimmed_data = select_frame_ranges(data, non_silence_ranges)
+        write_trimmed_data(io_funcs, trimmed_data, infile, outfile, header)
+
+    SilenceRangeCache.save()
+
+
+def trim_silence_streams(in_list_dict, dimension_dict, label_list, label_dimension, silence_feature_index, out_list_dict=None, header=None):
+    '''
+    Like trim_silence, for several streams of the same utterances in one pass: the binary labels of
+    each utterance are looked up once and every stream is cut with them. The trimmed streams are
+    written to out_list_dict when it is given and are otherwise returned, as a dictionary of lists
+    of arrays in the order of label_list.
+    '''
+    for feature_name in in_list_dict:
+        assert len(in_list_dict[feature_name]) == len(label_list)
+        assert not out_list_dict or len(out_list_dict[feature_name]) == len(label_list)
+    io_funcs = BinaryIOCollection()
+
+    trimmed_data_dict = {}
+    for feature_name in in_list_dict:
+        trimmed_data_dict[feature_name] = []
+
+    for (i, label_file) in enumerate(label_list):
+        (label_frame_number, non_silence_ranges) = label_silence_ranges(label_file, label_dimension, silence_feature_index)
+        print_silence_proportion(label_frame_number, non_silence_ranges)
+
+        for feature_name in in_list_dict:
+            infile = in_list_dict[feature_name][i]
+            data = match_label_length(io_funcs.load_binary_file(infile, dimension_dict[feature_name]), label_frame_number, infile, label_file)
+
+            trimmed_data = select_frame_ranges(data, non_silence_ranges)
+            if out_list_dict:
+                write_trimmed_data(io_funcs, trimmed_data, infile, out_list_dict[feature_name][i], header)
+            else:
+                trimmed_data_dict[feature_name].append(trimmed_data)
+
+    SilenceRangeCache.save()
+
+    if not out_list_dict:
+        return  trimmed_data_dict
+
+
+def write_trimmed_data(io_funcs, trimmed_data, infile, outfile, header):
+    ## trimmed data is written in the format of the file it comes from: sparse labels stay sparse
+    ## and headed files keep their stream layout, unless header=False asks for plain float32
+    if header is False:
+        io_funcs.array_to_binary_file(trimmed_data, outfile, header=False)
+    else:
+        io_funcs.array_to_binary_file(trimmed_data, outfile, sparse_dim=io_funcs.sparse_label_dim(infile),
+                                      stream_layout=io_funcs.feature_stream_layout(infile), header=header)
+
+
+def label_silence_ranges(label_file, label_dimension, silence_feature_index):
+    ## frame number and non-silent frame ranges of a binary label file; the labels are only
+    ## read the first time they are used to trim
+    key = ('binary_label', os.path.abspath(label_file), label_dimension, silence_feature_index)
+    return  SilenceRangeCache.get(key, label_file,
+        lambda: binary_label_ranges(BinaryIOCollection().load_binary_file(label_file, label_dimension), silence_feature_index, label_file))
+
+
+def match_label_length(data, label_frame_number, infile, label_file):
+    ## data padded or cut to the length of its labels, which may differ by up to two frames
+    audio_label_difference = data.shape[0] - label_frame_number
+    assert math.fabs(audio_label_difference) < 3, '%s and %s contain different numbers of frames: %s %s' % (
+        infile, label_file, data.shape[0], label_frame_number)
+
+    ## In case they are different, resize -- keep label fixed as we assume this has
+    ## already been processed. (This problem only arose with STRAIGHT features.)
+    if audio_label_difference < 0:  ## label is longer -- pad audio to match by repeating last frame:
+        print('audio too short -- pad')
+        padding = numpy.vstack([data[-1, :]] * int(math.fabs(audio_label_difference)))
+        data = numpy.vstack([data, padding])
+    elif audio_label_difference > 0:  ## audio is longer -- cut it
+        print('audio too long -- trim')
+        new_length = label_frame_number
+        data = data[:new_length, :]
+    # else: -- expected case -- lengths match, so do nothing
+
+    return  data
+
+
+def print_silence_proportion(label_frame_number, non_silence_ranges):
+    silence_frame_number = label_frame_number - int(numpy.sum(non_silence_ranges[:, 1] - non_silence_ranges[:, 0]))
+    print('Remove %d%% of frames (%s frames) as silence... ' % (
+        100 * silence_frame_number / float(label_frame_number), silence_frame_number))
+
+
+def binary_label_ranges(label, silence_feature_index, label_file):
+    ## frame number and non-silent frame ranges of binary labels, whose silence_feature_index
+    ## dimension is 1 for silence (trim) and 0 otherwise
+    silence_flag = label[:, silence_feature_index]
+    #         print silence_flag
+    if not (numpy.unique(silence_flag) == numpy.array([0, 1])).all():
+        ## if it's all 0s or 1s, that's ok:
+        assert (numpy.unique(silence_flag) == numpy.array([0]).all()) or \
+               (numpy.unique(silence_flag) == numpy.array([1]).all()), \
+            'dimension %s of %s contains values other than 0 and 1' % (silence_feature_index, label_file)
+    ## get the indices where silence_flag == 0 is True (i.e. != 0)
+    return  (label.shape[0], index_ranges(numpy.nonzero(silence_flag == 0)[0]))
 
 
 if __name__ == '__main__':
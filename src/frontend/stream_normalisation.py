@@ -0,0 +1,193 @@
+################################################################################
+#           The Neural Network (NN) based Speech Synthesis System
+#                https://svn.ecdf.ed.ac.uk/repo/inf/dnn_tts/
+#
+#                Centre for Speech Technology Research
+#                     University of Edinburgh, UK
+#                      Copyright (c) 2014-2015
+#                        All Rights Reserved.
+#
+# The system as a whole and most of the files in it are distributed
+# under the following copyright and conditions
+#
+#  Permission is hereby granted, free of charge, to use and distribute
+#  this software and its documentation without restriction, including
+#  without limitation the rights to use, copy, modify, merge, publish,
+#  distribute, sublicense, and/or sell copies of this work, and to
+#  permit persons to whom this work is furnished to do so, subject to
+#  the following conditions:
+#
+#   - Redistributions of source code must retain the above copyright
+#     notice, this list of conditions and the following disclaimer.
+#   - Redistributions in binary form must reproduce the above
+#     copyright notice, this list of conditions and the following
+#     disclaimer in the documentation and/or other materials provided
+#     with the distribution.
+#   - The authors' names may not be used to endorse or promote products derived
+#     from this software without specific prior written permission.
+#
+#  THE UNIVERSITY OF EDINBURGH AND THE CONTRIBUTORS TO THIS WORK
+#  DISCLAIM ALL WARRANTIES WITH REGARD TO THIS SOFTWARE, INCLUDING
+#  ALL IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS, IN NO EVENT
+#  SHALL THE UNIVERSITY OF EDINBURGH NOR THE CONTRIBUTORS BE LIABLE
+#  FOR ANY SPECIAL, INDIRECT OR CONSEQUENTIAL DAMAGES OR ANY DAMAGES
+#  WHATSOEVER RESULTING FROM LOSS OF USE, DATA OR PROFITS, WHETHER IN
+#  AN ACTION OF CONTRACT, NEGLIGENCE OR OTHER TORTIOUS ACTION,
+#  ARISING OUT OF OR IN CONNECTION WITH THE USE OR PERFORMANCE OF
+#  THIS SOFTWARE.
+################################################################################
+
+import logging
+import numpy
+try:
+    from io_funcs.binary_io import BinaryIOCollection
+except ModuleNotFoundError:
+    from ..io_funcs.binary_io import BinaryIOCollection
+
+from .feature_statistics import compute_file_statistics
+from .normalisation_kernels import AffineKernel, transform_file_list
+
+## normalisation information file: magic, int32 version, dimension and layout length, the ASCII
+## layout 'name:dim:method,...' padded to 4 bytes, float32 target min and max values, then the
+## float32 mean, std, min and max vectors of the training data
+NORM_INFO_MAGIC = b'MLNORMS1'
+NORM_INFO_VERSION = 1
+
+STREAM_NORMALISATION_METHODS = ['MVN', 'MINMAX', 'none']
+
+class StreamNormalisation(object):
+    '''
+    Normalises each stream of the output features with its own method: 'MVN', 'MINMAX' (to
+    [min_value, max_value]) or 'none'. The methods compile to a single AffineKernel over the whole
+    feature vector, so normalisation and denormalisation stay one vectorised pass per file, and
+    the statistics of all the streams are kept in one versioned file.
+    '''
+    def __init__(self, out_dimension_dict, stream_methods, min_value = 0.01, max_value = 0.99):
+
+        self.logger = logging.getLogger('feature_normalisation')
+
+        self.target_min_value = min_value
+        self.target_max_value = max_value
+
+        ## (stream name, dimension, method) in the column order of the composed features
+        self.stream_layout = []
+        for stream_name in list(out_dimension_dict.keys()):
+            method = stream_methods[stream_name]
+            if method not in STREAM_NORMALISATION_METHODS:
+                self.logger.critical('normalisation method %s of stream %s is not one of %s' %(method, stream_name, STREAM_NORMALISATION_METHODS))
+                raise ValueError('unsupported normalisation method %s for stream %s' %(method, stream_name))
+            self.stream_layout.append((stream_name, out_dimension_dict[stream_name], method))
+
+        self.feature_dimension = sum([dimension for (stream_name, dimension, method) in self.stream_layout])
+
+        self.mean_vector = None
+        self.std_vector  = None
+        self.min_vector  = None
+        self.max_vector  = None
+
+    def compute_statistics(self, file_list, num_workers=1):
+        ## num_workers processes read the files (0 uses all cores)
+        statistics = compute_file_statistics(file_list, self.feature_dimension, num_workers)
+        return  self.set_statistics(statistics)
+
+    def set_statistics(self, statistics):
+        ## takes the statistics of a FeatureStatistics, which may have been gathered while composing
+        self.mean_vector = numpy.reshape(statistics.mean_vector, (1, self.feature_dimension))
+        self.std_vector  = numpy.reshape(statistics.std(), (1, self.feature_dimension))
+        self.min_vector  = numpy.reshape(statistics.min_vector, (1, self.feature_dimension))
+        self.max_vector  = numpy.reshape(statistics.max_vector, (1, self.feature_dimension))
+
+        self.logger.info('computed statistics of %d streams over %d frames: %s' %(len(self.stream_layout), statistics.frame_number,
+                         ', '.join(['%s (%s)' %(stream_name, method) for (stream_name, dimension, method) in self.stream_layout])))
+        return  self
+
+    def affine_vectors(self):
+        ## centre, scale and offset vectors of (features - centre) * scale + offset
+        centre_vector = numpy.zeros(self.feature_dimension)
+        scale_vector  = numpy.ones(self.feature_dimension)
+        offset_vector = numpy.zeros(self.feature_dimension)
+
+        start_index = 0
+        for (stream_name, dimension, method) in self.stream_layout:
+            columns = slice(start_index, start_index + dimension)
+            if method == 'MVN':
+                centre_vector[columns] = self.mean_vector[0, columns]
+                scale_vector[columns]  = 1.0 / self.std_vector[0, columns]
+            elif method == 'MINMAX':
+                fea_max_min_diff = numpy.array(self.max_vector[0, columns] - self.min_vector[0, columns], dtype=numpy.float64)
+                target_max_min_diff = numpy.zeros(dimension)
+                target_max_min_diff.fill(self.target_max_value - self.target_min_value)
+                target_max_min_diff[fea_max_min_diff <= 0.0] = 1.0
+                fea_max_min_diff[fea_max_min_diff <= 0.0] = 1.0
+
+                centre_vector[columns] = self.min_vector[0, columns]
+                scale_vector[columns]  = target_max_min_diff / fea_max_min_diff
+                offset_vector[columns] = self.target_min_value
+            start_index += dimension
+
+        return  centre_vector, scale_vector, offset_vector
+
+    def normalisation_kernel(self):
+        centre_vector, scale_vector, offset_vector = self.affine_vectors()
+        return  AffineKernel(centre_vector, scale_vector, offset_vector)
+
+    def denormalisation_kernel(self):
+        ## the inverse: (features - offset) / scale + centre
+        centre_vector, scale_vector, offset_vector = self.affine_vectors()
+        return  AffineKernel(offset_vector, 1.0 / scale_vector, centre_vector)
+
+    def normalise_features(self, features, in_place=False):
+        return  self.normalisation_kernel().apply(features, in_place)
+
+    def normalise_data(self, in_file_list, out_file_list, num_workers=1):
+        transform_file_list(self.normalisation_kernel(), in_file_list, out_file_list,
+                            storage=BinaryIOCollection.normalised_storage, num_workers=num_workers)
+
+    def denormalise_data(self, in_file_list, out_file_list, num_workers=1):
+        transform_file_list(self.denormalisation_kernel(), in_file_list, out_file_list, num_workers=num_workers)
+
+    def stream_layout_string(self):
+        return  ','.join(['%s:%d:%s' %(stream_name, dimension, method) for (stream_name, dimension, method) in self.stream_layout])
+
+    def save_statistics(self, norm_info_file):
+        layout = self.stream_layout_string().encode('ascii')
+        layout = layout + b'\0' * (-len(layout) % 4)
+
+        fid = open(norm_info_file, 'wb')
+        fid.write(NORM_INFO_MAGIC)
+        numpy.array([NORM_INFO_VERSION, self.feature_dimension, len(layout)], dtype=numpy.int32).tofile(fid)
+        fid.write(layout)
+        numpy.array([self.target_min_value, self.target_max_value], dtype=numpy.float32).tofile(fid)
+        numpy.concatenate((self.mean_vector, self.std_vector, self.min_vector, self.max_vector), axis=0).astype(numpy.float32).tofile(fid)
+        fid.close()
+
+        self.logger.info('saved statistics of streams %s to %s' %(self.stream_layout_string(), norm_info_file))
+
+    def load_statistics(self, norm_info_file):
+        ## loads statistics saved by save_statistics; the stream layout must match the current one,
+        ## since the methods of the streams are part of what was trained on
+        fid = open(norm_info_file, 'rb')
+        if fid.read(len(NORM_INFO_MAGIC)) != NORM_INFO_MAGIC:
+            fid.close()
+            raise ValueError('%s is not a stream normalisation file' %(norm_info_file))
+        (version, dimension, layout_length) = numpy.fromfile(fid, dtype=numpy.int32, count=3)
+        if version != NORM_INFO_VERSION:
+            fid.close()
+            raise ValueError('%s has version %d of the stream normalisation file, not %d' %(norm_info_file, version, NORM_INFO_VERSION))
+        layout = fid.read(layout_length).rstrip(b'\0').decode('ascii')
+        (self.target_min_value, self.target_max_value) = [float(value) for value in numpy.fromfile(fid, dtype=numpy.float32, count=2)]
+        statistics = numpy.fromfile(fid, dtype=numpy.float32, count=4 * dimension)
+        fid.close()
+
+        if layout != self.stream_layout_string():
+            self.logger.critical('the streams in %s (%s) differ from the configured ones (%s)' %(norm_info_file, layout, self.stream_layout_string()))
+            raise ValueError('stream normalisation layout mismatch in %s' %(norm_info_file))
+
+        statistics = numpy.reshape(statistics, (4, dimension))
+        self.mean_vector = statistics[0:1, ]
+        self.std_vector  = statistics[1:2, ]
+        self.min_vector  = statistics[2:3, ]
+        self.max_vector  = statistics[3:4, ]
+
+        self.logger.info('loaded statistics of streams %s from %s' %(layout, norm_info_file))
+        return  self
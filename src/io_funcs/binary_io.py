@@ -39,31 +39,349 @@
 
 
 
+import io
+import os
 import numpy
 
+try:
+    from io_funcs.feature_archive import FeatureArchive, split_archive_path
+except ModuleNotFoundError:
+    from .feature_archive import FeatureArchive, split_archive_path
+
+## sparse label files (see array_to_binary_file with sparse_dim) start with this magic string,
+## followed by int32 [version, dimension, sparse_dim, frame_number, run_number, nonzero_number]
+SPARSE_LABEL_MAGIC = b'MLSPARS1'
+SPARSE_LABEL_HEADER_SIZE = len(SPARSE_LABEL_MAGIC) + 6 * 4
+
+## feature files written with a header (see BinaryIOCollection.feature_headers) start with this
+## magic string, followed by int32 [version, dimension, frame_number, dtype code, layout length]
+## and the stream layout as 'name:dim,name:dim,...' in ASCII, padded to a multiple of 4 bytes;
+## integer files then hold a float32 scale and offset per dimension, decoding as code * scale + offset
+FEATURE_HEADER_MAGIC = b'MLFEATS1'
+FEATURE_HEADER_SIZE = len(FEATURE_HEADER_MAGIC) + 5 * 4
+## storage types of headed feature files, indexed by dtype code
+FEATURE_DTYPES = [numpy.float32, numpy.float16, numpy.int16, numpy.uint8]
+
 class   BinaryIOCollection(object):
 
+    ## how feature files are loaded, for all instances: None reads the whole file into memory;
+    ## 'r' returns read-only numpy.memmap views and 'c' copy-on-write ones (for callers that
+    ## modify what they load), so only the pages a caller actually touches are read
+    mmap_mode = None
+
+    ## whether array_to_binary_file writes a header with the shape and stream layout of the data,
+    ## for all instances; files without one are still read, so this can be switched at any stage
+    feature_headers = False
+
+    ## storage type of normalised feature files (those written with storage=normalised_storage),
+    ## for all instances: float32, float16, or int16 / uint8 quantised per dimension
+    normalised_storage = 'float32'
+
     def load_binary_file(self, file_name, dimension):
-        fid_lab = open(file_name, 'rb')
-        features = numpy.fromfile(fid_lab, dtype=numpy.float32)
-        fid_lab.close()
+        features = self.read_binary_file(file_name, dimension)
         assert features.size % float(dimension) == 0.0,'specified dimension %s not compatible with data'%(dimension)
         features = features[:(dimension * (features.size // dimension))]
         features = features.reshape((-1, dimension))
 
         return  features
 
-    def array_to_binary_file(self, data, output_file_name):
+    def open_binary_file(self, file_name):
+        ## an open file positioned at the data of file_name, with the byte offset and length
+        ## of that data; file_name may also address a file inside a FeatureArchive
+        archive_path = split_archive_path(file_name)
+        if archive_path is None:
+            fid = open(file_name, 'rb')
+            return  fid, 0, os.fstat(fid.fileno()).st_size
+
+        (offset, length, frame_number, dimension) = FeatureArchive(archive_path[0]).locate(archive_path[1])
+        fid = open(archive_path[0], 'rb')
+        fid.seek(offset)
+        return  fid, offset, length
+
+    def read_binary_file(self, file_name, dimension=None):
+        ## the float32 contents of a feature file, expanding sparse label files
+        (fid_lab, offset, length) = self.open_binary_file(file_name)
+        magic = fid_lab.read(len(SPARSE_LABEL_MAGIC))
+        if magic == SPARSE_LABEL_MAGIC:
+            fid_lab.seek(offset)
+            features = self.read_sparse_labels(fid_lab)
+            fid_lab.close()
+            assert dimension is None or features.shape[1] == dimension,'specified dimension %s not compatible with data'%(dimension)
+            return  features.reshape(-1)
+        if magic == FEATURE_HEADER_MAGIC:
+            fid_lab.seek(offset)
+            header = self.read_feature_header(fid_lab)
+            assert dimension is None or header[1] == dimension,'specified dimension %s not compatible with data'%(dimension)
+            if header[3] != 0:
+                features = self.read_stored_features(fid_lab, header)
+                fid_lab.close()
+                return  features
+            offset = fid_lab.tell()
+            value_number = header[1] * header[2]
+        else:
+            fid_lab.seek(offset)
+            value_number = length // 4
+        if self.mmap_mode and value_number > 0:
+            features = numpy.memmap(fid_lab, dtype=numpy.float32, mode=self.mmap_mode, offset=offset, shape=(value_number,))
+        else:
+            features = numpy.fromfile(fid_lab, dtype=numpy.float32, count=value_number)
+        fid_lab.close()
+
+        return  features
+
+    def array_to_binary_file(self, data, output_file_name, atomic=False, sparse_dim=None, stream_layout=None, header=None, storage=None):
+        """
+        Writes data as float32. With sparse_dim, data (frames x dim) is written as a sparse
+        label file: the first sparse_dim columns, which hold the linguistic features and stay
+        constant over the frames of a phone or state, are stored once per run of identical
+        rows as their non-zero indices and values; the remaining columns are stored per frame.
+        load_binary_file expands such files back to the dense matrix.
+
+        output_file_name may address a file inside a FeatureArchive (see
+        feature_archive.archive_member_path), in which case the data is appended to the archive.
+
+        Dense files start with a header holding their shape and stream_layout (a list of
+        (stream name, dimension) pairs) if header is True, or if it is None and feature_headers
+        is set. Files read by external tools, such as vocoder parameters, are written with
+        header=False.
+
+        storage stores dense files as float16, or as int16 / uint8 codes with a scale and offset
+        per dimension, which always takes a header; reading decodes them back to float32.
+        """
         data = numpy.array(data, 'float32')
 
-        fid = open(output_file_name, 'wb')
-        data.tofile(fid)
+        if storage == 'float32':
+            storage = None
+        if header is None:
+            header = self.feature_headers or storage is not None
+
+        if sparse_dim is not None:
+            record = self.sparse_label_record(data, sparse_dim)
+        elif header and storage is not None:
+            record = self.stored_feature_record(data, stream_layout, storage)
+        elif header:
+            record = self.feature_header(data, stream_layout) + data.tobytes()
+        else:
+            record = data.tobytes()
+
+        archive_path = split_archive_path(output_file_name)
+        if archive_path is not None:
+            if data.ndim == 2:
+                (frame_number, dimension) = data.shape
+            else:
+                (frame_number, dimension) = (data.size, 1)
+            FeatureArchive(archive_path[0]).append(archive_path[1], record, frame_number, dimension)
+            return
+
+        ## with atomic=True the data is written to a temporary file next to the output
+        ## and renamed into place, so readers never see a partially written file;
+        ## always done when memory-mapping, as truncating a mapped file breaks its readers
+        if atomic or self.mmap_mode:
+            temp_file_name = '%s.tmp%d' % (output_file_name, os.getpid())
+        else:
+            temp_file_name = output_file_name
+
+        fid = open(temp_file_name, 'wb')
+        fid.write(record)
         fid.close()
 
+        if atomic or self.mmap_mode:
+            os.replace(temp_file_name, output_file_name)
+
+    def feature_header(self, data, stream_layout=None, dtype=numpy.float32):
+        ## the header bytes of a headed feature file holding data, stored as dtype
+        if data.ndim == 2:
+            (frame_number, dimension) = data.shape
+        else:
+            (frame_number, dimension) = (data.size, 1)
+
+        layout = ''
+        if stream_layout:
+            assert sum([stream_dim for (stream_name, stream_dim) in stream_layout]) == dimension, 'stream layout %s not compatible with data' % (stream_layout)
+            layout = ','.join(['%s:%d' % (stream_name, stream_dim) for (stream_name, stream_dim) in stream_layout])
+        layout = layout.encode('ascii')
+        layout += b' ' * (-len(layout) % 4)
+
+        header = numpy.array([1, dimension, frame_number, FEATURE_DTYPES.index(dtype), len(layout)], dtype=numpy.int32)
+
+        return  FEATURE_HEADER_MAGIC + header.tobytes() + layout
+
+    def stored_feature_record(self, data, stream_layout, storage):
+        ## the bytes of a headed feature file holding data in the given storage type
+        dtype = numpy.dtype(storage).type
+        assert dtype in FEATURE_DTYPES, 'unsupported feature storage %s' % (storage)
+        record = self.feature_header(data, stream_layout, dtype)
+        if dtype == numpy.float16:
+            return  record + data.astype(numpy.float16).tobytes()
+
+        if data.ndim != 2:
+            data = data.reshape((-1, 1))
+        (codes, scale, offset) = self.quantise_features(data, dtype)
+        return  record + scale.tobytes() + offset.tobytes() + codes.tobytes()
+
+    def quantise_features(self, data, dtype):
+        ## integer codes of data (frames x dim) spanning the range of each dimension,
+        ## with the float32 scale and offset per dimension that decode them
+        code_range = numpy.iinfo(dtype)
+        if data.shape[0] > 0:
+            data_min = data.min(axis=0).astype(numpy.float64)
+            data_max = data.max(axis=0).astype(numpy.float64)
+        else:
+            data_min = data_max = numpy.zeros(data.shape[1])
+
+        scale = ((data_max - data_min) / (float(code_range.max) - code_range.min)).astype(numpy.float32)
+        scale[scale <= 0.0] = 1.0
+        offset = (data_min - code_range.min * scale.astype(numpy.float64)).astype(numpy.float32)
+
+        codes = numpy.rint((data - offset.astype(numpy.float64)) / scale)
+        numpy.clip(codes, code_range.min, code_range.max, out=codes)
+
+        return  codes.astype(dtype), scale, offset
+
+    def read_stored_features(self, fid, header):
+        ## the float32 contents of a float16 or integer feature file, with fid at its data
+        (version, dimension, frame_number, dtype_code, stream_layout, scale, offset) = header
+        dtype = FEATURE_DTYPES[dtype_code]
+        codes = numpy.frombuffer(fid.read(dimension * frame_number * numpy.dtype(dtype).itemsize), dtype=dtype)
+        if scale is None:
+            return  codes.astype(numpy.float32)
+
+        features = codes.reshape((-1, dimension)) * scale
+        features += offset
+        return  features.reshape(-1)
+
+    def read_feature_header(self, fid):
+        ## [version, dimension, frame_number, dtype code, stream layout, scale, offset] of a headed
+        ## feature file, with scale and offset None for float files, leaving fid at the start of the data
+        assert fid.read(len(FEATURE_HEADER_MAGIC)) == FEATURE_HEADER_MAGIC
+        header = numpy.frombuffer(fid.read(5 * 4), dtype=numpy.int32)
+        assert header[0] == 1, 'unsupported feature file version %d' % (header[0])
+        assert header[3] < len(FEATURE_DTYPES), 'unsupported feature file dtype %d' % (header[3])
+
+        stream_layout = []
+        for stream in fid.read(int(header[4])).decode('ascii').strip().split(','):
+            if stream:
+                (stream_name, stream_dim) = stream.rsplit(':', 1)
+                stream_layout.append((stream_name, int(stream_dim)))
+
+        (scale, offset) = (None, None)
+        if numpy.issubdtype(FEATURE_DTYPES[header[3]], numpy.integer):
+            scale = numpy.frombuffer(fid.read(int(header[1]) * 4), dtype=numpy.float32)
+            offset = numpy.frombuffer(fid.read(int(header[1]) * 4), dtype=numpy.float32)
+
+        return  [int(value) for value in header[:4]] + [stream_layout, scale, offset]
+
+    def stat_features(self, file_name, dimension=None):
+        """
+        (frame_number, dimension) of a feature file without reading its data: from the archive
+        index, the header of sparse and headed files, or else the file size, in which case
+        dimension must be given.
+        """
+        archive_path = split_archive_path(file_name)
+        if archive_path is not None:
+            (offset, length, frame_number, file_dimension) = FeatureArchive(archive_path[0]).locate(archive_path[1])
+            if dimension is None or dimension == file_dimension:
+                return  frame_number, file_dimension
+            ## 1-D data is indexed as a single column
+            value_number = frame_number * file_dimension
+        else:
+            fid = open(file_name, 'rb')
+            magic = fid.read(len(SPARSE_LABEL_MAGIC))
+            fid.seek(0)
+            if magic == SPARSE_LABEL_MAGIC:
+                (version, file_dimension, sparse_dim, frame_number, run_number, nonzero_number) = self.read_sparse_label_header(fid)
+            elif magic == FEATURE_HEADER_MAGIC:
+                (version, file_dimension, frame_number, dtype_code, stream_layout, scale, offset) = self.read_feature_header(fid)
+            else:
+                file_dimension = None
+                value_number = os.fstat(fid.fileno()).st_size // 4
+            fid.close()
+
+            if file_dimension is not None:
+                assert dimension is None or file_dimension == dimension,'specified dimension %s not compatible with data'%(dimension)
+                return  frame_number, file_dimension
+
+        assert dimension is not None, 'dimension of %s must be given' % (file_name)
+        assert value_number % dimension == 0,'specified dimension %s not compatible with data'%(dimension)
+        return  value_number // dimension, dimension
+
+    def feature_stream_layout(self, file_name):
+        ## the stream layout of a headed feature file, or None
+        (fid, offset, length) = self.open_binary_file(file_name)
+        if fid.read(len(FEATURE_HEADER_MAGIC)) != FEATURE_HEADER_MAGIC:
+            fid.close()
+            return  None
+        fid.seek(offset)
+        stream_layout = self.read_feature_header(fid)[4]
+        fid.close()
+        return  stream_layout
+
+    def sparse_label_record(self, data, sparse_dim):
+        ## the bytes of a sparse label file holding data
+        frame_number, dimension = data.shape
+        segment_data = data[:, 0:sparse_dim]
+
+        ## runs of frames with identical linguistic features
+        if frame_number > 0:
+            changes = numpy.nonzero(numpy.any(segment_data[1:] != segment_data[:-1], axis=1))[0] + 1
+            run_starts = numpy.concatenate([[0], changes])
+        else:
+            run_starts = numpy.zeros(0, dtype=int)
+        run_lengths = numpy.diff(numpy.append(run_starts, frame_number))
+
+        run_data = segment_data[run_starts]
+        nonzero_runs, nonzero_indices = numpy.nonzero(run_data)
+        run_nonzero_number = numpy.bincount(nonzero_runs, minlength=len(run_starts))
+
+        fid = io.BytesIO()
+        fid.write(SPARSE_LABEL_MAGIC)
+        fid.write(numpy.array([1, dimension, sparse_dim, frame_number, len(run_starts), len(nonzero_indices)], dtype=numpy.int32).tobytes())
+        fid.write(run_lengths.astype(numpy.int32).tobytes())
+        fid.write(run_nonzero_number.astype(numpy.int32).tobytes())
+        fid.write(nonzero_indices.astype(numpy.int32).tobytes())
+        fid.write(run_data[nonzero_runs, nonzero_indices].tobytes())
+        fid.write(numpy.ascontiguousarray(data[:, sparse_dim:]).tobytes())
+
+        return  fid.getvalue()
+
+    def read_sparse_labels(self, fid):
+        header = self.read_sparse_label_header(fid)
+        (dimension, sparse_dim, frame_number, run_number, nonzero_number) = header[1:]
+
+        run_lengths = numpy.fromfile(fid, dtype=numpy.int32, count=run_number)
+        run_nonzero_number = numpy.fromfile(fid, dtype=numpy.int32, count=run_number)
+        nonzero_indices = numpy.fromfile(fid, dtype=numpy.int32, count=nonzero_number)
+        nonzero_values = numpy.fromfile(fid, dtype=numpy.float32, count=nonzero_number)
+        frame_data = numpy.fromfile(fid, dtype=numpy.float32, count=frame_number * (dimension - sparse_dim))
+
+        run_data = numpy.zeros((run_number, sparse_dim), dtype=numpy.float32)
+        run_data[numpy.repeat(numpy.arange(run_number), run_nonzero_number), nonzero_indices] = nonzero_values
+
+        features = numpy.empty((frame_number, dimension), dtype=numpy.float32)
+        features[:, 0:sparse_dim] = numpy.repeat(run_data, run_lengths, axis=0)
+        features[:, sparse_dim:] = frame_data.reshape((frame_number, dimension - sparse_dim))
+
+        return  features
+
+    def read_sparse_label_header(self, fid):
+        assert fid.read(len(SPARSE_LABEL_MAGIC)) == SPARSE_LABEL_MAGIC
+        header = numpy.fromfile(fid, dtype=numpy.int32, count=6)
+        assert header[0] == 1, 'unsupported sparse label file version %d' % (header[0])
+        return  [int(value) for value in header]
+
+    def sparse_label_dim(self, file_name):
+        ## sparse_dim of a sparse label file, or None for plain float32 files
+        (fid, offset, length) = self.open_binary_file(file_name)
+        if fid.read(len(SPARSE_LABEL_MAGIC)) != SPARSE_LABEL_MAGIC:
+            fid.close()
+            return  None
+        fid.seek(offset)
+        header = self.read_sparse_label_header(fid)
+        fid.close()
+        return  header[2]
+
     def load_binary_file_frame(self, file_name, dimension):
-        fid_lab = open(file_name, 'rb')
-        features = numpy.fromfile(fid_lab, dtype=numpy.float32)
-        fid_lab.close()
+        features = self.read_binary_file(file_name, dimension)
         assert features.size % float(dimension) == 0.0,'specified dimension %s not compatible with data'%(dimension)
         frame_number = features.size // dimension
         features = features[:(dimension * frame_number)]
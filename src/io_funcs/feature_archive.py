@@ -0,0 +1,188 @@
+################################################################################
+#           The Neural Network (NN) based Speech Synthesis System
+#                https://svn.ecdf.ed.ac.uk/repo/inf/dnn_tts/
+#
+#                Centre for Speech Technology Research
+#                     University of Edinburgh, UK
+#                      Copyright (c) 2014-2015
+#                        All Rights Reserved.
+#
+# The system as a whole and most of the files in it are distributed
+# under the following copyright and conditions
+#
+#  Permission is hereby granted, free of charge, to use and distribute
+#  this software and its documentation without restriction, including
+#  without limitation the rights to use, copy, modify, merge, publish,
+#  distribute, sublicense, and/or sell copies of this work, and to
+#  permit persons to whom this work is furnished to do so, subject to
+#  the following conditions:
+#
+#   - Redistributions of source code must retain the above copyright
+#     notice, this list of conditions and the following disclaimer.
+#   - Redistributions in binary form must reproduce the above
+#     copyright notice, this list of conditions and the following
+#     disclaimer in the documentation and/or other materials provided
+#     with the distribution.
+#   - The authors' names may not be used to endorse or promote products derived
+#     from this software without specific prior written permission.
+#
+#  THE UNIVERSITY OF EDINBURGH AND THE CONTRIBUTORS TO THIS WORK
+#  DISCLAIM ALL WARRANTIES WITH REGARD TO THIS SOFTWARE, INCLUDING
+#  ALL IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS, IN NO EVENT
+#  SHALL THE UNIVERSITY OF EDINBURGH NOR THE CONTRIBUTORS BE LIABLE
+#  FOR ANY SPECIAL, INDIRECT OR CONSEQUENTIAL DAMAGES OR ANY DAMAGES
+#  WHATSOEVER RESULTING FROM LOSS OF USE, DATA OR PROFITS, WHETHER IN
+#  AN ACTION OF CONTRACT, NEGLIGENCE OR OTHER TORTIOUS ACTION,
+#  ARISING OUT OF OR IN CONNECTION WITH THE USE OR PERFORMANCE OF
+#  THIS SOFTWARE.
+################################################################################
+
+
+import os
+import fcntl
+import threading
+
+## a directory name ending in ARCHIVE_EXTENSION stands for an archive, and its files
+## are addressed as <archive>::<file name>, e.g. nn_norm_mgc_lf0_vuv_bap_187.pack::utt_001.cmp
+ARCHIVE_EXTENSION = '.pack'
+ARCHIVE_SEPARATOR = '::'
+
+def is_archive_path(file_dir):
+    return file_dir.rstrip('/').endswith(ARCHIVE_EXTENSION)
+
+def archive_member_path(archive_file_name, member_name):
+    return archive_file_name.rstrip('/') + ARCHIVE_SEPARATOR + member_name
+
+def split_archive_path(file_name):
+    ## (archive file name, member name) for a file inside an archive, otherwise None
+    position = file_name.find(ARCHIVE_EXTENSION + ARCHIVE_SEPARATOR)
+    if position < 0:
+        return  None
+    position += len(ARCHIVE_EXTENSION)
+    return  file_name[:position], file_name[position+len(ARCHIVE_SEPARATOR):]
+
+def compact_archives(file_list):
+    ## compacts the archives the files of file_list are in, once a stage has written them all
+    archive_file_names = set()
+    for file_name in file_list:
+        archive_path = split_archive_path(file_name)
+        if archive_path is not None:
+            archive_file_names.add(archive_path[0])
+    return  sum(FeatureArchive(archive_file_name).compact() for archive_file_name in sorted(archive_file_names))
+
+
+class   FeatureArchive(object):
+    """
+    The files of one directory packed into a single data file, plus a text index
+    (<archive>.index) with one line per record: file name, byte offset, byte length,
+    number of frames and dimension.
+
+    Records hold exactly the bytes BinaryIOCollection.array_to_binary_file would write to a
+    separate file. They are appended under an exclusive lock on the data file, so worker
+    threads and processes can write to the same archive; a file that is written again is
+    superseded by its latest record. Reads seek straight to a record through the index.
+    Superseded records are only dropped by compact().
+    """
+
+    ## parsed indices, shared by all instances: archive file name -> (index file stat, index)
+    index_cache = {}
+    index_cache_lock = threading.Lock()
+
+    def __init__(self, archive_file_name):
+        self.archive_file_name = archive_file_name
+        self.index_file_name = archive_file_name + '.index'
+
+    def append(self, member_name, record, frame_number, dimension):
+        archive_dir = os.path.dirname(self.archive_file_name)
+        if archive_dir and not os.path.isdir(archive_dir):
+            os.makedirs(archive_dir, exist_ok=True)
+
+        fd = os.open(self.archive_file_name, os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o666)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            offset = os.lseek(fd, 0, os.SEEK_END)
+            record = memoryview(record)
+            written = 0
+            while written < len(record):
+                written += os.write(fd, record[written:])
+            ## the index line is only added once the data is in place
+            with open(self.index_file_name, 'a') as fid:
+                fid.write('%s %d %d %d %d\n' % (member_name, offset, len(record), frame_number, dimension))
+        finally:
+            fcntl.flock(fd, fcntl.LOCK_UN)
+            os.close(fd)
+
+    def read_index(self):
+        try:
+            index_stat = os.stat(self.index_file_name)
+        except OSError:
+            return  {}
+        stat_key = (index_stat.st_size, index_stat.st_mtime_ns)
+
+        with self.index_cache_lock:
+            cached = self.index_cache.get(self.archive_file_name)
+            if cached is not None and cached[0] == stat_key:
+                return  cached[1]
+
+        with open(self.index_file_name) as fid:
+            content = fid.read()
+        ## ignore a line that is still being written
+        content = content[:content.rfind('\n')+1]
+
+        index = {}
+        for line in content.splitlines():
+            (member_name, offset, length, frame_number, dimension) = line.rsplit(' ', 4)
+            index[member_name] = (int(offset), int(length), int(frame_number), int(dimension))
+
+        with self.index_cache_lock:
+            self.index_cache[self.archive_file_name] = (stat_key, index)
+        return  index
+
+    def locate(self, member_name):
+        ## (byte offset, byte length, number of frames, dimension) of a file in the archive
+        index = self.read_index()
+        if member_name not in index:
+            raise IOError('%s not found in archive %s' % (member_name, self.archive_file_name))
+        return  index[member_name]
+
+    def member_names(self):
+        return  list(self.read_index().keys())
+
+    def compact(self):
+        """
+        Rewrites the archive with only the latest record of each file and returns the number
+        of bytes dropped. The data and index files are replaced, so no other thread or
+        process may be writing to or reading from the archive meanwhile.
+        """
+        if not os.path.isfile(self.archive_file_name):
+            return  0
+
+        fd = os.open(self.archive_file_name, os.O_RDONLY)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            ## the index as it is now, not as it was cached
+            with self.index_cache_lock:
+                self.index_cache.pop(self.archive_file_name, None)
+            index = self.read_index()
+            archive_size = os.fstat(fd).st_size
+            kept_size = sum(length for (offset, length, frame_number, dimension) in index.values())
+            if kept_size == archive_size:
+                return  0
+
+            temp_archive_file_name = '%s.%d.compact' % (self.archive_file_name, os.getpid())
+            temp_index_file_name = '%s.%d.compact' % (self.index_file_name, os.getpid())
+            offset = 0
+            with open(temp_archive_file_name, 'wb') as data_fid, open(temp_index_file_name, 'w') as index_fid:
+                ## records keep the order they were written in
+                for (member_name, (old_offset, length, frame_number, dimension)) in sorted(index.items(), key=lambda item: item[1][0]):
+                    data_fid.write(os.pread(fd, length, old_offset))
+                    index_fid.write('%s %d %d %d %d\n' % (member_name, offset, length, frame_number, dimension))
+                    offset += length
+            os.replace(temp_archive_file_name, self.archive_file_name)
+            os.replace(temp_index_file_name, self.index_file_name)
+            with self.index_cache_lock:
+                self.index_cache.pop(self.archive_file_name, None)
+        finally:
+            fcntl.flock(fd, fcntl.LOCK_UN)
+            os.close(fd)
+        return  archive_size - kept_size
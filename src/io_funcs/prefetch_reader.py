@@ -0,0 +1,107 @@
+################################################################################
+#           The Neural Network (NN) based Speech Synthesis System
+#                https://svn.ecdf.ed.ac.uk/repo/inf/dnn_tts/
+#
+#                Centre for Speech Technology Research
+#                     University of Edinburgh, UK
+#                      Copyright (c) 2014-2015
+#                        All Rights Reserved.
+#
+# The system as a whole and most of the files in it are distributed
+# under the following copyright and conditions
+#
+#  Permission is hereby granted, free of charge, to use and distribute
+#  this software and its documentation without restriction, including
+#  without limitation the rights to use, copy, modify, merge, publish,
+#  distribute, sublicense, and/or sell copies of this work, and to
+#  permit persons to whom this work is furnished to do so, subject to
+#  the following conditions:
+#
+#   - Redistributions of source code must retain the above copyright
+#     notice, this list of conditions and the following disclaimer.
+#   - Redistributions in binary form must reproduce the above
+#     copyright notice, this list of conditions and the following
+#     disclaimer in the documentation and/or other materials provided
+#     with the distribution.
+#   - The authors' names may not be used to endorse or promote products derived
+#     from this software without specific prior written permission.
+#
+#  THE UNIVERSITY OF EDINBURGH AND THE CONTRIBUTORS TO THIS WORK
+#  DISCLAIM ALL WARRANTIES WITH REGARD TO THIS SOFTWARE, INCLUDING
+#  ALL IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS, IN NO EVENT
+#  SHALL THE UNIVERSITY OF EDINBURGH NOR THE CONTRIBUTORS BE LIABLE
+#  FOR ANY SPECIAL, INDIRECT OR CONSEQUENTIAL DAMAGES OR ANY DAMAGES
+#  WHATSOEVER RESULTING FROM LOSS OF USE, DATA OR PROFITS, WHETHER IN
+#  AN ACTION OF CONTRACT, NEGLIGENCE OR OTHER TORTIOUS ACTION,
+#  ARISING OUT OF OR IN CONNECTION WITH THE USE OR PERFORMANCE OF
+#  THIS SOFTWARE.
+################################################################################
+
+
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+
+class   PrefetchReader(object):
+    """
+    Iterates over load_function(item) for the items of item_list, in order, while the items
+    after the current one are loaded on background threads, so disk latency overlaps with the
+    caller's work on the current item. At most queue_depth items, the current one included, are
+    loading or loaded at a time. For example
+
+        for (features, frame_number) in PrefetchReader(file_list, lambda file_name: io_funcs.load_binary_file_frame(file_name, dimension)):
+
+    No further items are read ahead while the data loaded but not yet consumed holds
+    memory_cap bytes or more. Errors are raised when the failed item is reached.
+    """
+
+    ## defaults for all instances: the number of items read ahead (0 loads each item in the
+    ## caller's thread, when it is reached) and the bytes of loaded data to hold at most
+    queue_depth = 4
+    memory_cap = 512 * 1024 * 1024
+
+    def __init__(self, item_list, load_function, queue_depth=None, memory_cap=None):
+        self.item_list = list(item_list)
+        self.load_function = load_function
+        if queue_depth is not None:
+            self.queue_depth = queue_depth
+        if memory_cap is not None:
+            self.memory_cap = memory_cap
+
+    def __len__(self):
+        return  len(self.item_list)
+
+    def __iter__(self):
+        if self.queue_depth <= 0:
+            for item in self.item_list:
+                yield self.load_function(item)
+            return
+
+        executor = ThreadPoolExecutor(max_workers=self.queue_depth)
+        pending = deque()
+        item_index = 0
+        try:
+            while item_index < len(self.item_list) or pending:
+                while item_index < len(self.item_list) and len(pending) < self.queue_depth:
+                    if pending and self.loaded_bytes(pending) >= self.memory_cap:
+                        break
+                    pending.append(executor.submit(self.load_function, self.item_list[item_index]))
+                    item_index += 1
+
+                yield pending.popleft().result()
+        finally:
+            ## also reached when the caller stops iterating early
+            for future in pending:
+                future.cancel()
+            executor.shutdown(wait=True)
+
+    def loaded_bytes(self, pending):
+        ## the bytes held by items that have been loaded but not consumed yet
+        return  sum([self.result_bytes(future.result()) for future in pending if future.done() and future.exception() is None])
+
+    def result_bytes(self, result):
+        if hasattr(result, 'nbytes'):
+            return  result.nbytes
+        if isinstance(result, (tuple, list)):
+            return  sum([self.result_bytes(value) for value in result])
+        return  0
@@ -173,6 +173,9 @@ class configuration(object):
 
             # Data
             ('shuffle_data', True, 'Data', 'shuffle_data'),
+            ## feedforward training reads the training data as it is needed, shuffling this many frames at a time
+            ('streaming_input', False, 'Data', 'streaming_input'),
+            ('shuffle_buffer_frames', 200000, 'Data', 'shuffle_buffer_frames'),
 
             ('train_file_number', impossible_int, 'Data','train_file_number'),
             ('valid_file_number', impossible_int, 'Data','valid_file_number'),
@@ -0,0 +1,206 @@
+################################################################################
+#           The Neural Network (NN) based Speech Synthesis System
+#                https://github.com/CSTR-Edinburgh/merlin
+#
+#                Centre for Speech Technology Research
+#                     University of Edinburgh, UK
+#                      Copyright (c) 2014-2015
+#                        All Rights Reserved.
+#
+# The system as a whole and most of the files in it are distributed
+# under the following copyright and conditions
+#
+#  Permission is hereby granted, free of charge, to use and distribute
+#  this software and its documentation without restriction, including
+#  without limitation the rights to use, copy, modify, merge, publish,
+#  distribute, sublicense, and/or sell copies of this work, and to
+#  permit persons to whom this work is furnished to do so, subject to
+#  the following conditions:
+#
+#   - Redistributions of source code must retain the above copyright
+#     notice, this list of conditions and the following disclaimer.
+#   - Redistributions in binary form must reproduce the above
+#     copyright notice, this list of conditions and the following
+#     disclaimer in the documentation and/or other materials provided
+#     with the distribution.
+#   - The authors' names may not be used to endorse or promote products derived
+#     from this software without specific prior written permission.
+#
+#  THE UNIVERSITY OF EDINBURGH AND THE CONTRIBUTORS TO THIS WORK
+#  DISCLAIM ALL WARRANTIES WITH REGARD TO THIS SOFTWARE, INCLUDING
+#  ALL IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS, IN NO EVENT
+#  SHALL THE UNIVERSITY OF EDINBURGH NOR THE CONTRIBUTORS BE LIABLE
+#  FOR ANY SPECIAL, INDIRECT OR CONSEQUENTIAL DAMAGES OR ANY DAMAGES
+#  WHATSOEVER RESULTING FROM LOSS OF USE, DATA OR PROFITS, WHETHER IN
+#  AN ACTION OF CONTRACT, NEGLIGENCE OR OTHER TORTIOUS ACTION,
+#  ARISING OUT OF OR IN CONNECTION WITH THE USE OR PERFORMANCE OF
+#  THIS SOFTWARE.
+################################################################################
+
+import os
+import random
+import threading
+import numpy as np
+import keras
+
+try:
+    from io_funcs.binary_io import BinaryIOCollection
+    from io_funcs.prefetch_reader import PrefetchReader
+except ModuleNotFoundError:
+    from ..io_funcs.binary_io import BinaryIOCollection
+    from ..io_funcs.prefetch_reader import PrefetchReader
+
+
+class FrameBatchDataset(keras.utils.PyDataset):
+    """ Mini-batches of (input, output) frames for feedforward training, streamed from the
+    feature files instead of loading the whole training set into memory.
+
+    In each epoch the utterances are read in a new random order on PrefetchReader threads,
+    normalised with the scalers as they arrive and collected in a shuffle buffer of about
+    shuffle_buffer_frames frames; whenever the buffer is full its frames are shuffled and
+    handed out as batches. Memory use is bounded by the buffer and the reader's memory_cap,
+    whatever the size of the corpus.
+
+    The batches of an epoch are made in order, and the latest of them are kept by index, so
+    Keras can ask for any batch, peek at one or ask again for one: a batch that is no longer kept
+    is made again by restarting the epoch, whose order only depends on the epoch number. Keras
+    normally asks for them in order on one worker thread, keeping up to max_queue_size ready.
+    """
+
+    def __init__(self, inp_file_list, out_file_list, inp_dim, out_dim, batch_size=256, inp_scaler=None, out_scaler=None,
+                 shuffle_data=True, shuffle_buffer_frames=200000, max_queue_size=10):
+        """
+        :param inp_file_list: input feature files, one per utterance
+        :param out_file_list: output feature files, in the same order
+        :param inp_scaler: scaler from data_utils.load_norm_stats for the inputs, or None
+        :param out_scaler: scaler from data_utils.load_norm_stats for the outputs, or None
+        :param shuffle_buffer_frames: the number of frames shuffled together
+        """
+        super().__init__(workers=1, use_multiprocessing=False, max_queue_size=max_queue_size)
+
+        assert len(inp_file_list) == len(out_file_list)
+
+        self.inp_file_list = inp_file_list
+        self.out_file_list = out_file_list
+        self.inp_dim = inp_dim
+        self.out_dim = out_dim
+        self.batch_size = batch_size
+        self.inp_scaler = inp_scaler
+        self.out_scaler = out_scaler
+        self.shuffle_data = shuffle_data
+        self.shuffle_buffer_frames = max(shuffle_buffer_frames, batch_size)
+
+        ### the number of batches follows from the file lengths, which needs no data to be read ###
+        io_funcs = BinaryIOCollection()
+        self.frame_number = 0
+        for (inp_file_name, out_file_name) in zip(inp_file_list, out_file_list):
+            inp_frame_number, inp_dimension = io_funcs.stat_features(inp_file_name, inp_dim)
+            out_frame_number, out_dimension = io_funcs.stat_features(out_file_name, out_dim)
+            self.frame_number += min(inp_frame_number, out_frame_number)
+
+        ## the batches Keras may hold or ask for again
+        self.cached_batch_number = max_queue_size + 2
+
+        self.epoch_num = 0
+        self.batches = None
+        self.batch_cache = {}
+        self.next_index = 0
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return int(np.ceil(self.frame_number / float(self.batch_size)))
+
+    def __getitem__(self, index):
+        if index < 0 or index >= len(self):
+            raise IndexError('batch %d requested from %d batches' % (index, len(self)))
+
+        with self.lock:
+            if self.batches is None or (index < self.next_index and index not in self.batch_cache):
+                self.start_epoch()
+
+            while self.next_index <= index:
+                batch = next(self.batches, None)
+                if batch is None:
+                    raise ValueError('the feature files gave %d of %d batches; have they changed since the data set was made?' % (self.next_index, len(self)))
+                self.batch_cache[self.next_index] = batch
+                self.next_index += 1
+                if len(self.batch_cache) > self.cached_batch_number:
+                    del self.batch_cache[min(self.batch_cache)]
+
+            return self.batch_cache[index]
+
+    def on_epoch_end(self):
+        with self.lock:
+            self.stop_epoch()
+            self.epoch_num += 1
+
+    def start_epoch(self):
+        ## makes the batches of the current epoch from the first one
+        self.stop_epoch()
+        self.batches = self.epoch_batches(self.epoch_num)
+
+    def stop_epoch(self):
+        if self.batches is not None:
+            self.batches.close()
+        self.batches = None
+        self.batch_cache = {}
+        self.next_index = 0
+
+    def load_utterance(self, file_index):
+        io_funcs = BinaryIOCollection()
+
+        inp_features, inp_frame_number = io_funcs.load_binary_file_frame(self.inp_file_list[file_index], self.inp_dim)
+        out_features, out_frame_number = io_funcs.load_binary_file_frame(self.out_file_list[file_index], self.out_dim)
+
+        if abs(inp_frame_number-out_frame_number)>5:
+            base_file_name = os.path.basename(self.inp_file_list[file_index]).split(".")[0]
+            raise ValueError('the number of frames in input and output features are different: %d vs %d (%s)' %(inp_frame_number, out_frame_number, base_file_name))
+        frame_number = min(inp_frame_number, out_frame_number)
+
+        inp_features = inp_features[0:frame_number]
+        out_features = out_features[0:frame_number]
+        if self.inp_scaler is not None:
+            inp_features = self.inp_scaler.transform(inp_features)
+        if self.out_scaler is not None:
+            out_features = self.out_scaler.transform(out_features)
+
+        return np.asarray(inp_features, dtype=np.float32), np.asarray(out_features, dtype=np.float32)
+
+    def epoch_batches(self, epoch_num):
+        ### a different, reproducible order in each epoch ###
+        file_order = list(range(len(self.inp_file_list)))
+        frame_rng = np.random.RandomState(271638 + epoch_num)
+        if self.shuffle_data:
+            random.Random(271638 + epoch_num).shuffle(file_order)
+
+        buffer_x = []
+        buffer_y = []
+        buffer_frames = 0
+        for (inp_features, out_features) in PrefetchReader(file_order, self.load_utterance):
+            buffer_x.append(inp_features)
+            buffer_y.append(out_features)
+            buffer_frames += inp_features.shape[0]
+
+            if buffer_frames >= self.shuffle_buffer_frames:
+                buffer_x, buffer_y = yield from self.buffer_batches(buffer_x, buffer_y, frame_rng, False)
+                buffer_frames = buffer_x[0].shape[0]
+
+        yield from self.buffer_batches(buffer_x, buffer_y, frame_rng, True)
+
+    def buffer_batches(self, buffer_x, buffer_y, frame_rng, last_buffer):
+        ## yields the full batches of the buffered frames, and the last partial batch at the end of
+        ## the epoch; the frames left over are returned to start the next buffer
+        if not buffer_x:
+            return [], []
+        temp_set_x = np.concatenate(buffer_x)
+        temp_set_y = np.concatenate(buffer_y)
+        if self.shuffle_data:
+            frame_order = frame_rng.permutation(temp_set_x.shape[0])
+            temp_set_x = temp_set_x[frame_order]
+            temp_set_y = temp_set_y[frame_order]
+
+        batch_end = temp_set_x.shape[0] if last_buffer else temp_set_x.shape[0] - temp_set_x.shape[0] % self.batch_size
+        for batch_start in range(0, batch_end, self.batch_size):
+            yield temp_set_x[batch_start:batch_start+self.batch_size], temp_set_y[batch_start:batch_start+self.batch_size]
+
+        return [temp_set_x[batch_end:]], [temp_set_y[batch_end:]]
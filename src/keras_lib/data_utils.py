@@ -46,8 +46,12 @@ from sklearn import preprocessing
 
 try:
     from io_funcs.binary_io import BinaryIOCollection
+    from io_funcs.feature_archive import archive_member_path, is_archive_path
+    from frontend.feature_statistics import FeatureStatistics, compute_file_statistics
 except ModuleNotFoundError:
     from ..io_funcs.binary_io import BinaryIOCollection
+    from ..io_funcs.feature_archive import archive_member_path, is_archive_path
+    from ..frontend.feature_statistics import FeatureStatistics, compute_file_statistics
 
 ############################
 ##### Memory variables #####
@@ -68,8 +72,14 @@ def read_data_from_file_list(inp_file_list, out_file_list, inp_dim, out_dim, seq
         temp_set_x = {}
         temp_set_y = {}
     else:
-        temp_set_x = np.empty((FRAME_BUFFER_SIZE, inp_dim))
-        temp_set_y = np.empty((FRAME_BUFFER_SIZE, out_dim))
+        ### size the buffers from the file lengths, which needs no data to be read ###
+        frame_total = 0
+        for i in range(num_of_utt):
+            inp_frame_number, inp_dimension = io_funcs.stat_features(inp_file_list[i], inp_dim)
+            out_frame_number, out_dimension = io_funcs.stat_features(out_file_list[i], out_dim)
+            frame_total += min(inp_frame_number, out_frame_number)
+        temp_set_x = np.empty((frame_total, inp_dim), dtype=np.float32)
+        temp_set_y = np.empty((frame_total, out_dim), dtype=np.float32)
 
     ### read file by file ###
     current_index = 0
@@ -122,7 +132,8 @@ def read_test_data_from_file_list(inp_file_list, inp_dim, sequential_training=Tr
     if sequential_training:
         temp_set_x = {}
     else:
-        temp_set_x = np.empty((FRAME_BUFFER_SIZE, inp_dim))
+        frame_total = sum([io_funcs.stat_features(inp_file_name, inp_dim)[0] for inp_file_name in inp_file_list])
+        temp_set_x = np.empty((frame_total, inp_dim), dtype=np.float32)
 
     ### read file by file ###
     current_index = 0
@@ -310,15 +321,40 @@ def get_stateful_input(test_x, seq_length, batch_size=1):
 
     return temp_test_x
 
-def compute_norm_stats(data, stats_file, method="MVN"):
+def compute_norm_stats(data, stats_file, method="MVN", dim=None, num_workers=1):
     #### normalize training data ####
+    ## data is a frames x dim matrix, a dict of them (sequential training) or a list of
+    ## feature files of dimension dim, which are read once by num_workers processes
     io_funcs = BinaryIOCollection()
 
+    if isinstance(data, list):
+        stats = compute_file_statistics(data, dim, num_workers)
+    elif isinstance(data, dict):
+        stats = FeatureStatistics(list(data.values())[0].shape[1])
+        for features in data.values():
+            stats.update(features)
+    else:
+        stats = FeatureStatistics(data.shape[1])
+        stats.update(data)
+
     if method=="MVN":
-        scaler = preprocessing.StandardScaler().fit(data)
+        scaler = preprocessing.StandardScaler()
+        scaler.mean_  = stats.mean_vector
+        scaler.var_   = stats.variance()
+        scaler.scale_ = stats.std()
+        scaler.scale_[scaler.scale_ == 0.0] = 1.0
+        scaler.n_samples_seen_ = stats.frame_number
         norm_matrix = np.vstack((scaler.mean_, scaler.scale_))
     elif method=="MINMAX":
-        scaler = preprocessing.MinMaxScaler(feature_range=(0.01, 0.99)).fit(data)
+        scaler = preprocessing.MinMaxScaler(feature_range=(0.01, 0.99))
+        data_range = stats.max_vector - stats.min_vector
+        data_range[data_range == 0.0] = 1.0
+        scaler.data_min_   = stats.min_vector
+        scaler.data_max_   = stats.max_vector
+        scaler.data_range_ = stats.max_vector - stats.min_vector
+        scaler.scale_ = (0.99 - 0.01) / data_range
+        scaler.min_   = 0.01 - stats.min_vector * scaler.scale_
+        scaler.n_samples_seen_ = stats.frame_number
         norm_matrix = np.vstack((scaler.min_, scaler.scale_))
 
     print(norm_matrix.shape)
@@ -363,6 +399,8 @@ def denorm_data(data, scaler):
     data = scaler.inverse_transform(data)
 
 def prepare_file_path_list(file_id_list, file_dir, file_extension, new_dir_switch=True):
+    if is_archive_path(file_dir):
+        return  [archive_member_path(file_dir, file_id + file_extension) for file_id in file_id_list]
     if not os.path.exists(file_dir) and new_dir_switch:
         os.makedirs(file_dir)
     file_name_list = []
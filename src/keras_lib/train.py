@@ -67,6 +67,10 @@ class TrainKerasModels(KerasModels):
     def train_feedforward_model(self, train_x, train_y, valid_x, valid_y, batch_size=256, num_of_epochs=10, shuffle_data=True):
         self.model.fit(train_x, train_y, batch_size=batch_size, epochs=num_of_epochs, shuffle=shuffle_data)
 
+    def train_feedforward_model_from_dataset(self, train_dataset, num_of_epochs=10):
+        ### batches, shuffled already, come from a data_stream.FrameBatchDataset ###
+        self.model.fit(train_dataset, epochs=num_of_epochs, shuffle=False)
+
     def train_sequence_model(self, train_x, train_y, valid_x, valid_y, train_flen, batch_size=1, num_of_epochs=10, shuffle_data=True, training_algo=1):
         if batch_size == 1:
             self.train_recurrent_model_batchsize_one(train_x, train_y, valid_x, valid_y, num_of_epochs, shuffle_data)
@@ -44,10 +44,12 @@ import time
 try:
     from keras_lib import configuration
     from keras_lib import data_utils
+    from keras_lib import data_stream
     from keras_lib.train import TrainKerasModels
 except ModuleNotFoundError:
     from .keras_lib import configuration
     from .keras_lib import data_utils
+    from .keras_lib import data_stream
     from .keras_lib.train import TrainKerasModels
 
 class KerasClass(object):
@@ -93,6 +95,9 @@ class KerasClass(object):
         self.training_algo = cfg.training_algo
         self.shuffle_data  = cfg.shuffle_data
 
+        self.streaming_input       = cfg.streaming_input
+        self.shuffle_buffer_frames = cfg.shuffle_buffer_frames
+
         self.output_layer_type = cfg.output_layer_type
         self.loss_function     = cfg.loss_function
         self.optimizer         = cfg.optimizer
@@ -175,15 +180,12 @@ class KerasClass(object):
             self.inp_scaler = data_utils.load_norm_stats(self.inp_stats_file, self.inp_dim, method=self.inp_norm)
             self.out_scaler = data_utils.load_norm_stats(self.out_stats_file, self.out_dim, method=self.out_norm)
         else:
-            print('preparing train_x, train_y from input and output feature files...')
-            train_x, train_y, train_flen = data_utils.read_data_from_file_list(self.inp_train_file_list, self.out_train_file_list,
-                                                                            self.inp_dim, self.out_dim, sequential_training=self.sequential_training)
-
+            ### the statistics are accumulated file by file, without holding the training data in memory ###
             print('computing norm stats for train_x...')
-            inp_scaler = data_utils.compute_norm_stats(train_x, self.inp_stats_file, method=self.inp_norm)
+            inp_scaler = data_utils.compute_norm_stats(self.inp_train_file_list, self.inp_stats_file, method=self.inp_norm, dim=self.inp_dim)
 
             print('computing norm stats for train_y...')
-            out_scaler = data_utils.compute_norm_stats(train_y, self.out_stats_file, method=self.out_norm)
+            out_scaler = data_utils.compute_norm_stats(self.out_train_file_list, self.out_stats_file, method=self.out_norm, dim=self.out_dim)
 
 
     def train_keras_model(self):
@@ -195,6 +197,20 @@ class KerasClass(object):
         else:
             self.keras_models.define_sequence_model()
 
+        if self.streaming_input and not self.sequential_training:
+            ### the training data are read and normalised as they are needed ###
+            print('streaming train_x, train_y from input and output feature files...')
+            train_dataset = data_stream.FrameBatchDataset(self.inp_train_file_list, self.out_train_file_list, self.inp_dim, self.out_dim,
+                                                          batch_size=self.batch_size, inp_scaler=self.inp_scaler, out_scaler=self.out_scaler,
+                                                          shuffle_data=self.shuffle_data, shuffle_buffer_frames=self.shuffle_buffer_frames)
+
+            print('training...')
+            self.keras_models.train_feedforward_model_from_dataset(train_dataset, num_of_epochs=self.num_of_epochs)
+
+            #### store the model ####
+            self.keras_models.save_model(self.keras_model_file)
+            return
+
         #### load the data ####
         print('preparing train_x, train_y from input and output feature files...')
         train_x, train_y, train_flen = data_utils.read_data_from_file_list(self.inp_train_file_list, self.out_train_file_list,
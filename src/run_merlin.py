@@ -46,10 +46,14 @@ if __package__ is None or __package__ == '':
     from frontend.label_normalisation import HTSLabelNormalisation
     from frontend.silence_remover import SilenceRemover
     from frontend.silence_remover import trim_silence
+    from frontend.silence_remover import trim_silence_streams
+    from frontend.silence_remover import SilenceRangeCache
     from frontend.min_max_norm import MinMaxNormalisation
     from frontend.acoustic_composition import AcousticComposition
     from frontend.parameter_generation import ParameterGeneration
     from frontend.mean_variance_norm import MeanVarianceNorm
+    from frontend.feature_statistics import FeatureStatistics
+    from frontend.stream_normalisation import StreamNormalisation
 
     # the new class for label composition and normalisation
     from frontend.label_composer import LabelComposer
@@ -66,9 +70,12 @@ if __package__ is None or __package__ == '':
         from utils.remove_intermediate_files import *
     except ImportError:
         pass
-# from io_funcs.binary_io import  BinaryIOCollection
+    from io_funcs.binary_io import  BinaryIOCollection
+    from io_funcs.prefetch_reader import PrefetchReader
+    from io_funcs.feature_archive import compact_archives
     from utils.file_paths import FilePaths
     from utils.utils import prepare_file_path_list
+    from utils.utils import effective_cpu_count
     import configuration
     from run_keras_with_merlin_io import KerasClass
 
@@ -76,10 +83,14 @@ else:
     from .frontend.label_normalisation import HTSLabelNormalisation
     from .frontend.silence_remover import SilenceRemover
     from .frontend.silence_remover import trim_silence
+    from .frontend.silence_remover import trim_silence_streams
+    from .frontend.silence_remover import SilenceRangeCache
     from .frontend.min_max_norm import MinMaxNormalisation
     from .frontend.acoustic_composition import AcousticComposition
     from .frontend.parameter_generation import ParameterGeneration
     from .frontend.mean_variance_norm import MeanVarianceNorm
+    from .frontend.feature_statistics import FeatureStatistics
+    from .frontend.stream_normalisation import StreamNormalisation
 
     # the new class for label composition and normalisation
     from .frontend.label_composer import LabelComposer
@@ -92,9 +103,12 @@ else:
     from .utils.acous_feat_extraction import acous_feat_extraction
     from .utils.prepare_labels_from_txt import *
     from .utils.remove_intermediate_files import *
-# from io_funcs.binary_io import  BinaryIOCollection
+    from .io_funcs.binary_io import  BinaryIOCollection
+    from .io_funcs.prefetch_reader import PrefetchReader
+    from .io_funcs.feature_archive import compact_archives
     from .utils.file_paths import FilePaths
     from .utils.utils import prepare_file_path_list
+    from .utils.utils import effective_cpu_count
     from . import configuration
     from .run_keras_with_merlin_io import KerasClass
 
@@ -120,44 +134,123 @@ os.environ['KERAS_BACKEND'] = 'torch'
 
 def perform_acoustic_composition_on_split(args):
     """ Performs acoustic composition on one chunk of data.
-        This is used as input for Pool.map to allow parallel acoustic composition.
+        This is used as input for Pool.imap_unordered to allow parallel acoustic composition;
+        returns the chunk index with the FeatureStatistics and the file timings of the chunk.
     """
-    (delta_win, acc_win, in_file_list_dict, nn_cmp_file_list, in_dimension_dict, out_dimension_dict) = args
+    (delta_win, acc_win, in_file_list_dict, nn_cmp_file_list, in_dimension_dict, out_dimension_dict, fused_args, chunk_index) = args
     acoustic_worker = AcousticComposition(delta_win = delta_win, acc_win = acc_win)
-    acoustic_worker.prepare_nn_data(in_file_list_dict, nn_cmp_file_list, in_dimension_dict, out_dimension_dict)
+    statistics = acoustic_worker.prepare_nn_data(in_file_list_dict, nn_cmp_file_list, in_dimension_dict, out_dimension_dict, **fused_args)
+    return  chunk_index, statistics, acoustic_worker.file_timings
 
 
-def perform_acoustic_composition(delta_win, acc_win, in_file_list_dict, nn_cmp_file_list, cfg, parallel=True):
+def perform_make_equal_frames_on_split(args):
+    """ Makes the files of one chunk of in_file_list as long as those of ref_file_list. """
+    (in_file_list, ref_file_list, in_dimension_dict) = args
+    AcousticComposition().make_equal_frames(in_file_list, ref_file_list, in_dimension_dict)
+
+
+def composition_chunks(in_file_list_dict, num_workers):
+    """ Splits the utterances into chunks of file indices for the composition workers.
+        The utterances are ordered longest first, by the total size of their input files, so
+        that the longest ones are started first and the short ones fill in at the end; there are
+        several chunks per worker, which are handed out as workers become free.
+    """
+    file_number = len(list(in_file_list_dict.values())[0])
+    file_sizes = numpy.zeros(file_number)
+    for stream in in_file_list_dict:
+        for (i, file_name) in enumerate(in_file_list_dict[stream]):
+            try:
+                file_sizes[i] += os.path.getsize(file_name)
+            except OSError:
+                pass    ## e.g. members of a feature archive: their order does not change
+
+    file_order = numpy.argsort(-file_sizes, kind='stable')
+    chunk_size = max(1, int(numpy.ceil(file_number / float(num_workers * 4))))
+    return  [file_order[k:k+chunk_size].tolist() for k in range(0, file_number, chunk_size)]
+
+
+def perform_acoustic_composition(delta_win, acc_win, in_file_list_dict, nn_cmp_file_list, cfg, parallel=True,
+                                 silence_remover=None, align_file_list=None, statistics_flags=None, normaliser=None, norm_file_list=None,
+                                 equal_frames_file_lists=None):
     """ Runs acoustic composition from in_file_list_dict to nn_cmp_file_list.
-        If parallel is true, splits the data into multiple chunks and calls
-        perform_acoustic_composition_on_split for each chunk.
+        If parallel is true, splits the data into chunks (see composition_chunks) and calls
+        perform_acoustic_composition_on_split for each chunk, on cfg.composition_workers
+        processes (0 uses all the CPUs available).
+        The optional arguments are those of AcousticBase.prepare_nn_data; the FeatureStatistics
+        of the files flagged in statistics_flags are returned, merged over the chunks, together
+        with the seconds taken by each output file. equal_frames_file_lists, if given, is a pair
+        of file lists to pass to AcousticComposition.make_equal_frames first, on the same pool.
     """
-    if parallel:
-        num_splits = multiprocessing.cpu_count()
-        pool = multiprocessing.Pool(num_splits)
-
-        # split data into a list of num_splits tuples with each tuple representing
-        # the parameters for perform_acoustic_compositon_on_split
-        splits_full = [
-             (delta_win,
-              acc_win,
-              {stream: in_file_list_dict[stream][i::num_splits] for stream in in_file_list_dict},
-              nn_cmp_file_list[i::num_splits],
-              cfg.in_dimension_dict,
-              cfg.out_dimension_dict
-             ) for i in range(num_splits) ]
-
-        pool.map(perform_acoustic_composition_on_split, splits_full)
+    file_number = len(nn_cmp_file_list)
+    num_workers = cfg.composition_workers if parallel else 1
+    if num_workers == 0:
+        num_workers = effective_cpu_count()
+    num_workers = max(1, min(num_workers, file_number))
+
+    if num_workers > 1:
+        chunks = composition_chunks(in_file_list_dict, num_workers)
+    else:
+        chunks = [list(range(file_number))]
+
+    def chunk_files(file_list, chunk):
+        return  [file_list[i] for i in chunk] if file_list is not None else None
+
+    # the parameters for perform_acoustic_compositon_on_split, one tuple per chunk
+    splits_full = [
+         (delta_win,
+          acc_win,
+          {stream: chunk_files(in_file_list_dict[stream], chunk) for stream in in_file_list_dict},
+          chunk_files(nn_cmp_file_list, chunk),
+          cfg.in_dimension_dict,
+          cfg.out_dimension_dict,
+          {'silence_remover': silence_remover, 'normaliser': normaliser, 'align_file_list': chunk_files(align_file_list, chunk),
+           'statistics_flags': chunk_files(statistics_flags, chunk), 'norm_file_list': chunk_files(norm_file_list, chunk)},
+          k
+         ) for (k, chunk) in enumerate(chunks) ]
+
+    if num_workers > 1:
+        pool = multiprocessing.Pool(num_workers)
+        if equal_frames_file_lists is not None:
+            (in_file_list, ref_file_list) = equal_frames_file_lists
+            equal_frames_chunks = numpy.array_split(numpy.arange(len(in_file_list)), num_workers * 4)
+            for _ in pool.imap_unordered(perform_make_equal_frames_on_split,
+                                         [(chunk_files(in_file_list, chunk), chunk_files(ref_file_list, chunk), cfg.in_dimension_dict) for chunk in equal_frames_chunks if len(chunk) > 0]):
+                pass
+        split_results = list(pool.imap_unordered(perform_acoustic_composition_on_split, splits_full))
         pool.close()
         pool.join()
     else:
-        acoustic_worker = AcousticComposition(delta_win = delta_win, acc_win = acc_win)
-        acoustic_worker.prepare_nn_data(in_file_list_dict, nn_cmp_file_list, cfg.in_dimension_dict, cfg.out_dimension_dict)
+        if equal_frames_file_lists is not None:
+            perform_make_equal_frames_on_split(tuple(equal_frames_file_lists) + (cfg.in_dimension_dict,))
+        split_results = [perform_acoustic_composition_on_split(splits_full[0])]
+
+    ## merged in chunk order, so that the statistics do not depend on which worker finished first
+    split_results.sort(key=lambda result: result[0])
+
+    file_timings = []
+    for (chunk_index, chunk_statistics, chunk_file_timings) in split_results:
+        file_timings.extend(chunk_file_timings)
+
+    statistics = None
+    if statistics_flags is not None:
+        statistics = FeatureStatistics(cfg.cmp_dim)
+        for (chunk_index, chunk_statistics, chunk_file_timings) in split_results:
+            statistics.merge(chunk_statistics)
+
+    return  statistics, file_timings
 
 
 def main_function(cfg):
     file_paths = FilePaths(cfg)
 
+    ## applies to every BinaryIOCollection used from here on
+    BinaryIOCollection.mmap_mode = cfg.mmap_mode if cfg.mmap_mode != "None" else None
+    BinaryIOCollection.feature_headers = cfg.feature_headers
+    BinaryIOCollection.normalised_storage = cfg.normalised_storage
+    PrefetchReader.queue_depth = cfg.prefetch_depth
+    PrefetchReader.memory_cap = cfg.prefetch_memory * 1024 * 1024
+    SilenceRangeCache.cache_dir = cfg.label_cache_dir if cfg.label_cache_dir != "None" else None
+
     # get a logger for this main function
     logger = logging.getLogger("main")
     if LOGGING_ACTIVE:
@@ -224,7 +317,9 @@ def main_function(cfg):
 
     assert cfg.label_style == 'HTS', 'Only HTS-style labels are now supported as input to Merlin'
 
-    label_normaliser = HTSLabelNormalisation(question_file_name=cfg.question_file_name, add_frame_features=cfg.add_frame_features, subphone_feats=cfg.subphone_feats)
+    label_cache_dir = cfg.label_cache_dir if cfg.label_cache_dir != "None" else None
+    label_normaliser = HTSLabelNormalisation(question_file_name=cfg.question_file_name, add_frame_features=cfg.add_frame_features, subphone_feats=cfg.subphone_feats, label_cache_dir=label_cache_dir,
+                                             context_table=cfg.label_context_table, sparse_label_files=cfg.sparse_label_files)
     add_feat_dim = sum(cfg.additional_features.values())
     lab_dim = label_normaliser.dimension + add_feat_dim + cfg.appended_input_dim
     if cfg.VoiceConversion:
@@ -268,7 +363,8 @@ def main_function(cfg):
     if cfg.NORMLAB:
         # simple HTS labels
         logger.info(f'preparing label data (input) using standard HTS style labels {in_label_align_file_list}')
-        label_normaliser.perform_normalisation(in_label_align_file_list, binary_label_file_list, label_type=cfg.label_type)
+        label_normaliser.perform_normalisation(in_label_align_file_list, binary_label_file_list, label_type=cfg.label_type,
+                                               backend=cfg.label_normalisation_backend, num_workers=cfg.label_normalisation_workers)
 
         if cfg.additional_features:
             out_feat_file_list = file_paths.out_feat_file_list
@@ -293,13 +389,16 @@ def main_function(cfg):
         if cfg.GenTestList:
             min_max_normaliser.load_min_max_values(label_norm_file)
         else:
-            min_max_normaliser.find_min_max_values(nn_label_file_list[0:cfg.train_file_number])
+            min_max_normaliser.find_min_max_values(nn_label_file_list[0:cfg.train_file_number], num_workers=cfg.normalisation_workers)
 
         ### enforce silence such that the normalization runs without removing silence: only for final synthesis
         if cfg.GenTestList and cfg.enforce_silence:
-            min_max_normaliser.normalise_data(binary_label_file_list, nn_label_norm_file_list)
+            min_max_normaliser.normalise_data(binary_label_file_list, nn_label_norm_file_list, num_workers=cfg.normalisation_workers)
         else:
-            min_max_normaliser.normalise_data(nn_label_file_list, nn_label_norm_file_list)
+            min_max_normaliser.normalise_data(nn_label_file_list, nn_label_norm_file_list, num_workers=cfg.normalisation_workers)
+
+        ### drop the records of earlier runs from archived label directories
+        compact_archives(binary_label_file_list + nn_label_file_list + nn_label_norm_file_list)
     ## Debug build_your_own_voice/s1
     # raise ValueError("made it into NORMLAB")
 
@@ -321,8 +420,15 @@ def main_function(cfg):
     if cfg.MAKEDUR:
         logger.info('creating duration (output) features')
         label_normaliser.prepare_dur_data(in_label_align_file_list, file_paths.dur_file_list, cfg.label_type, cfg.dur_feature_type)
+        compact_archives(file_paths.dur_file_list)
 
     ### make output acoustic data
+    ## with fused_cmp_normalisation silence removal and the normalisation statistics are done while
+    ## composing, and with GenTestList (known statistics) the normalisation too
+    fuse_cmp_normalisation = cfg.fused_cmp_normalisation and cfg.NORMCMP and cfg.remove_silence_using_hts_labels \
+                             and not cfg.remove_silence_using_binary_labels
+    cmp_statistics = None
+    cmp_normalised = False
     if cfg.MAKECMP:
         logger.info('creating acoustic (output) features')
         delta_win = cfg.delta_win #[-0.5, 0.0, 0.5]
@@ -334,13 +440,33 @@ def main_function(cfg):
             nn_cmp_file_list      = prepare_file_path_list(test_id_list, nn_cmp_dir, cfg.cmp_ext)
             nn_cmp_norm_file_list = prepare_file_path_list(test_id_list, nn_cmp_norm_dir, cfg.cmp_ext)
 
+        fused_args = {}
+        if fuse_cmp_normalisation:
+            logger.info('removing silence and normalising while composing the acoustic features')
+            fused_args['silence_remover'] = SilenceRemover(n_cmp = cfg.cmp_dim, silence_pattern = cfg.silence_pattern, label_type=cfg.label_type, remove_frame_features = cfg.add_frame_features, subphone_feats = cfg.subphone_feats)
+            fused_args['align_file_list'] = in_label_align_file_list
+            if cfg.GenTestList:
+                if cfg.output_feature_normalisation == 'MVN':
+                    fused_args['normaliser'] = MeanVarianceNorm(feature_dimension=cfg.cmp_dim)
+                    fused_args['normaliser'].load_mean_std_values(norm_info_file)
+                elif cfg.output_feature_normalisation == 'MINMAX':
+                    fused_args['normaliser'] = MinMaxNormalisation(feature_dimension = cfg.cmp_dim, min_value = 0.01, max_value = 0.99)
+                    fused_args['normaliser'].load_min_max_values(norm_info_file)
+                elif cfg.output_feature_normalisation == 'STREAM':
+                    fused_args['normaliser'] = StreamNormalisation(cfg.out_dimension_dict, cfg.output_stream_normalisation)
+                    fused_args['normaliser'].load_statistics(norm_info_file)
+                fused_args['norm_file_list'] = nn_cmp_norm_file_list
+                cmp_normalised = 'normaliser' in fused_args
+            else:
+                fused_args['statistics_flags'] = [i < cfg.train_file_number for i in range(len(nn_cmp_file_list))]
+
         if 'dur' in list(cfg.in_dir_dict.keys()) and cfg.AcousticModel:
-            lf0_file_list = file_paths.get_lf0_file_list()
-            acoustic_worker = AcousticComposition(delta_win = delta_win, acc_win = acc_win)
-            acoustic_worker.make_equal_frames(file_paths.dur_file_list, lf0_file_list, cfg.in_dimension_dict)
-            acoustic_worker.prepare_nn_data(in_file_list_dict, nn_cmp_file_list, cfg.in_dimension_dict, cfg.out_dimension_dict)
-        else:
-            perform_acoustic_composition(delta_win, acc_win, in_file_list_dict, nn_cmp_file_list, cfg, parallel=True)
+            ## the durations are made as long as the lf0 files before they are composed
+            fused_args['equal_frames_file_lists'] = (file_paths.dur_file_list, file_paths.get_lf0_file_list())
+        (cmp_statistics, file_timings) = perform_acoustic_composition(delta_win, acc_win, in_file_list_dict, nn_cmp_file_list, cfg, parallel=True, **fused_args)
+        if file_timings:
+            (slowest_file, slowest_time) = max(file_timings, key=lambda file_timing: file_timing[1])
+            logger.info('composed %d files in %.1f worker seconds; slowest %s (%.2f s)' % (len(file_timings), sum(file_time for (_, file_time) in file_timings), slowest_file, slowest_time))
 
         if cfg.remove_silence_using_binary_labels:
             ## do this to get lab_dim:
@@ -355,11 +481,14 @@ def main_function(cfg):
             trim_silence(nn_cmp_file_list, nn_cmp_file_list, cfg.cmp_dim,
                                 binary_label_file_list, lab_dim, silence_feature)
 
-        elif cfg.remove_silence_using_hts_labels: 
+        elif cfg.remove_silence_using_hts_labels and not fuse_cmp_normalisation:
             ## back off to previous method using HTS labels:
             remover = SilenceRemover(n_cmp = cfg.cmp_dim, silence_pattern = cfg.silence_pattern, label_type=cfg.label_type, remove_frame_features = cfg.add_frame_features, subphone_feats = cfg.subphone_feats)
             remover.remove_silence(nn_cmp_file_list, in_label_align_file_list, nn_cmp_file_list) # save to itself
 
+        ### silence removal in place supersedes every record of an archived nn_cmp_dir
+        compact_archives(nn_cmp_file_list + nn_cmp_norm_file_list)
+
     ### save acoustic normalisation information for normalising the features back
     # var_dir  = file_paths.var_dir
     var_file_dict = file_paths.get_var_dic()
@@ -375,8 +504,10 @@ def main_function(cfg):
                 global_mean_vector, global_std_vector = normaliser.load_mean_std_values(norm_info_file)
             else:
                 ###calculate mean and std vectors on the training data, and apply on the whole dataset
-                global_mean_vector = normaliser.compute_mean(nn_cmp_file_list[0:cfg.train_file_number], 0, cfg.cmp_dim)
-                global_std_vector = normaliser.compute_std(nn_cmp_file_list[0:cfg.train_file_number], global_mean_vector, 0, cfg.cmp_dim)
+                if cmp_statistics is not None:
+                    global_mean_vector, global_std_vector = normaliser.set_mean_std(cmp_statistics, 0, cfg.cmp_dim)
+                else:
+                    global_mean_vector, global_std_vector = normaliser.compute_mean_std(nn_cmp_file_list[0:cfg.train_file_number], 0, cfg.cmp_dim, num_workers=cfg.normalisation_workers)
                 # for hmpd vocoder we don't need to normalize the 
                 # pdd values
                 if cfg.vocoder_type == 'hmpd':
@@ -395,31 +526,51 @@ def main_function(cfg):
                     logger.info('hmpd pdd values are not normalized since they are in 0 to 1')
                     global_mean_vector[:,stream_start_index['pdd']: stream_start_index['pdd'] + cfg.out_dimension_dict['pdd']] = 0
                     global_std_vector[:,stream_start_index['pdd']: stream_start_index['pdd'] + cfg.out_dimension_dict['pdd']] = 1
-            normaliser.feature_normalisation(nn_cmp_file_list, nn_cmp_norm_file_list)
+            if not cmp_normalised:
+                normaliser.feature_normalisation(nn_cmp_file_list, nn_cmp_norm_file_list, num_workers=cfg.normalisation_workers)
             cmp_norm_info = numpy.concatenate((global_mean_vector, global_std_vector), axis=0)
 
         elif cfg.output_feature_normalisation == 'MINMAX':
             min_max_normaliser = MinMaxNormalisation(feature_dimension = cfg.cmp_dim, min_value = 0.01, max_value = 0.99)
             if cfg.GenTestList:
                 min_max_normaliser.load_min_max_values(norm_info_file)
+            elif cmp_statistics is not None:
+                min_max_normaliser.set_min_max_values(cmp_statistics)
             else:
-                min_max_normaliser.find_min_max_values(nn_cmp_file_list[0:cfg.train_file_number])
-            min_max_normaliser.normalise_data(nn_cmp_file_list, nn_cmp_norm_file_list)
+                min_max_normaliser.find_min_max_values(nn_cmp_file_list[0:cfg.train_file_number], num_workers=cfg.normalisation_workers)
+            if not cmp_normalised:
+                min_max_normaliser.normalise_data(nn_cmp_file_list, nn_cmp_norm_file_list, num_workers=cfg.normalisation_workers)
 
             cmp_min_vector = min_max_normaliser.min_vector
             cmp_max_vector = min_max_normaliser.max_vector
             cmp_norm_info = numpy.concatenate((cmp_min_vector, cmp_max_vector), axis=0)
 
+        elif cfg.output_feature_normalisation == 'STREAM':
+            stream_normaliser = StreamNormalisation(cfg.out_dimension_dict, cfg.output_stream_normalisation)
+            if cfg.GenTestList:
+                stream_normaliser.load_statistics(norm_info_file)
+            elif cmp_statistics is not None:
+                stream_normaliser.set_statistics(cmp_statistics)
+            else:
+                stream_normaliser.compute_statistics(nn_cmp_file_list[0:cfg.train_file_number], num_workers=cfg.normalisation_workers)
+            if not cmp_normalised:
+                stream_normaliser.normalise_data(nn_cmp_file_list, nn_cmp_norm_file_list, num_workers=cfg.normalisation_workers)
+
+            global_std_vector = stream_normaliser.std_vector
+
         else:
             logger.critical('Normalisation type %s is not supported!\n' %(cfg.output_feature_normalisation))
             raise
 
         if not cfg.GenTestList:
-            cmp_norm_info = numpy.array(cmp_norm_info, 'float32')
-            fid = open(norm_info_file, 'wb')
-            cmp_norm_info.tofile(fid)
-            fid.close()
-            logger.info('saved %s vectors to %s' %(cfg.output_feature_normalisation, norm_info_file))
+            if cfg.output_feature_normalisation == 'STREAM':
+                stream_normaliser.save_statistics(norm_info_file)
+            else:
+                cmp_norm_info = numpy.array(cmp_norm_info, 'float32')
+                fid = open(norm_info_file, 'wb')
+                cmp_norm_info.tofile(fid)
+                fid.close()
+                logger.info('saved %s vectors to %s' %(cfg.output_feature_normalisation, norm_info_file))
 
             feature_index = 0
             for feature_name in list(cfg.out_dimension_dict.keys()):
@@ -434,6 +585,8 @@ def main_function(cfg):
 
                 feature_index += cfg.out_dimension_dict[feature_name]
 
+        compact_archives(nn_cmp_norm_file_list)
+
     # train_x_file_list, train_y_file_list = file_paths.get_train_list_x_y()
     # valid_x_file_list, valid_y_file_list = file_paths.get_valid_list_x_y()
     # test_x_file_list, test_y_file_list = file_paths.get_test_list_x_y()
@@ -441,7 +594,9 @@ def main_function(cfg):
     # we need to know the label dimension before training the DNN
     # computing that requires us to look at the labels
     #
-    label_normaliser = HTSLabelNormalisation(question_file_name=cfg.question_file_name, add_frame_features=cfg.add_frame_features, subphone_feats=cfg.subphone_feats)
+    label_cache_dir = cfg.label_cache_dir if cfg.label_cache_dir != "None" else None
+    label_normaliser = HTSLabelNormalisation(question_file_name=cfg.question_file_name, add_frame_features=cfg.add_frame_features, subphone_feats=cfg.subphone_feats, label_cache_dir=label_cache_dir,
+                                             context_table=cfg.label_context_table, sparse_label_files=cfg.sparse_label_files)
     add_feat_dim = sum(cfg.additional_features.values())
     lab_dim = label_normaliser.dimension + add_feat_dim + cfg.appended_input_dim
     if cfg.VoiceConversion:
@@ -479,13 +634,6 @@ def main_function(cfg):
 
         logger.info('training DNN')
 
-        fid = open(norm_info_file, 'rb')
-        cmp_min_max = numpy.fromfile(fid, dtype=numpy.float32)
-        fid.close()
-        cmp_min_max = cmp_min_max.reshape((2, -1))
-        # cmp_mean_vector = cmp_min_max[0, ]
-        # cmp_std_vector  = cmp_min_max[1, ]
-
 
         try:
             os.makedirs(model_dir)
@@ -541,20 +689,26 @@ def main_function(cfg):
 
         logger.debug('denormalising generated output using method %s' % cfg.output_feature_normalisation)
 
-        fid = open(norm_info_file, 'rb')
-        cmp_min_max = numpy.fromfile(fid, dtype=numpy.float32)
-        fid.close()
-        cmp_min_max = cmp_min_max.reshape((2, -1))
-        cmp_min_vector = cmp_min_max[0, ]
-        cmp_max_vector = cmp_min_max[1, ]
+        if cfg.output_feature_normalisation != 'STREAM':
+            fid = open(norm_info_file, 'rb')
+            cmp_min_max = numpy.fromfile(fid, dtype=numpy.float32)
+            fid.close()
+            cmp_min_max = cmp_min_max.reshape((2, -1))
+            cmp_min_vector = cmp_min_max[0, ]
+            cmp_max_vector = cmp_min_max[1, ]
 
-        if cfg.output_feature_normalisation == 'MVN':
+        if cfg.output_feature_normalisation == 'STREAM':
+            denormaliser = StreamNormalisation(cfg.out_dimension_dict, cfg.output_stream_normalisation)
+            denormaliser.load_statistics(norm_info_file)
+            denormaliser.denormalise_data(gen_file_list, gen_file_list, num_workers=cfg.normalisation_workers)
+
+        elif cfg.output_feature_normalisation == 'MVN':
             denormaliser = MeanVarianceNorm(feature_dimension = cfg.cmp_dim)
-            denormaliser.feature_denormalisation(gen_file_list, gen_file_list, cmp_min_vector, cmp_max_vector)
+            denormaliser.feature_denormalisation(gen_file_list, gen_file_list, cmp_min_vector, cmp_max_vector, num_workers=cfg.normalisation_workers)
 
         elif cfg.output_feature_normalisation == 'MINMAX':
             denormaliser = MinMaxNormalisation(cfg.cmp_dim, min_value = 0.01, max_value = 0.99, min_vector = cmp_min_vector, max_vector = cmp_max_vector)
-            denormaliser.denormalise_data(gen_file_list, gen_file_list)
+            denormaliser.denormalise_data(gen_file_list, gen_file_list, num_workers=cfg.normalisation_workers)
         else:
             logger.critical('denormalising method %s is not supported!\n' %(cfg.output_feature_normalisation))
             raise
@@ -562,7 +716,7 @@ def main_function(cfg):
         if cfg.AcousticModel:
             ##perform MLPG to smooth parameter trajectory
             ## lf0 is included, the output features much have vuv.
-            generator = ParameterGeneration(gen_wav_features = cfg.gen_wav_features, enforce_silence = cfg.enforce_silence)
+            generator = ParameterGeneration(gen_wav_features = cfg.gen_wav_features, enforce_silence = cfg.enforce_silence, num_workers = cfg.param_gen_workers)
             generator.acoustic_decomposition(gen_file_list, cfg.cmp_dim, cfg.out_dimension_dict, cfg.file_extension_dict, var_file_dict, do_MLPG=cfg.do_MLPG, cfg=cfg)
 
         if cfg.DurationModel:
@@ -571,7 +725,7 @@ def main_function(cfg):
             gen_label_list = prepare_file_path_list(gen_file_id_list, gen_dir, cfg.lab_ext)
             in_gen_label_align_file_list = prepare_file_path_list(gen_file_id_list, cfg.in_label_align_dir, cfg.lab_ext, False)
 
-            generator = ParameterGeneration(gen_wav_features = cfg.gen_wav_features)
+            generator = ParameterGeneration(gen_wav_features = cfg.gen_wav_features, num_workers = cfg.param_gen_workers)
             generator.duration_decomposition(gen_file_list, cfg.cmp_dim, cfg.out_dimension_dict, cfg.file_extension_dict)
 
             label_modifier = HTSLabelModification(silence_pattern = cfg.silence_pattern, label_type = cfg.label_type)
@@ -606,13 +760,15 @@ def main_function(cfg):
         if cfg.remove_silence_using_binary_labels:
             untrimmed_reference_data = in_file_list_dict['dur'][cfg.train_file_number:cfg.train_file_number+cfg.valid_file_number+cfg.test_file_number]
             trim_silence(untrimmed_reference_data, ref_dur_list, cfg.dur_dim, \
-                                untrimmed_test_labels, lab_dim, silence_feature)
+                                untrimmed_test_labels, lab_dim, silence_feature, header=False)
         else:
             remover = SilenceRemover(n_cmp = cfg.dur_dim, silence_pattern = cfg.silence_pattern, label_type=cfg.label_type, remove_frame_features = cfg.add_frame_features)
             remover.remove_silence(in_file_list_dict['dur'][cfg.train_file_number:cfg.train_file_number+cfg.valid_file_number+cfg.test_file_number], in_gen_label_align_file_list, ref_dur_list)
 
-        valid_dur_rmse, valid_dur_corr = calculator.compute_distortion(valid_file_id_list, ref_data_dir, gen_dir, cfg.dur_ext, cfg.dur_dim)
-        test_dur_rmse, test_dur_corr = calculator.compute_distortion(test_file_id_list , ref_data_dir, gen_dir, cfg.dur_ext, cfg.dur_dim)
+        dur_distortions = calculator.compute_stream_distortions({'valid': valid_file_id_list, 'test': test_file_id_list}, \
+                                    {'dur': (ref_data_dir, cfg.dur_ext, cfg.dur_dim, None)}, gen_dir, cfg.evaluation_workers)['dur']
+        valid_dur_rmse, valid_dur_corr = dur_distortions['valid']
+        test_dur_rmse, test_dur_corr = dur_distortions['test']
 
         logger.info('Develop: DNN -- RMSE: %.3f frames/phoneme; CORR: %.3f; ' \
                     %(valid_dur_rmse, valid_dur_corr))
@@ -624,21 +780,6 @@ def main_function(cfg):
         logger.info('calculating MCD')
 
         ref_data_dir = os.path.join(inter_data_dir, 'ref_data')
-        ref_lf0_list = prepare_file_path_list(gen_file_id_list, ref_data_dir, cfg.lf0_ext)
-        # for straight or world vocoders
-        ref_mgc_list = prepare_file_path_list(gen_file_id_list, ref_data_dir, cfg.mgc_ext)
-        ref_bap_list = prepare_file_path_list(gen_file_id_list, ref_data_dir, cfg.bap_ext)
-        # for magphase vocoder
-        ref_mag_list = prepare_file_path_list(gen_file_id_list, ref_data_dir, cfg.mag_ext)
-        ref_real_list = prepare_file_path_list(gen_file_id_list, ref_data_dir, cfg.real_ext)
-        ref_imag_list = prepare_file_path_list(gen_file_id_list, ref_data_dir, cfg.imag_ext)
-        # for GlottDNN vocoder
-        ref_lsf_list = prepare_file_path_list(gen_file_id_list, ref_data_dir, cfg.lsf_ext)
-        ref_slsf_list = prepare_file_path_list(gen_file_id_list, ref_data_dir, cfg.slsf_ext)
-        ref_gain_list = prepare_file_path_list(gen_file_id_list, ref_data_dir, cfg.gain_ext)
-        ref_hnr_list = prepare_file_path_list(gen_file_id_list, ref_data_dir, cfg.hnr_ext)
-        # for pulsemodel vocoder
-        ref_pdd_list = prepare_file_path_list(gen_file_id_list, ref_data_dir, cfg.pdd_ext)
 
         in_gen_label_align_file_list = in_label_align_file_list[cfg.train_file_number:cfg.train_file_number+cfg.valid_file_number+cfg.test_file_number]
         calculator = IndividualDistortionComp()
@@ -663,142 +804,109 @@ def main_function(cfg):
             ## Use these to trim silence:
             untrimmed_test_labels = binary_label_file_list[cfg.train_file_number:cfg.train_file_number+cfg.valid_file_number+cfg.test_file_number]
 
+        ## without HTS labels, these reference streams are used untrimmed from data_dir
+        ## (and mag, real and imag are not trimmed with binary labels either)
+        untrimmed_ref_dir_dict = {'mgc': 'mgc', 'bap': 'bap', 'lf0': 'lf0', 'mag': 'feats', 'real': 'feats', 'imag': 'feats'}
+        if cfg.vocoder_type == 'MAGPHASE':
+            untrimmed_ref_dir_dict['lf0'] = 'feats'
+
+        ref_data_dir_dict = {}
+        untrimmed_ref_list_dict = {}
+        for feature_name in ['mgc', 'bap', 'lf0', 'mag', 'real', 'imag', 'lsf', 'slsf', 'hnr', 'gain', 'pdd']:
+            if feature_name not in cfg.in_dimension_dict:
+                continue
+            if cfg.remove_silence_using_binary_labels and feature_name in ['mag', 'real', 'imag']:
+                ref_data_dir_dict[feature_name] = os.path.join(data_dir, untrimmed_ref_dir_dict[feature_name])
+            elif cfg.remove_silence_using_binary_labels or cfg.remove_silence_using_hts_labels or feature_name not in untrimmed_ref_dir_dict:
+                ref_data_dir_dict[feature_name] = ref_data_dir
+                untrimmed_ref_list_dict[feature_name] = in_file_list_dict[feature_name][cfg.train_file_number:cfg.train_file_number+cfg.valid_file_number+cfg.test_file_number]
+            else:
+                ref_data_dir_dict[feature_name] = os.path.join(data_dir, untrimmed_ref_dir_dict[feature_name])
+
+        ## trim silence from all the reference streams in one pass, reading each alignment or
+        ## label file once; the trimmed streams are either written to ref_data or kept in memory
+        if cfg.keep_reference_data_in_memory:
+            ref_list_dict = None
+        else:
+            ref_list_dict = {}
+            for feature_name in untrimmed_ref_list_dict:
+                ref_list_dict[feature_name] = prepare_file_path_list(gen_file_id_list, ref_data_dir, cfg.file_extension_dict[feature_name])
+
+        trimmed_ref_data_dict = None
+        if untrimmed_ref_list_dict and cfg.remove_silence_using_binary_labels:
+            trimmed_ref_data_dict = trim_silence_streams(untrimmed_ref_list_dict, cfg.in_dimension_dict, \
+                                    untrimmed_test_labels, lab_dim, silence_feature, ref_list_dict, header=False)
+        elif untrimmed_ref_list_dict:
+            remover = SilenceRemover(n_cmp = None, silence_pattern = cfg.silence_pattern, label_type=cfg.label_type)
+            trimmed_ref_data_dict = remover.remove_silence_streams(untrimmed_ref_list_dict, cfg.in_dimension_dict, in_gen_label_align_file_list, ref_list_dict)
+
+        ## the trimmed reference features kept in memory, by stream and file id
+        ref_data_dict = {}
+        if trimmed_ref_data_dict:
+            for feature_name in trimmed_ref_data_dict:
+                ref_data_dict[feature_name] = dict(zip(gen_file_id_list, trimmed_ref_data_dict[feature_name]))
+
+        ## each utterance of both sets has all its reference and generated streams read once
+        ref_stream_dict = {}
+        for feature_name in ref_data_dir_dict:
+            ref_stream_dict[feature_name] = (ref_data_dir_dict[feature_name], cfg.file_extension_dict[feature_name], cfg.in_dimension_dict[feature_name], ref_data_dict.get(feature_name))
+        distortions = calculator.compute_stream_distortions({'valid': valid_file_id_list, 'test': test_file_id_list}, ref_stream_dict, gen_dir, cfg.evaluation_workers)
 
         if 'mgc' in cfg.in_dimension_dict:
-            if cfg.remove_silence_using_binary_labels:
-                untrimmed_reference_data = in_file_list_dict['mgc'][cfg.train_file_number:cfg.train_file_number+cfg.valid_file_number+cfg.test_file_number]
-                trim_silence(untrimmed_reference_data, ref_mgc_list, cfg.mgc_dim, \
-                                    untrimmed_test_labels, lab_dim, silence_feature)
-            elif cfg.remove_silence_using_hts_labels:
-                remover = SilenceRemover(n_cmp = cfg.mgc_dim, silence_pattern = cfg.silence_pattern, label_type=cfg.label_type)
-                remover.remove_silence(in_file_list_dict['mgc'][cfg.train_file_number:cfg.train_file_number+cfg.valid_file_number+cfg.test_file_number], in_gen_label_align_file_list, ref_mgc_list)
-            else:
-                ref_data_dir = os.path.join(data_dir, 'mgc')
-            valid_spectral_distortion = calculator.compute_distortion(valid_file_id_list, ref_data_dir, gen_dir, cfg.mgc_ext, cfg.mgc_dim)
-            test_spectral_distortion  = calculator.compute_distortion(test_file_id_list , ref_data_dir, gen_dir, cfg.mgc_ext, cfg.mgc_dim)
+            valid_spectral_distortion = distortions['mgc']['valid']
+            test_spectral_distortion  = distortions['mgc']['test']
             valid_spectral_distortion *= (10 /numpy.log(10)) * numpy.sqrt(2.0)    ##MCD
             test_spectral_distortion  *= (10 /numpy.log(10)) * numpy.sqrt(2.0)    ##MCD
 
 
         if 'bap' in cfg.in_dimension_dict:
-            if cfg.remove_silence_using_binary_labels:
-                untrimmed_reference_data = in_file_list_dict['bap'][cfg.train_file_number:cfg.train_file_number+cfg.valid_file_number+cfg.test_file_number]
-                trim_silence(untrimmed_reference_data, ref_bap_list, cfg.bap_dim, \
-                                    untrimmed_test_labels, lab_dim, silence_feature)
-            elif cfg.remove_silence_using_hts_labels:
-                remover = SilenceRemover(n_cmp = cfg.bap_dim, silence_pattern = cfg.silence_pattern, label_type=cfg.label_type)
-                remover.remove_silence(in_file_list_dict['bap'][cfg.train_file_number:cfg.train_file_number+cfg.valid_file_number+cfg.test_file_number], in_gen_label_align_file_list, ref_bap_list)
-            else:
-                ref_data_dir = os.path.join(data_dir, 'bap')
-            valid_bap_mse = calculator.compute_distortion(valid_file_id_list, ref_data_dir, gen_dir, cfg.bap_ext, cfg.bap_dim)
-            test_bap_mse  = calculator.compute_distortion(test_file_id_list , ref_data_dir, gen_dir, cfg.bap_ext, cfg.bap_dim)
+            valid_bap_mse = distortions['bap']['valid']
+            test_bap_mse  = distortions['bap']['test']
             valid_bap_mse = valid_bap_mse / 10.0    ##Cassia's bap is computed from 10*log|S(w)|. if use HTS/SPTK style, do the same as MGC
             test_bap_mse  = test_bap_mse / 10.0    ##Cassia's bap is computed from 10*log|S(w)|. if use HTS/SPTK style, do the same as MGC
 
         if 'lf0' in cfg.in_dimension_dict:
-            if cfg.remove_silence_using_binary_labels:
-                untrimmed_reference_data = in_file_list_dict['lf0'][cfg.train_file_number:cfg.train_file_number+cfg.valid_file_number+cfg.test_file_number]
-                trim_silence(untrimmed_reference_data, ref_lf0_list, cfg.lf0_dim, \
-                                    untrimmed_test_labels, lab_dim, silence_feature)
-            elif cfg.remove_silence_using_hts_labels:
-                remover = SilenceRemover(n_cmp = cfg.lf0_dim, silence_pattern = cfg.silence_pattern, label_type=cfg.label_type)
-                remover.remove_silence(in_file_list_dict['lf0'][cfg.train_file_number:cfg.train_file_number+cfg.valid_file_number+cfg.test_file_number], in_gen_label_align_file_list, ref_lf0_list)
-            else:
-                if cfg.vocoder_type == 'MAGPHASE':
-                    ref_data_dir = os.path.join(data_dir, 'feats')
-                else:
-                    ref_data_dir = os.path.join(data_dir, 'lf0')
-            valid_f0_mse, valid_f0_corr, valid_vuv_error   = calculator.compute_distortion(valid_file_id_list, ref_data_dir, gen_dir, cfg.lf0_ext, cfg.lf0_dim)
-            test_f0_mse , test_f0_corr, test_vuv_error    = calculator.compute_distortion(test_file_id_list , ref_data_dir, gen_dir, cfg.lf0_ext, cfg.lf0_dim)
-      
+            valid_f0_mse, valid_f0_corr, valid_vuv_error   = distortions['lf0']['valid']
+            test_f0_mse , test_f0_corr, test_vuv_error    = distortions['lf0']['test']
+
         if 'mag' in cfg.in_dimension_dict:
-            if cfg.remove_silence_using_hts_labels:
-                remover = SilenceRemover(n_cmp = cfg.mag_dim, silence_pattern = cfg.silence_pattern, label_type=cfg.label_type)
-                remover.remove_silence(in_file_list_dict['mag'][cfg.train_file_number:cfg.train_file_number+cfg.valid_file_number+cfg.test_file_number], in_gen_label_align_file_list, ref_mag_list)
-            else:
-                ref_data_dir = os.path.join(data_dir, 'feats')
-            valid_mag_mse = calculator.compute_distortion(valid_file_id_list, ref_data_dir, gen_dir, cfg.mag_ext, cfg.mag_dim)
-            test_mag_mse  = calculator.compute_distortion(test_file_id_list , ref_data_dir, gen_dir, cfg.mag_ext, cfg.mag_dim)
-            valid_mag_mse = 10.0*numpy.log10(valid_mag_mse)    
+            valid_mag_mse = distortions['mag']['valid']
+            test_mag_mse  = distortions['mag']['test']
+            valid_mag_mse = 10.0*numpy.log10(valid_mag_mse)
             test_mag_mse  = 10.0*numpy.log10(test_mag_mse)
 
         if 'real' in cfg.in_dimension_dict:
-            if cfg.remove_silence_using_hts_labels:
-                remover = SilenceRemover(n_cmp = cfg.real_dim, silence_pattern = cfg.silence_pattern, label_type=cfg.label_type)
-                remover.remove_silence(in_file_list_dict['real'][cfg.train_file_number:cfg.train_file_number+cfg.valid_file_number+cfg.test_file_number], in_gen_label_align_file_list, ref_real_list)
-            else:
-                ref_data_dir = os.path.join(data_dir, 'feats')
-            valid_real_mse = calculator.compute_distortion(valid_file_id_list, ref_data_dir, gen_dir, cfg.real_ext, cfg.real_dim)
-            test_real_mse = calculator.compute_distortion(test_file_id_list , ref_data_dir, gen_dir, cfg.real_ext, cfg.real_dim)
-            valid_real_mse = 10.0*numpy.log10(valid_real_mse)    
+            valid_real_mse = distortions['real']['valid']
+            test_real_mse = distortions['real']['test']
+            valid_real_mse = 10.0*numpy.log10(valid_real_mse)
             test_real_mse  = 10.0*numpy.log10(test_real_mse)
 
         if 'imag' in cfg.in_dimension_dict:
-            if cfg.remove_silence_using_hts_labels:
-                remover = SilenceRemover(n_cmp = cfg.imag_dim, silence_pattern = cfg.silence_pattern, label_type=cfg.label_type)
-                remover.remove_silence(in_file_list_dict['imag'][cfg.train_file_number:cfg.train_file_number+cfg.valid_file_number+cfg.test_file_number], in_gen_label_align_file_list, ref_imag_list)
-            else:
-                ref_data_dir = os.path.join(data_dir, 'feats')
-            valid_imag_mse = calculator.compute_distortion(valid_file_id_list, ref_data_dir, gen_dir, cfg.imag_ext, cfg.imag_dim)
-            test_imag_mse  = calculator.compute_distortion(test_file_id_list , ref_data_dir, gen_dir, cfg.imag_ext, cfg.imag_dim)
-            valid_imag_mse = 10.0*numpy.log10(valid_imag_mse)    
+            valid_imag_mse = distortions['imag']['valid']
+            test_imag_mse  = distortions['imag']['test']
+            valid_imag_mse = 10.0*numpy.log10(valid_imag_mse)
             test_imag_mse  = 10.0*numpy.log10(test_imag_mse)
 
         if 'lsf' in cfg.in_dimension_dict:
-            if cfg.remove_silence_using_binary_labels:
-                untrimmed_reference_data = in_file_list_dict['lsf'][cfg.train_file_number:cfg.train_file_number+cfg.valid_file_number+cfg.test_file_number]
-                trim_silence(untrimmed_reference_data, ref_lsf_list, cfg.lsf_dim, \
-                                    untrimmed_test_labels, lab_dim, silence_feature)
-            else:
-                remover = SilenceRemover(n_cmp = cfg.lsf_dim, silence_pattern = cfg.silence_pattern, label_type=cfg.label_type)
-                remover.remove_silence(in_file_list_dict['lsf'][cfg.train_file_number:cfg.train_file_number+cfg.valid_file_number+cfg.test_file_number], in_gen_label_align_file_list, ref_lsf_list)
-            valid_spectral_distortion = calculator.compute_distortion(valid_file_id_list, ref_data_dir, gen_dir, cfg.lsf_ext, cfg.lsf_dim)
-            test_spectral_distortion  = calculator.compute_distortion(test_file_id_list , ref_data_dir, gen_dir, cfg.lsf_ext, cfg.lsf_dim)
-        
+            valid_spectral_distortion = distortions['lsf']['valid']
+            test_spectral_distortion  = distortions['lsf']['test']
+
         if 'slsf' in cfg.in_dimension_dict:
-            if cfg.remove_silence_using_binary_labels:
-                untrimmed_reference_data = in_file_list_dict['slsf'][cfg.train_file_number:cfg.train_file_number+cfg.valid_file_number+cfg.test_file_number]
-                trim_silence(untrimmed_reference_data, ref_slsf_list, cfg.slsf_dim, \
-                                    untrimmed_test_labels, lab_dim, silence_feature)
-            else:
-                remover = SilenceRemover(n_cmp = cfg.slsf_dim, silence_pattern = cfg.silence_pattern, label_type=cfg.label_type)
-                remover.remove_silence(in_file_list_dict['slsf'][cfg.train_file_number:cfg.train_file_number+cfg.valid_file_number+cfg.test_file_number], in_gen_label_align_file_list, ref_slsf_list)
-            valid_spectral_distortion = calculator.compute_distortion(valid_file_id_list, ref_data_dir, gen_dir, cfg.slsf_ext, cfg.slsf_dim)
-            test_spectral_distortion  = calculator.compute_distortion(test_file_id_list , ref_data_dir, gen_dir, cfg.slsf_ext, cfg.slsf_dim)
-        
+            valid_spectral_distortion = distortions['slsf']['valid']
+            test_spectral_distortion  = distortions['slsf']['test']
+
         if 'hnr' in cfg.in_dimension_dict:
-            if cfg.remove_silence_using_binary_labels:
-                untrimmed_reference_data = in_file_list_dict['hnr'][cfg.train_file_number:cfg.train_file_number+cfg.valid_file_number+cfg.test_file_number]
-                trim_silence(untrimmed_reference_data, ref_hnr_list, cfg.hnr_dim, \
-                                    untrimmed_test_labels, lab_dim, silence_feature)
-            else:
-                remover = SilenceRemover(n_cmp = cfg.hnr_dim, silence_pattern = cfg.silence_pattern, label_type=cfg.label_type)
-                remover.remove_silence(in_file_list_dict['hnr'][cfg.train_file_number:cfg.train_file_number+cfg.valid_file_number+cfg.test_file_number], in_gen_label_align_file_list, ref_hnr_list)
-            valid_spectral_distortion = calculator.compute_distortion(valid_file_id_list, ref_data_dir, gen_dir, cfg.hnr_ext, cfg.hnr_dim)
-            test_spectral_distortion  = calculator.compute_distortion(test_file_id_list , ref_data_dir, gen_dir, cfg.hnr_ext, cfg.hnr_dim)
-        
+            valid_spectral_distortion = distortions['hnr']['valid']
+            test_spectral_distortion  = distortions['hnr']['test']
+
         if 'gain' in cfg.in_dimension_dict:
-            if cfg.remove_silence_using_binary_labels:
-                untrimmed_reference_data = in_file_list_dict['gain'][cfg.train_file_number:cfg.train_file_number+cfg.valid_file_number+cfg.test_file_number]
-                trim_silence(untrimmed_reference_data, ref_gain_list, cfg.gain_dim, \
-                                    untrimmed_test_labels, lab_dim, silence_feature)
-            else:
-                remover = SilenceRemover(n_cmp = cfg.gain_dim, silence_pattern = cfg.silence_pattern, label_type=cfg.label_type)
-                remover.remove_silence(in_file_list_dict['gain'][cfg.train_file_number:cfg.train_file_number+cfg.valid_file_number+cfg.test_file_number], in_gen_label_align_file_list, ref_gain_list)
-            valid_spectral_distortion = calculator.compute_distortion(valid_file_id_list, ref_data_dir, gen_dir, cfg.gain_ext, cfg.gain_dim)
-            test_spectral_distortion  = calculator.compute_distortion(test_file_id_list , ref_data_dir, gen_dir, cfg.gain_ext, cfg.gain_dim)
-        
+            valid_spectral_distortion = distortions['gain']['valid']
+            test_spectral_distortion  = distortions['gain']['test']
+
         if 'pdd' in cfg.in_dimension_dict:
-            if cfg.remove_silence_using_binary_labels:
-                untrimmed_reference_data = in_file_list_dict['pdd'][cfg.train_file_number:cfg.train_file_number+cfg.valid_file_number+cfg.test_file_number]
-                trim_silence(untrimmed_reference_data, ref_pdd_list, cfg.pdd_dim, \
-                                    untrimmed_test_labels, lab_dim, silence_feature)
-            else:
-                remover = SilenceRemover(n_cmp = cfg.pdd_dim, silence_pattern = cfg.silence_pattern, label_type=cfg.label_type)
-                remover.remove_silence(in_file_list_dict['pdd'][cfg.train_file_number:cfg.train_file_number+cfg.valid_file_number+cfg.test_file_number], in_gen_label_align_file_list, ref_pdd_list)
-            valid_spectral_distortion = calculator.compute_distortion(valid_file_id_list, ref_data_dir, gen_dir, cfg.pdd_ext, cfg.pdd_dim)
-            test_spectral_distortion  = calculator.compute_distortion(test_file_id_list , ref_data_dir, gen_dir, cfg.pdd_ext, cfg.pdd_dim)
-        
+            valid_spectral_distortion = distortions['pdd']['valid']
+            test_spectral_distortion  = distortions['pdd']['test']
+
 
         if cfg.vocoder_type == 'MAGPHASE':
             logger.info('Develop: DNN -- MAG: %.3f dB; REAL: %.3f dB; IMAG: %.3f dB; F0:- RMSE: %.3f Hz; CORR: %.3f; VUV: %.3f%%' \
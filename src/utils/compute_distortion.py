@@ -41,10 +41,12 @@
 import sys, numpy
 try:
     from io_funcs.binary_io import BinaryIOCollection
+    from utils.utils import effective_cpu_count
 except ModuleNotFoundError:
     from ..io_funcs.binary_io import BinaryIOCollection
+    from ..utils.utils import effective_cpu_count
 import  logging
-from scipy.stats.stats import pearsonr
+from multiprocessing.dummy import Pool as ThreadPool
 
 class   DistortionComputation(object):
     def __init__(self, cmp_dim, mgc_dim, bap_dim, lf0_dim):
@@ -146,6 +148,127 @@ class   DistortionComputation(object):
         return  features, frame_number
 
 
+class CorrelationStatistics(object):
+    '''
+    Number, means, sums of squared deviations and sum of cross deviations of pairs of reference
+    and generated values, from which their Pearson correlation follows. update() adds a block of
+    pairs and merge() the statistics of another, disjoint set of pairs, with the pairwise update
+    of Chan et al. as in FeatureStatistics, so the values themselves need not be kept.
+    '''
+    def __init__(self):
+        self.sample_number = 0
+        self.ref_mean = 0.0
+        self.gen_mean = 0.0
+        self.ref_square_sum = 0.0
+        self.gen_square_sum = 0.0
+        self.cross_sum = 0.0
+
+    def update(self, ref_values, gen_values):
+        ref_values = numpy.asarray(ref_values, dtype=numpy.float64).ravel()
+        gen_values = numpy.asarray(gen_values, dtype=numpy.float64).ravel()
+        if ref_values.size == 0:
+            return  self
+
+        block_statistics = CorrelationStatistics()
+        block_statistics.sample_number = ref_values.size
+        block_statistics.ref_mean = numpy.mean(ref_values)
+        block_statistics.gen_mean = numpy.mean(gen_values)
+        ref_deviations = ref_values - block_statistics.ref_mean
+        gen_deviations = gen_values - block_statistics.gen_mean
+        block_statistics.ref_square_sum = numpy.dot(ref_deviations, ref_deviations)
+        block_statistics.gen_square_sum = numpy.dot(gen_deviations, gen_deviations)
+        block_statistics.cross_sum = numpy.dot(ref_deviations, gen_deviations)
+
+        return  self.merge(block_statistics)
+
+    def merge(self, other):
+        if other.sample_number == 0:
+            return  self
+
+        sample_number = self.sample_number + other.sample_number
+        ref_delta = other.ref_mean - self.ref_mean
+        gen_delta = other.gen_mean - self.gen_mean
+        weight = self.sample_number * float(other.sample_number) / sample_number
+        self.ref_square_sum += other.ref_square_sum + ref_delta ** 2 * weight
+        self.gen_square_sum += other.gen_square_sum + gen_delta ** 2 * weight
+        self.cross_sum += other.cross_sum + ref_delta * gen_delta * weight
+        self.ref_mean += ref_delta * (other.sample_number / float(sample_number))
+        self.gen_mean += gen_delta * (other.sample_number / float(sample_number))
+        self.sample_number = sample_number
+
+        return  self
+
+    def correlation(self):
+        return  self.cross_sum / numpy.sqrt(self.ref_square_sum * self.gen_square_sum)
+
+
+class DistortionStatistics(object):
+    '''
+    Sums from which the distortion of one stream over a set of utterances follows, without
+    keeping its frames. The measure depends on the file extension as before: RMSE and
+    correlation of the phone durations for '.dur'; F0 RMSE over the frames voiced in both,
+    its correlation and the V/UV error for '.lf0'; otherwise the mean Euclidean distance per
+    frame, leaving out the energy coefficient for '.mgc'.
+    '''
+    def __init__(self, file_ext):
+        self.file_ext = file_ext
+        self.frame_number = 0
+        self.distortion = 0.0
+        self.voiced_frame_number = 0
+        self.vuv_error = 0
+        self.correlation = CorrelationStatistics()
+
+    def update(self, ref_data, gen_data):
+        if self.file_ext == '.dur':
+            ref_data = numpy.sum(ref_data, axis=1, dtype=numpy.float64)
+            gen_data = numpy.sum(gen_data, axis=1, dtype=numpy.float64)
+            self.distortion += numpy.sum((ref_data - gen_data) ** 2)
+            self.frame_number += ref_data.size
+            self.correlation.update(ref_data, gen_data)
+        elif self.file_ext == '.lf0':
+            ref_voiced = ref_data > 0.0
+            gen_voiced = gen_data > 0.0
+            both_voiced = ref_voiced & gen_voiced
+            ref_f0 = numpy.exp(ref_data[both_voiced].astype(numpy.float64))
+            gen_f0 = numpy.exp(gen_data[both_voiced].astype(numpy.float64))
+            self.distortion += numpy.sum((ref_f0 - gen_f0) ** 2)
+            self.voiced_frame_number += ref_f0.size
+            self.vuv_error += int(numpy.count_nonzero(ref_voiced != gen_voiced))
+            self.frame_number += ref_data.shape[0]
+            self.correlation.update(ref_f0, gen_f0)
+        else:
+            if self.file_ext == '.mgc':
+                ref_data = ref_data[:, 1:]
+                gen_data = gen_data[:, 1:]
+            frame_distortion = numpy.sqrt(numpy.sum((ref_data - gen_data) ** 2, axis=1))
+            self.distortion += numpy.sum(frame_distortion, dtype=numpy.float64)
+            self.frame_number += ref_data.shape[0]
+
+        return  self
+
+    def merge(self, other):
+        self.frame_number += other.frame_number
+        self.distortion += other.distortion
+        self.voiced_frame_number += other.voiced_frame_number
+        self.vuv_error += other.vuv_error
+        self.correlation.merge(other.correlation)
+
+        return  self
+
+    def result(self):
+        if self.file_ext == '.dur':
+            dur_rmse = numpy.sqrt(self.distortion / float(self.frame_number))
+
+            return  dur_rmse, self.correlation.correlation()
+        elif self.file_ext == '.lf0':
+            distortion = numpy.sqrt(self.distortion / float(self.voiced_frame_number))
+            vuv_error = self.vuv_error / float(self.frame_number)
+
+            return  distortion, self.correlation.correlation(), vuv_error
+        else:
+            return  self.distortion / float(self.frame_number)
+
+
 '''
 to be refined. genertic class for various features
 '''
@@ -154,125 +277,73 @@ class IndividualDistortionComp(object):
     def __init__(self):
         self.logger = logging.getLogger('computer_distortion')
 
-    def compute_distortion(self, file_id_list, reference_dir, generation_dir, file_ext, feature_dim):
-        total_voiced_frame_number = 0
-
-        distortion = 0.0
-        vuv_error = 0
-        total_frame_number = 0
-
+    def compute_distortion(self, file_id_list, reference_dir, generation_dir, file_ext, feature_dim, reference_data=None, num_workers=1):
+        ## reference_data, if given, maps each file id to its (trimmed) reference features, and
+        ## only the generated files are read; reference_dir is then not used
+        stream_dict = {file_ext: (reference_dir, file_ext, feature_dim, reference_data)}
+
+        return  self.compute_stream_distortions({'all': file_id_list}, stream_dict, generation_dir, num_workers)[file_ext]['all']
+
+    def compute_stream_distortions(self, file_id_set_dict, stream_dict, generation_dir, num_workers=1):
+        '''
+        Distortions of several streams over several sets of utterances (e.g. valid and test) in
+        a single pass: each utterance has its reference and generated features read once, by one
+        of num_workers threads (0 uses all cores), and reduced to DistortionStatistics which are
+        merged per set in file order.
+            file_id_set_dict: set name -> list of file ids
+            stream_dict: stream name -> (reference_dir, file_ext, feature_dim, reference_data),
+                         with reference_data as for compute_distortion
+        Returns a dictionary of stream name -> set name -> the result of compute_distortion.
+        '''
         io_funcs = BinaryIOCollection()
 
-        ref_all_files_data = numpy.reshape(numpy.array([]), (-1,1))
-        gen_all_files_data = numpy.reshape(numpy.array([]), (-1,1))
-        for file_id in file_id_list:
-            ref_file_name  = reference_dir + '/' + file_id + file_ext
-            gen_file_name  = generation_dir + '/' + file_id + file_ext
-
-            ref_data, ref_frame_number = io_funcs.load_binary_file_frame(ref_file_name, feature_dim)
-            gen_data, gen_frame_number = io_funcs.load_binary_file_frame(gen_file_name, feature_dim)
-
-            # accept the difference upto two frames
-            if abs(ref_frame_number - gen_frame_number) <= 2:
-                ref_frame_number = min(ref_frame_number, gen_frame_number)
-                gen_frame_number = min(ref_frame_number, gen_frame_number)
-                ref_data = ref_data[0:ref_frame_number, ]
-                gen_data = gen_data[0:gen_frame_number, ]
-            
-            if ref_frame_number != gen_frame_number:
-                self.logger.critical("The number of frames is not the same: %d vs %d (%s). Error in compute_distortion.py\n." %(ref_frame_number, gen_frame_number, file_id))
-                raise
-
-            if file_ext == '.lf0':
-                ref_all_files_data = numpy.concatenate((ref_all_files_data, ref_data), axis=0)
-                gen_all_files_data = numpy.concatenate((gen_all_files_data, gen_data), axis=0)
-                temp_distortion, temp_vuv_error, voiced_frame_number = self.compute_f0_mse(ref_data, gen_data)
-                vuv_error += temp_vuv_error
-                total_voiced_frame_number += voiced_frame_number
-            elif file_ext == '.dur':
-                ref_data = numpy.reshape(numpy.sum(ref_data, axis=1), (-1, 1))
-                gen_data = numpy.reshape(numpy.sum(gen_data, axis=1), (-1, 1))
-                ref_all_files_data = numpy.concatenate((ref_all_files_data, ref_data), axis=0)
-                gen_all_files_data = numpy.concatenate((gen_all_files_data, gen_data), axis=0)
-                continue;
-            elif file_ext == '.mgc':
-                temp_distortion = self.compute_mse(ref_data[:, 1:feature_dim], gen_data[:, 1:feature_dim])
-            else:
-                temp_distortion = self.compute_mse(ref_data, gen_data)
-
-            distortion += temp_distortion
-
-            total_frame_number += ref_frame_number
-
-        if file_ext == '.dur':
-            dur_rmse = self.compute_rmse(ref_all_files_data, gen_all_files_data)
-            dur_corr = self.compute_corr(ref_all_files_data, gen_all_files_data)
-
-            return dur_rmse, dur_corr
-        elif file_ext == '.lf0':
-            distortion /= float(total_voiced_frame_number)
-            vuv_error  /= float(total_frame_number)
-
-            distortion = numpy.sqrt(distortion)
-            f0_corr = self.compute_f0_corr(ref_all_files_data, gen_all_files_data)
-
-            return  distortion, f0_corr, vuv_error
-        else:
-            distortion /= float(total_frame_number)
-
-            return  distortion
-
-    def compute_f0_mse(self, ref_data, gen_data):
-        ref_vuv_vector = numpy.zeros((ref_data.size, 1))
-        gen_vuv_vector = numpy.zeros((ref_data.size, 1))
-
-        ref_vuv_vector[ref_data > 0.0] = 1.0
-        gen_vuv_vector[gen_data > 0.0] = 1.0
-
-        sum_ref_gen_vector = ref_vuv_vector + gen_vuv_vector
-        voiced_ref_data = ref_data[sum_ref_gen_vector == 2.0]
-        voiced_gen_data = gen_data[sum_ref_gen_vector == 2.0]
-        voiced_frame_number = voiced_gen_data.size
-
-        f0_mse = (numpy.exp(voiced_ref_data) - numpy.exp(voiced_gen_data)) ** 2
-        f0_mse = numpy.sum((f0_mse))
-
-        vuv_error_vector = sum_ref_gen_vector[sum_ref_gen_vector == 0.0]
-        vuv_error = numpy.sum(sum_ref_gen_vector[sum_ref_gen_vector == 1.0])
-
-        return  f0_mse, vuv_error, voiced_frame_number
-
-    def compute_f0_corr(self, ref_data, gen_data):
-        ref_vuv_vector = numpy.zeros((ref_data.size, 1))
-        gen_vuv_vector = numpy.zeros((ref_data.size, 1))
-
-        ref_vuv_vector[ref_data > 0.0] = 1.0
-        gen_vuv_vector[gen_data > 0.0] = 1.0
-
-        sum_ref_gen_vector = ref_vuv_vector + gen_vuv_vector
-        voiced_ref_data = ref_data[sum_ref_gen_vector == 2.0]
-        voiced_gen_data = gen_data[sum_ref_gen_vector == 2.0]
-        f0_corr = self.compute_corr(numpy.exp(voiced_ref_data), numpy.exp(voiced_gen_data))
-
-        return f0_corr
-
-    def compute_corr(self, ref_data, gen_data):
-        corr_coef = pearsonr(numpy.squeeze(ref_data), numpy.squeeze(gen_data) )
-
-        return corr_coef[0]
-
-    def compute_rmse(self, ref_data, gen_data):
-        diff = (ref_data - gen_data) ** 2
-        total_frame_number = ref_data.size
-        sum_diff = numpy.sum(diff)
-        rmse = numpy.sqrt(sum_diff/total_frame_number)
-
-        return rmse
-
-    def compute_mse(self, ref_data, gen_data):
-        diff = (ref_data - gen_data) ** 2
-        sum_diff = numpy.sum(diff, axis=1)
-        sum_diff = numpy.sqrt(sum_diff)       # ** 0.5
-        sum_diff = numpy.sum(sum_diff, axis=0)
-
-        return  sum_diff
+        def _file_statistics(file_id):
+            file_statistics = {}
+            for (stream_name, (reference_dir, file_ext, feature_dim, reference_data)) in stream_dict.items():
+                if reference_data is None:
+                    (ref_data, ref_frame_number) = io_funcs.load_binary_file_frame(reference_dir + '/' + file_id + file_ext, feature_dim)
+                else:
+                    ref_data = reference_data[file_id]
+                    ref_frame_number = ref_data.shape[0]
+                (gen_data, gen_frame_number) = io_funcs.load_binary_file_frame(generation_dir + '/' + file_id + file_ext, feature_dim)
+
+                # accept the difference upto two frames
+                if abs(ref_frame_number - gen_frame_number) <= 2:
+                    ref_frame_number = min(ref_frame_number, gen_frame_number)
+                    gen_frame_number = min(ref_frame_number, gen_frame_number)
+                    ref_data = ref_data[0:ref_frame_number, ]
+                    gen_data = gen_data[0:gen_frame_number, ]
+
+                if ref_frame_number != gen_frame_number:
+                    self.logger.critical("The number of frames is not the same: %d vs %d (%s). Error in compute_distortion.py\n." %(ref_frame_number, gen_frame_number, file_id))
+                    raise ValueError('%s: %d reference and %d generated frames' % (file_id + file_ext, ref_frame_number, gen_frame_number))
+
+                file_statistics[stream_name] = DistortionStatistics(file_ext).update(ref_data, gen_data)
+
+            return  file_statistics
+
+        set_statistics = {}
+        for (stream_name, stream) in stream_dict.items():
+            set_statistics[stream_name] = {}
+            for set_name in file_id_set_dict:
+                set_statistics[stream_name][set_name] = DistortionStatistics(stream[1])
+
+        set_name_list = [set_name for set_name in file_id_set_dict for file_id in file_id_set_dict[set_name]]
+        file_id_list = [file_id for set_name in file_id_set_dict for file_id in file_id_set_dict[set_name]]
+
+        if num_workers == 0:
+            num_workers = effective_cpu_count()
+        pool = ThreadPool(max(num_workers, 1))
+        for (set_name, file_statistics) in zip(set_name_list, pool.imap(_file_statistics, file_id_list)):
+            for stream_name in file_statistics:
+                set_statistics[stream_name][set_name].merge(file_statistics[stream_name])
+        pool.close()
+        pool.join()
+
+        distortions = {}
+        for stream_name in set_statistics:
+            distortions[stream_name] = {}
+            for set_name in set_statistics[stream_name]:
+                distortions[stream_name][set_name] = set_statistics[stream_name][set_name].result()
+
+        return  distortions
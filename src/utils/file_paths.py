@@ -21,6 +21,10 @@ __author__ = 'pasindu@google.com (Pasindu De Silva)'
 import os
 from .utils import prepare_file_path_list
 from .utils import read_file_list
+try:
+  from io_funcs.feature_archive import ARCHIVE_EXTENSION
+except ModuleNotFoundError:
+  from ..io_funcs.feature_archive import ARCHIVE_EXTENSION
 import numpy
 
 
@@ -54,11 +58,10 @@ class FilePaths(object):
     if not os.path.exists(self.inter_data_dir):
       os.makedirs(self.inter_data_dir)
 
-    self.nn_cmp_dir = os.path.join(
-        self.inter_data_dir,
-        'nn' + self.cfg.combined_feature_name + '_' + str(self.cfg.cmp_dim))
-    self.nn_cmp_norm_dir = os.path.join(
-        self.inter_data_dir, 'nn_norm' + self.cfg.combined_feature_name + '_' +
+    self.nn_cmp_dir = self._get_inter_data_dir(
+        'nn', 'nn' + self.cfg.combined_feature_name + '_' + str(self.cfg.cmp_dim))
+    self.nn_cmp_norm_dir = self._get_inter_data_dir(
+        'nn_norm', 'nn_norm' + self.cfg.combined_feature_name + '_' +
         str(self.cfg.cmp_dim))
     self.model_dir = os.path.join(self.cfg.work_dir, 'nnets_model')
     self.gen_dir = os.path.join(self.cfg.work_dir, 'gen')
@@ -137,18 +140,25 @@ class FilePaths(object):
         self.var_dir,
         feature_name + '_' + str(self.cfg.out_dimension_dict[feature_name]))
 
+  def _get_inter_data_dir(self, stage, dir_name):
+    # stages listed in cfg.feature_archives are packed into a FeatureArchive
+    if stage in self.cfg.feature_archives:
+      dir_name += ARCHIVE_EXTENSION
+    return os.path.join(self.inter_data_dir, dir_name)
+
   def set_label_dir(self, dimension, suffix, lab_dim):
-    self.binary_label_dir = os.path.join(self.inter_data_dir,
-                                         'binary_label_' + str(dimension))
-    self.nn_label_dir = os.path.join(self.inter_data_dir,
-                                     'nn_no_silence_lab_' + suffix)
-    self.nn_label_norm_dir = os.path.join(self.inter_data_dir,
-                                          'nn_no_silence_lab_norm_' + suffix)
+    self.binary_label_dir = self._get_inter_data_dir(
+        'binary_label', 'binary_label_' + str(dimension))
+    self.nn_label_dir = self._get_inter_data_dir(
+        'nn_no_silence_lab', 'nn_no_silence_lab_' + suffix)
+    self.nn_label_norm_dir = self._get_inter_data_dir(
+        'nn_no_silence_lab_norm', 'nn_no_silence_lab_norm_' + suffix)
 
     label_norm_file = 'label_norm_%s_%d.dat' % (self.cfg.label_style, lab_dim)
     self.label_norm_file = os.path.join(self.inter_data_dir, label_norm_file)
 
-    out_feat_dir = os.path.join(self.inter_data_dir, 'binary_label_' + suffix)
+    out_feat_dir = self._get_inter_data_dir('binary_label',
+                                            'binary_label_' + suffix)
     self.out_feat_file_list = prepare_file_path_list(
         self.file_id_list, out_feat_dir, self.cfg.lab_ext)
 
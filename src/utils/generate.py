@@ -249,7 +249,7 @@ def wavgen_straight_type_vocoder(gen_dir, file_id_list, cfg, logger):
             enhanced_mgc = np.repeat(local_gv, frame_number, 1).T / np.repeat(gen_std, frame_number, 1).T * (gen_mgc - np.repeat(gen_mu, frame_number, 1).T) + np.repeat(gen_mu, frame_number, 1).T;
 
             new_mgc_file_name = files['mgc']+'_p_mgc'
-            io_funcs.array_to_binary_file(enhanced_mgc, new_mgc_file_name)
+            io_funcs.array_to_binary_file(enhanced_mgc, new_mgc_file_name, header=False)
 
             mgc_file_name = files['mgc']+'_p_mgc'
 
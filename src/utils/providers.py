@@ -221,8 +221,8 @@ class ListDataProvider(object):
                 self.file_index = 0
                 break
 
-            in_features, lab_frame_number = io_funcs.load_binary_file_frame(self.x_files_list[self.file_index], self.n_ins)
-            out_features, out_frame_number = io_funcs.load_binary_file_frame(self.y_files_list[self.file_index], self.n_outs)
+            lab_frame_number, lab_dimension = io_funcs.stat_features(self.x_files_list[self.file_index], self.n_ins)
+            out_frame_number, out_dimension = io_funcs.stat_features(self.y_files_list[self.file_index], self.n_outs)
          
             base_file_name = os.path.basename(self.x_files_list[self.file_index]).split('.')[0]
             if abs(lab_frame_number - out_frame_number) < 5:    ## we allow small difference here. may not be correct, but sometimes, there is one/two frames difference
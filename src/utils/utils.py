@@ -38,8 +38,15 @@
 ################################################################################
 
 import logging
+import math
+import multiprocessing
 import os
 
+try:
+  from io_funcs.feature_archive import archive_member_path, is_archive_path
+except ModuleNotFoundError:
+  from ..io_funcs.feature_archive import archive_member_path, is_archive_path
+
 
 def read_file_list(file_name):
   logger = logging.getLogger('read_file_list')
@@ -64,6 +71,20 @@ def prepare_file_path_list(file_id_list,
                            new_dir_switch=True):
   logger = logging.getLogger('prepare_file_path_list')
 
+  if is_archive_path(file_dir):
+    # files inside a FeatureArchive; only its parent directory has to exist
+    archive_dir = os.path.dirname(file_dir.rstrip('/'))
+    if archive_dir and not os.path.exists(archive_dir) and new_dir_switch:
+      os.makedirs(archive_dir)
+
+    logger.info('Preparing file_list for %s in archive \n%s', file_extension,
+                file_dir)
+
+    return [
+        archive_member_path(file_dir, file_id + file_extension)
+        for file_id in file_id_list
+    ]
+
   if not os.path.exists(file_dir) and new_dir_switch:
     os.makedirs(file_dir)
 
@@ -74,3 +95,37 @@ def prepare_file_path_list(file_id_list,
       os.path.join(file_dir, file_id + file_extension)
       for file_id in file_id_list
   ]
+
+
+def effective_cpu_count():
+  """Number of CPUs this process can actually use.
+
+  multiprocessing.cpu_count() counts every CPU of the machine; this also takes
+  the CPU affinity and the cgroup CPU quota of a container (cgroup v2 cpu.max
+  or v1 cpu.cfs_quota_us) into account, rounding a fractional quota up.
+  """
+  try:
+    cpu_count = len(os.sched_getaffinity(0))
+  except AttributeError:
+    cpu_count = multiprocessing.cpu_count()
+
+  quota = None
+  try:
+    with open('/sys/fs/cgroup/cpu.max') as fid:
+      (quota_us, period_us) = fid.read().split()[:2]
+    if quota_us != 'max':
+      quota = float(quota_us) / float(period_us)
+  except (IOError, ValueError):
+    try:
+      with open('/sys/fs/cgroup/cpu/cpu.cfs_quota_us') as fid:
+        quota_us = float(fid.read())
+      with open('/sys/fs/cgroup/cpu/cpu.cfs_period_us') as fid:
+        period_us = float(fid.read())
+      if quota_us > 0:
+        quota = quota_us / period_us
+    except (IOError, ValueError):
+      pass
+
+  if quota is not None:
+    cpu_count = min(cpu_count, max(1, int(math.ceil(quota))))
+  return cpu_count
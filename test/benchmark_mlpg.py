@@ -0,0 +1,69 @@
+"""Benchmarks the MLPG implementations over a range of utterance lengths.
+
+Compares the banded solver (frontend/mlpg_banded.py) against the sparse
+(frontend/mlpg_fast2.py) and, for short utterances, the dense
+(frontend/mlpg_fast.py) implementations, and reports the largest absolute
+difference between their outputs.
+
+Usage: python benchmark_mlpg.py [--dim 60] [--lengths 1 5 10 20 30 60]
+"""
+
+import argparse
+import sys
+import time
+
+import numpy as np
+
+sys.path.append('../src')
+from frontend.mlpg_banded import MLParameterGeneration as BandedMLPG
+from frontend.mlpg_fast2 import MLParameterGeneration as SparseMLPG
+from frontend.mlpg_fast import MLParameterGeneration as DenseMLPG
+
+
+def time_generation(generator, features, covariance, static_dimension, repeat):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        gen_parameter = generator.generation(features, covariance, static_dimension)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, gen_parameter
+
+
+def main():
+    argpar = argparse.ArgumentParser()
+    argpar.add_argument("--dim", type=int, default=60, help="Static feature dimension (e.g. 60 for mgc).")
+    argpar.add_argument("--lengths", nargs='+', type=float, default=[1, 5, 10, 20, 30, 60], help="Utterance lengths in seconds.")
+    argpar.add_argument("--frame_rate", type=int, default=200, help="Frames per second (200 for a 5 ms shift).")
+    argpar.add_argument("--dense_max_frames", type=int, default=1000, help="Skip the dense solver above this many frames.")
+    argpar.add_argument("--repeat", type=int, default=3, help="Number of timed runs; the best is reported.")
+    args = argpar.parse_args()
+
+    rng = np.random.RandomState(1234)
+    generators = [('banded', BandedMLPG()), ('sparse', SparseMLPG()), ('dense', DenseMLPG())]
+
+    row_format = "{:>8}{:>8}" + "{:>12}" * len(generators) + "{:>14}"
+    print(row_format.format('secs', 'frames', *[name + ' (s)' for name, _ in generators], 'max |diff|'))
+
+    for seconds in args.lengths:
+        frame_number = int(seconds * args.frame_rate)
+        features = rng.randn(frame_number, args.dim * 3)
+        # one global variance vector tiled over time, as in acoustic_decomposition
+        covariance = np.tile(rng.uniform(0.01, 1.0, args.dim * 3), (frame_number, 1))
+
+        timings = []
+        outputs = []
+        for name, generator in generators:
+            if name == 'dense' and frame_number > args.dense_max_frames:
+                timings.append('-')
+                continue
+            elapsed, gen_parameter = time_generation(generator, features, covariance, args.dim, args.repeat)
+            timings.append('%.4f' % elapsed)
+            outputs.append(gen_parameter)
+
+        max_diff = max(np.abs(outputs[0] - other).max() for other in outputs[1:])
+        print(row_format.format(seconds, frame_number, *timings, '%.3e' % max_diff))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,110 @@
+"""Tests the vectorised F0 interpolation and dynamic features against the original loops.
+"""
+
+import os
+import sys
+import numpy
+import pytest
+# pylint: disable=g-import-not-at-top
+sys.path.append(os.path.join(os.path.dirname(__file__), '../src'))
+from frontend.acoustic_base import AcousticBase
+
+
+def reference_interpolate_f0(data):
+  """AcousticBase.interpolate_f0 as it was written with loops over the frames."""
+  data = numpy.reshape(data, (data.size, 1))
+
+  vuv_vector = numpy.zeros((data.size, 1))
+  vuv_vector[data > 0.0] = 1.0
+  vuv_vector[data <= 0.0] = 0.0
+
+  ip_data = data
+
+  frame_number = data.size
+  last_value = 0.0
+  for i in range(frame_number):
+    if data[i] <= 0.0:
+      j = i+1
+      for j in range(i+1, frame_number):
+        if data[j] > 0.0:
+          break
+      if j < frame_number-1:
+        if last_value > 0.0:
+          step = (data[j] - data[i-1]) / float(j - i + 1)
+          for k in range(i, j):
+            ip_data[k] = data[i-1] + step * (k - i + 1)
+        else:
+          for k in range(i, j):
+            ip_data[k] = data[j]
+      else:
+        for k in range(i, frame_number):
+          ip_data[k] = last_value
+    else:
+      ip_data[i] = data[i]
+      last_value = data[i]
+
+  return ip_data, vuv_vector
+
+
+def reference_dynamic_matrix(data_matrix, dynamic_win, frame_number, dimension):
+  """AcousticBase.compute_dynamic_matrix as it was written with loops over the frames."""
+  win_length = len(dynamic_win)
+  win_width = int(win_length/2)
+  dynamic_matrix = numpy.zeros((frame_number, dimension))
+  for dim in range(dimension):
+    vector = numpy.reshape(data_matrix[:, dim], (frame_number, 1))
+    temp_vector = numpy.zeros((frame_number + 2 * win_width, 1))
+    temp_vector[win_width:frame_number+win_width] = vector
+    for w in range(win_width):
+      temp_vector[w, 0] = vector[0, 0]
+      temp_vector[frame_number+win_width+w, 0] = vector[frame_number-1, 0]
+    for i in range(frame_number):
+      for w in range(win_length):
+        dynamic_matrix[i, dim] += temp_vector[i+w, 0] * dynamic_win[w]
+  return dynamic_matrix
+
+
+def f0_contours(seed=0):
+  """Voiced and unvoiced stretches of lf0, with the edge cases at the start and end."""
+  rng = numpy.random.RandomState(seed)
+  contours = [numpy.array([v]) for v in [5.0, 0.0, -1e10]]
+  contours += [numpy.array(c) for c in [[0.0, 5.0], [5.0, 0.0], [0.0, 0.0], [5.0, 6.0],
+                                        [5.0, 0.0, 6.0], [0.0, 5.0, 0.0], [5.0, 0.0, 0.0, 6.0],
+                                        [5.0, 6.0, 0.0, 7.0], [5.0, 0.0, 6.0, 0.0, 7.0]]]
+  for _ in range(300):
+    frame_number = rng.randint(1, 60)
+    voiced = rng.rand(frame_number) < rng.uniform(0.1, 0.9)
+    contour = numpy.where(voiced, rng.uniform(4.0, 6.0, frame_number), rng.choice([0.0, -1e10], frame_number))
+    contours.append(contour)
+  return contours
+
+
+@pytest.mark.parametrize('dtype', [numpy.float32, numpy.float64])
+def test_interpolate_f0(dtype):
+  """Tests F0 interpolation on random contours.
+
+  Args:
+    dtype: data type of the contours
+  """
+  acoustic_base = AcousticBase()
+  for contour in f0_contours():
+    contour = contour.astype(dtype)
+    ip_data, vuv_vector = acoustic_base.interpolate_f0(contour.copy())
+    reference_ip_data, reference_vuv_vector = reference_interpolate_f0(contour.copy())
+    numpy.testing.assert_allclose(ip_data, reference_ip_data, rtol=1e-6 if dtype == numpy.float32 else 1e-12,
+                                  err_msg=str(contour))
+    numpy.testing.assert_array_equal(vuv_vector, reference_vuv_vector)
+    assert ip_data.dtype == dtype
+
+
+def test_compute_dynamic_matrix():
+  """Tests delta and acceleration features over all dimensions at once."""
+  acoustic_base = AcousticBase()
+  rng = numpy.random.RandomState(0)
+  for frame_number in [1, 2, 3, 10, 97]:
+    data_matrix = rng.randn(frame_number, 5).astype(numpy.float32)
+    for dynamic_win in [[-0.5, 0.0, 0.5], [1.0, -2.0, 1.0], [0.1, -0.2, 0.4, -0.2, 0.1]]:
+      numpy.testing.assert_allclose(acoustic_base.compute_dynamic_matrix(data_matrix, dynamic_win, frame_number, 5),
+                                    reference_dynamic_matrix(data_matrix, dynamic_win, frame_number, 5), rtol=1e-12, atol=1e-12)
+    numpy.testing.assert_allclose(acoustic_base.compute_dynamic_vector(data_matrix[:, 2], [-0.5, 0.0, 0.5], frame_number),
+                                  reference_dynamic_matrix(data_matrix[:, 2:3], [-0.5, 0.0, 0.5], frame_number, 1), rtol=1e-12, atol=1e-12)
@@ -0,0 +1,157 @@
+"""Tests the composition of acoustic streams into nn_cmp files.
+"""
+
+import os
+import sys
+import numpy
+import pytest
+# pylint: disable=g-import-not-at-top
+sys.path.append(os.path.join(os.path.dirname(__file__), '../src'))
+from io_funcs.binary_io import BinaryIOCollection
+from frontend.acoustic_composition import AcousticComposition
+from frontend.mean_variance_norm import MeanVarianceNorm
+from frontend.min_max_norm import MinMaxNormalisation
+from frontend.silence_remover import SilenceRemover
+
+IN_DIMENSION_DICT = {'mgc': 3, 'lf0': 1}
+OUT_DIMENSION_DICT = {'mgc': 9, 'lf0': 3, 'vuv': 1}
+
+
+def write_streams(tmp_path, file_number=6, seed=0):
+  """mgc and lf0 files of random lengths, the lf0 with unvoiced stretches, and their file lists."""
+  io_funcs = BinaryIOCollection()
+  rng = numpy.random.RandomState(seed)
+  in_file_list_dict = {'mgc': [], 'lf0': []}
+  for i in range(file_number):
+    frame_number = 5 * rng.randint(4, 18)
+    mgc = rng.randn(frame_number, 3).astype(numpy.float32)
+    lf0 = numpy.where(rng.rand(frame_number, 1) < 0.4, -1e10, rng.uniform(4.0, 6.0, (frame_number, 1))).astype(numpy.float32)
+    lf0[:2] = -1e10
+    for (stream_name, features) in [('mgc', mgc), ('lf0', lf0)]:
+      in_file_list_dict[stream_name].append(str(tmp_path / ('utt_%d.%s' % (i, stream_name))))
+      io_funcs.array_to_binary_file(features, in_file_list_dict[stream_name][-1])
+  return in_file_list_dict
+
+
+def compose(in_file_list_dict, out_file_list, **fused_args):
+  return AcousticComposition().prepare_nn_data(in_file_list_dict, out_file_list, IN_DIMENSION_DICT, OUT_DIMENSION_DICT,
+                                               **fused_args)
+
+
+def test_memory_mapped_streams(tmp_path, monkeypatch):
+  """Tests that read-only memory-mapped lf0 streams compose as loaded ones do, and are left unchanged.
+
+  Args:
+    tmp_path: pytest temporary directory
+    monkeypatch: pytest fixture to set the mmap_mode setting
+  """
+  io_funcs = BinaryIOCollection()
+  in_file_list_dict = write_streams(tmp_path)
+  lf0_data = [io_funcs.load_binary_file(file_name, 1) for file_name in in_file_list_dict['lf0']]
+  loaded_file_list = [str(tmp_path / ('utt_%d.loaded.cmp' % i)) for i in range(len(lf0_data))]
+  mapped_file_list = [str(tmp_path / ('utt_%d.mapped.cmp' % i)) for i in range(len(lf0_data))]
+
+  compose(in_file_list_dict, loaded_file_list)
+  monkeypatch.setattr(BinaryIOCollection, 'mmap_mode', 'r')
+  compose(in_file_list_dict, mapped_file_list)
+  monkeypatch.setattr(BinaryIOCollection, 'mmap_mode', None)
+
+  for (loaded_file, mapped_file) in zip(loaded_file_list, mapped_file_list):
+    numpy.testing.assert_array_equal(io_funcs.load_binary_file(mapped_file, 13), io_funcs.load_binary_file(loaded_file, 13))
+  for (file_name, data) in zip(in_file_list_dict['lf0'], lf0_data):
+    numpy.testing.assert_array_equal(io_funcs.load_binary_file(file_name, 1), data)
+
+
+def write_alignments(tmp_path, in_file_list_dict):
+  """State alignments of the utterances: a silent phone at each end and speech in between."""
+  io_funcs = BinaryIOCollection()
+  align_file_list = []
+  for (i, mgc_file) in enumerate(in_file_list_dict['mgc']):
+    phone_number = io_funcs.stat_features(mgc_file, 3)[0] // 5
+    phones = ['#'] + ['a%d' % k for k in range(phone_number - 2)] + ['#']
+    lines = []
+    for (k, phone) in enumerate(phones):
+      for state in range(5):
+        frame = k * 5 + state
+        lines.append('%d %d x^x-%s+x=x@x[%d]' % (frame * 50000, (frame + 1) * 50000, phone, state + 2))
+    align_file_list.append(str(tmp_path / ('utt_%d.lab' % i)))
+    with open(align_file_list[-1], 'w') as fid:
+      fid.write('\n'.join(lines) + '\n')
+  return align_file_list
+
+
+def make_normaliser(normalisation):
+  if normalisation == 'MVN':
+    return MeanVarianceNorm(feature_dimension=13)
+  return MinMaxNormalisation(feature_dimension=13, min_value=0.01, max_value=0.99)
+
+
+def load_files(file_list):
+  io_funcs = BinaryIOCollection()
+  return [io_funcs.load_binary_file(file_name, 13) for file_name in file_list]
+
+
+@pytest.mark.parametrize('normalisation', ['MVN', 'MINMAX'])
+def test_fused_composition(tmp_path, normalisation):
+  """Tests composing with silence removal, statistics and normalisation against the separate steps.
+
+  Args:
+    tmp_path: pytest temporary directory
+    normalisation: MVN or MINMAX, as output_feature_normalisation
+  """
+  in_file_list_dict = write_streams(tmp_path)
+  align_file_list = write_alignments(tmp_path, in_file_list_dict)
+  file_number = len(align_file_list)
+  train_file_number = 4
+  remover = SilenceRemover(n_cmp=13, label_type='state_align', remove_frame_features=True, subphone_feats='full')
+
+  def file_list(name):
+    return [str(tmp_path / ('utt_%d.%s.cmp' % (i, name))) for i in range(file_number)]
+
+  ## training: the statistics of the training files come with the composed files
+  separate_file_list = file_list('separate')
+  compose(in_file_list_dict, separate_file_list)
+  remover.remove_silence(separate_file_list, align_file_list, separate_file_list)
+  separate_normaliser = make_normaliser(normalisation)
+  fused_file_list = file_list('fused')
+  statistics = compose(in_file_list_dict, fused_file_list, silence_remover=remover, align_file_list=align_file_list,
+                       statistics_flags=[i < train_file_number for i in range(file_number)])
+  fused_normaliser = make_normaliser(normalisation)
+  if normalisation == 'MVN':
+    separate_norm_info = separate_normaliser.compute_mean_std(separate_file_list[:train_file_number], 0, 13)
+    fused_norm_info = fused_normaliser.set_mean_std(statistics, 0, 13)
+  else:
+    separate_normaliser.find_min_max_values(separate_file_list[:train_file_number])
+    fused_normaliser.set_min_max_values(statistics)
+    separate_norm_info = (separate_normaliser.min_vector, separate_normaliser.max_vector)
+    fused_norm_info = (fused_normaliser.min_vector, fused_normaliser.max_vector)
+  for (fused_vector, separate_vector) in zip(fused_norm_info, separate_norm_info):
+    numpy.testing.assert_array_equal(fused_vector, separate_vector)
+  assert load_files(fused_file_list)[0].shape[0] == BinaryIOCollection().stat_features(in_file_list_dict['mgc'][0], 3)[0] - 10
+  for (fused_data, separate_data) in zip(load_files(fused_file_list), load_files(separate_file_list)):
+    numpy.testing.assert_array_equal(fused_data, separate_data)
+
+  ## GenTestList: the statistics are loaded from norm_info_file and the files normalised while composing
+  norm_info_file = str(tmp_path / 'norm_info.dat')
+  numpy.concatenate(separate_norm_info, axis=None).astype(numpy.float32).tofile(norm_info_file)
+  separate_file_list = file_list('test_separate')
+  separate_norm_file_list = file_list('test_separate_norm')
+  compose(in_file_list_dict, separate_file_list)
+  remover.remove_silence(separate_file_list, align_file_list, separate_file_list)
+  separate_normaliser = make_normaliser(normalisation)
+  fused_normaliser = make_normaliser(normalisation)
+  if normalisation == 'MVN':
+    separate_normaliser.load_mean_std_values(norm_info_file)
+    separate_normaliser.feature_normalisation(separate_file_list, separate_norm_file_list)
+    fused_normaliser.load_mean_std_values(norm_info_file)
+  else:
+    separate_normaliser.load_min_max_values(norm_info_file)
+    separate_normaliser.normalise_data(separate_file_list, separate_norm_file_list)
+    fused_normaliser.load_min_max_values(norm_info_file)
+  fused_file_list = file_list('test_fused')
+  fused_norm_file_list = file_list('test_fused_norm')
+  assert compose(in_file_list_dict, fused_file_list, silence_remover=remover, align_file_list=align_file_list,
+                 normaliser=fused_normaliser, norm_file_list=fused_norm_file_list) is None
+  for (fused_data, separate_data) in zip(load_files(fused_file_list + fused_norm_file_list),
+                                         load_files(separate_file_list + separate_norm_file_list)):
+    numpy.testing.assert_array_equal(fused_data, separate_data)
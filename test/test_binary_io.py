@@ -0,0 +1,225 @@
+"""Tests the storage formats of BinaryIOCollection and FeatureArchive.
+"""
+
+import os
+import sys
+import numpy
+import pytest
+from multiprocessing.dummy import Pool as ThreadPool
+# pylint: disable=g-import-not-at-top
+sys.path.append(os.path.join(os.path.dirname(__file__), '../src'))
+from io_funcs.binary_io import BinaryIOCollection
+from io_funcs.feature_archive import FeatureArchive, archive_member_path, compact_archives
+
+
+def frame_labels(frame_number, sparse_dim=40, frame_dim=9, seed=0):
+  """Binary labels that are constant within runs of frames, followed by per-frame features."""
+  rng = numpy.random.RandomState(seed)
+  labels = numpy.zeros((frame_number, sparse_dim + frame_dim), dtype=numpy.float32)
+  start = 0
+  while start < frame_number:
+    end = min(frame_number, start + rng.randint(1, 12))
+    context = (rng.rand(sparse_dim) < 0.1).astype(numpy.float32)
+    context[rng.randint(sparse_dim)] = rng.rand()
+    labels[start:end, :sparse_dim] = context
+    start = end
+  labels[:, sparse_dim:] = rng.rand(frame_number, frame_dim)
+  return labels
+
+
+def test_sparse_labels(tmp_path):
+  """Tests that sparse label files read back as the dense labels.
+
+  Args:
+    tmp_path: pytest temporary directory
+  """
+  io_funcs = BinaryIOCollection()
+  for frame_number in [0, 1, 7, 500]:
+    labels = frame_labels(frame_number, seed=frame_number)
+    file_name = str(tmp_path / ('%d.lab' % frame_number))
+    io_funcs.array_to_binary_file(labels, file_name, sparse_dim=40)
+
+    numpy.testing.assert_array_equal(io_funcs.load_binary_file(file_name, 49), labels)
+    assert io_funcs.sparse_label_dim(file_name) == 40
+    assert io_funcs.stat_features(file_name, 49) == (frame_number, 49)
+    if frame_number == 500:
+      assert os.path.getsize(file_name) < labels.nbytes / 2
+
+
+def test_memory_mapped_loading(tmp_path, monkeypatch):
+  """Tests that memory-mapped files hold the same data.
+
+  Args:
+    tmp_path: pytest temporary directory
+    monkeypatch: pytest fixture to set the mmap_mode setting
+  """
+  io_funcs = BinaryIOCollection()
+  data = numpy.random.RandomState(0).rand(30, 7).astype(numpy.float32)
+  plain_file = str(tmp_path / 'plain.cmp')
+  headed_file = str(tmp_path / 'headed.cmp')
+  io_funcs.array_to_binary_file(data, plain_file)
+  io_funcs.array_to_binary_file(data, headed_file, header=True)
+
+  monkeypatch.setattr(BinaryIOCollection, 'mmap_mode', 'r')
+  for file_name in [plain_file, headed_file]:
+    features, frame_number = io_funcs.load_binary_file_frame(file_name, 7)
+    assert isinstance(features.base, numpy.memmap) or isinstance(features, numpy.memmap)
+    assert frame_number == 30
+    numpy.testing.assert_array_equal(features, data)
+
+  ## writing over a mapped file leaves earlier mappings intact
+  mapped = io_funcs.load_binary_file(plain_file, 7)
+  io_funcs.array_to_binary_file(data * 2.0, plain_file)
+  numpy.testing.assert_array_equal(mapped, data)
+  numpy.testing.assert_array_equal(io_funcs.load_binary_file(plain_file, 7), data * 2.0)
+
+
+def test_feature_headers(tmp_path, monkeypatch):
+  """Tests headed files and that they mix with plain ones.
+
+  Args:
+    tmp_path: pytest temporary directory
+    monkeypatch: pytest fixture to set the feature_headers setting
+  """
+  io_funcs = BinaryIOCollection()
+  data = numpy.random.RandomState(0).rand(25, 6).astype(numpy.float32)
+  stream_layout = [('mgc', 4), ('lf0', 1), ('vuv', 1)]
+
+  plain_file = str(tmp_path / 'plain.cmp')
+  io_funcs.array_to_binary_file(data, plain_file)
+  monkeypatch.setattr(BinaryIOCollection, 'feature_headers', True)
+  headed_file = str(tmp_path / 'headed.cmp')
+  io_funcs.array_to_binary_file(data, headed_file, stream_layout=stream_layout)
+
+  assert os.path.getsize(plain_file) == data.nbytes
+  assert io_funcs.feature_stream_layout(plain_file) is None
+  assert io_funcs.feature_stream_layout(headed_file) == stream_layout
+  for file_name in [plain_file, headed_file]:
+    numpy.testing.assert_array_equal(io_funcs.load_binary_file(file_name, 6), data)
+    assert io_funcs.stat_features(file_name, 6) == (25, 6)
+  ## a header knows its dimension
+  assert io_funcs.stat_features(headed_file) == (25, 6)
+  with pytest.raises(AssertionError):
+    io_funcs.load_binary_file(headed_file, 3)
+
+
+@pytest.mark.parametrize('storage', ['float32', 'float16', 'int16', 'uint8'])
+def test_stored_features(tmp_path, storage):
+  """Tests that float16 and quantised files decode to within their precision.
+
+  Args:
+    tmp_path: pytest temporary directory
+    storage: storage type
+  """
+  io_funcs = BinaryIOCollection()
+  rng = numpy.random.RandomState(0)
+  data = (rng.randn(200, 5) * [1.0, 3.0, 0.01, 100.0, 1.0]).astype(numpy.float32)
+  data[:, 4] = 0.5  ## a constant dimension
+  file_name = str(tmp_path / ('%s.cmp' % storage))
+  io_funcs.array_to_binary_file(data, file_name, storage=storage)
+
+  features = io_funcs.load_binary_file(file_name, 5)
+  assert features.dtype == numpy.float32
+  assert io_funcs.stat_features(file_name, 5) == (200, 5)
+  value_range = data.max(axis=0) - data.min(axis=0)
+  if storage == 'float32':
+    numpy.testing.assert_array_equal(features, data)
+  elif storage == 'float16':
+    numpy.testing.assert_allclose(features, data, rtol=1e-3, atol=1e-6)
+  else:
+    step = value_range / (numpy.iinfo(storage).max - numpy.iinfo(storage).min)
+    assert numpy.all(numpy.abs(features - data) <= step * 0.5 + 1e-5 * numpy.abs(data) + 1e-7)
+    numpy.testing.assert_array_equal(features[:, 4], data[:, 4])
+    assert os.path.getsize(file_name) < data.nbytes / 1.5
+
+
+def test_feature_archive(tmp_path):
+  """Tests that archived files read back as separate files would.
+
+  Args:
+    tmp_path: pytest temporary directory
+  """
+  io_funcs = BinaryIOCollection()
+  archive_file = str(tmp_path / 'nn_cmp.pack')
+  rng = numpy.random.RandomState(0)
+  data_dict = {}
+  for i in range(40):
+    data_dict['utt_%02d.cmp' % i] = rng.rand(rng.randint(1, 60), 8).astype(numpy.float32)
+
+  def write(member_name):
+    io_funcs.array_to_binary_file(data_dict[member_name], archive_member_path(archive_file, member_name))
+
+  pool = ThreadPool(4)
+  pool.map(write, sorted(data_dict))
+  pool.close()
+  pool.join()
+
+  ## a file written again is superseded, whatever its format
+  labels = frame_labels(33, sparse_dim=5, frame_dim=3)
+  io_funcs.array_to_binary_file(labels, archive_member_path(archive_file, 'utt_00.cmp'), sparse_dim=5)
+  io_funcs.array_to_binary_file(data_dict['utt_01.cmp'], archive_member_path(archive_file, 'utt_01.cmp'), storage='int16')
+
+  assert sorted(FeatureArchive(archive_file).member_names()) == sorted(data_dict)
+  numpy.testing.assert_array_equal(io_funcs.load_binary_file(archive_member_path(archive_file, 'utt_00.cmp'), 8), labels)
+  assert io_funcs.sparse_label_dim(archive_member_path(archive_file, 'utt_00.cmp')) == 5
+  numpy.testing.assert_allclose(io_funcs.load_binary_file(archive_member_path(archive_file, 'utt_01.cmp'), 8),
+                                data_dict['utt_01.cmp'], atol=1e-4)
+  for member_name in sorted(data_dict)[2:]:
+    file_name = archive_member_path(archive_file, member_name)
+    numpy.testing.assert_array_equal(io_funcs.load_binary_file(file_name, 8), data_dict[member_name])
+    assert io_funcs.stat_features(file_name, 8) == data_dict[member_name].shape
+  with pytest.raises(IOError):
+    io_funcs.load_binary_file(archive_member_path(archive_file, 'missing.cmp'), 8)
+
+
+def test_archive_compaction(tmp_path):
+  """Tests that files written again read back as their latest record, before and after compaction.
+
+  Args:
+    tmp_path: pytest temporary directory
+  """
+  io_funcs = BinaryIOCollection()
+  archive_file = str(tmp_path / 'nn_cmp.pack')
+  other_archive_file = str(tmp_path / 'nn_lab.pack')
+  rng = numpy.random.RandomState(0)
+  data_dict = {}
+  member_names = ['utt_%02d.cmp' % i for i in range(10)]
+  file_list = [archive_member_path(archive_file, member_name) for member_name in member_names]
+  for file_name in file_list:
+    io_funcs.array_to_binary_file(rng.rand(rng.randint(1, 60), 8).astype(numpy.float32), file_name)
+  io_funcs.array_to_binary_file(rng.rand(10, 8).astype(numpy.float32), archive_member_path(other_archive_file, 'utt_00.lab'))
+
+  ## a stage that rewrites every file, one of them twice and one in another format
+  for file_name in file_list:
+    data_dict[file_name] = rng.rand(rng.randint(1, 60), 8).astype(numpy.float32)
+    io_funcs.array_to_binary_file(data_dict[file_name], file_name)
+  data_dict[file_list[3]] = rng.rand(7, 8).astype(numpy.float32)
+  io_funcs.array_to_binary_file(data_dict[file_list[3]], file_list[3])
+  data_dict[file_list[5]] = frame_labels(20, sparse_dim=5, frame_dim=3)
+  io_funcs.array_to_binary_file(data_dict[file_list[5]], file_list[5], sparse_dim=5)
+
+  def check():
+    assert sorted(FeatureArchive(archive_file).member_names()) == member_names
+    for file_name in file_list:
+      numpy.testing.assert_array_equal(io_funcs.load_binary_file(file_name, 8), data_dict[file_name])
+      assert io_funcs.stat_features(file_name, 8) == data_dict[file_name].shape
+
+  check()
+  archive_size = os.path.getsize(archive_file)
+  other_archive_size = os.path.getsize(other_archive_file)
+  kept_size = sum(length for (offset, length, frame_number, dimension) in FeatureArchive(archive_file).read_index().values())
+  assert kept_size < archive_size
+  ## only the archives of the files are compacted
+  assert compact_archives(file_list + [str(tmp_path / 'utt_00.dur')]) == archive_size - kept_size
+  assert os.path.getsize(archive_file) == kept_size
+  assert os.path.getsize(other_archive_file) == other_archive_size
+  with open(archive_file + '.index') as fid:
+    assert len(fid.readlines()) == len(file_list)
+  assert not [file_name for file_name in os.listdir(str(tmp_path)) if file_name.endswith('.compact')]
+  check()
+
+  ## nothing more to drop, and the archive takes new records
+  assert FeatureArchive(archive_file).compact() == 0
+  data_dict[file_list[0]] = rng.rand(4, 8).astype(numpy.float32)
+  io_funcs.array_to_binary_file(data_dict[file_list[0]], file_list[0])
+  check()
@@ -0,0 +1,140 @@
+"""Tests the single-pass distortion statistics against the original compute_distortion.
+"""
+
+import os
+import sys
+import numpy
+import pytest
+from scipy.stats import pearsonr
+# pylint: disable=g-import-not-at-top
+sys.path.append(os.path.join(os.path.dirname(__file__), '../src'))
+from io_funcs.binary_io import BinaryIOCollection
+from utils.compute_distortion import IndividualDistortionComp
+
+## stream name -> (file extension, dimension)
+STREAMS = {'mgc': ('.mgc', 5), 'bap': ('.bap', 2), 'lf0': ('.lf0', 1), 'dur': ('.dur', 5)}
+
+
+def reference_f0_mse(ref_data, gen_data):
+  voiced = (ref_data > 0.0) & (gen_data > 0.0)
+  f0_mse = numpy.sum((numpy.exp(ref_data[voiced]) - numpy.exp(gen_data[voiced])) ** 2)
+  vuv_error = numpy.sum((ref_data > 0.0) != (gen_data > 0.0))
+  return f0_mse, vuv_error, numpy.sum(voiced)
+
+
+def reference_mse(ref_data, gen_data):
+  return numpy.sum(numpy.sqrt(numpy.sum((ref_data - gen_data) ** 2, axis=1)), axis=0)
+
+
+def reference_distortion(file_id_list, reference_dir, generation_dir, file_ext, feature_dim):
+  """IndividualDistortionComp.compute_distortion as it was, joining the data of all files."""
+  io_funcs = BinaryIOCollection()
+  total_voiced_frame_number = 0
+  distortion = 0.0
+  vuv_error = 0
+  total_frame_number = 0
+  ref_all_files_data = numpy.reshape(numpy.array([]), (-1, 1))
+  gen_all_files_data = numpy.reshape(numpy.array([]), (-1, 1))
+  for file_id in file_id_list:
+    ref_data, ref_frame_number = io_funcs.load_binary_file_frame(reference_dir + '/' + file_id + file_ext, feature_dim)
+    gen_data, gen_frame_number = io_funcs.load_binary_file_frame(generation_dir + '/' + file_id + file_ext, feature_dim)
+    frame_number = min(ref_frame_number, gen_frame_number)
+    ref_data = ref_data[0:frame_number]
+    gen_data = gen_data[0:frame_number]
+
+    if file_ext == '.lf0':
+      ref_all_files_data = numpy.concatenate((ref_all_files_data, ref_data), axis=0)
+      gen_all_files_data = numpy.concatenate((gen_all_files_data, gen_data), axis=0)
+      temp_distortion, temp_vuv_error, voiced_frame_number = reference_f0_mse(ref_data, gen_data)
+      vuv_error += temp_vuv_error
+      total_voiced_frame_number += voiced_frame_number
+    elif file_ext == '.dur':
+      ref_all_files_data = numpy.concatenate((ref_all_files_data, numpy.sum(ref_data, axis=1).reshape(-1, 1)), axis=0)
+      gen_all_files_data = numpy.concatenate((gen_all_files_data, numpy.sum(gen_data, axis=1).reshape(-1, 1)), axis=0)
+      continue
+    elif file_ext == '.mgc':
+      temp_distortion = reference_mse(ref_data[:, 1:feature_dim], gen_data[:, 1:feature_dim])
+    else:
+      temp_distortion = reference_mse(ref_data, gen_data)
+    distortion += temp_distortion
+    total_frame_number += frame_number
+
+  if file_ext == '.dur':
+    dur_rmse = numpy.sqrt(numpy.sum((ref_all_files_data - gen_all_files_data) ** 2) / ref_all_files_data.size)
+    return dur_rmse, pearsonr(numpy.squeeze(ref_all_files_data), numpy.squeeze(gen_all_files_data))[0]
+  elif file_ext == '.lf0':
+    voiced = (ref_all_files_data > 0.0) & (gen_all_files_data > 0.0)
+    f0_corr = pearsonr(numpy.exp(ref_all_files_data[voiced]), numpy.exp(gen_all_files_data[voiced]))[0]
+    return numpy.sqrt(distortion / float(total_voiced_frame_number)), f0_corr, vuv_error / float(total_frame_number)
+  return distortion / float(total_frame_number)
+
+
+def write_utterances(tmp_path, file_id_list):
+  """Reference and generated streams, some a frame or two apart in length, and the reference data."""
+  io_funcs = BinaryIOCollection()
+  rng = numpy.random.RandomState(0)
+  reference_dir = tmp_path / 'ref'
+  generation_dir = tmp_path / 'gen'
+  reference_dir.mkdir()
+  generation_dir.mkdir()
+  reference_data = {stream_name: {} for stream_name in STREAMS}
+  for file_id in file_id_list:
+    frame_number = rng.randint(20, 120)
+    for (stream_name, (file_ext, feature_dim)) in STREAMS.items():
+      ref_data = rng.randn(frame_number, feature_dim).astype(numpy.float32)
+      gen_frame_number = frame_number + rng.randint(-2, 3)
+      gen_data = (ref_data[:min(frame_number, gen_frame_number)] + 0.3 * rng.randn(min(frame_number, gen_frame_number), feature_dim)).astype(numpy.float32)
+      gen_data = numpy.concatenate([gen_data, gen_data[-1:].repeat(gen_frame_number - gen_data.shape[0], axis=0)])
+      if stream_name == 'lf0':
+        ref_data = numpy.where(rng.rand(frame_number, 1) < 0.3, -1e10, ref_data + 5.0).astype(numpy.float32)
+        gen_data = numpy.where(rng.rand(gen_frame_number, 1) < 0.3, -1e10, gen_data + 5.0).astype(numpy.float32)
+      elif stream_name == 'dur':
+        ref_data = numpy.abs(ref_data * 5.0).round()
+        gen_data = numpy.abs(gen_data * 5.0).round()
+      io_funcs.array_to_binary_file(ref_data, str(reference_dir / (file_id + file_ext)))
+      io_funcs.array_to_binary_file(gen_data, str(generation_dir / (file_id + file_ext)))
+      reference_data[stream_name][file_id] = ref_data
+  return str(reference_dir), str(generation_dir), reference_data
+
+
+def assert_distortion_equal(distortion, expected):
+  numpy.testing.assert_allclose(numpy.atleast_1d(distortion).astype(numpy.float64),
+                                numpy.atleast_1d(expected).astype(numpy.float64), rtol=1e-6)
+
+
+@pytest.mark.parametrize('num_workers', [1, 3])
+def test_compute_distortion(tmp_path, num_workers):
+  """Tests every stream type with the files read on num_workers threads.
+
+  Args:
+    tmp_path: pytest temporary directory
+    num_workers: threads reading the files
+  """
+  file_id_list = ['utt_%02d' % i for i in range(12)]
+  reference_dir, generation_dir, reference_data = write_utterances(tmp_path, file_id_list)
+  calculator = IndividualDistortionComp()
+
+  for (stream_name, (file_ext, feature_dim)) in STREAMS.items():
+    expected = reference_distortion(file_id_list, reference_dir, generation_dir, file_ext, feature_dim)
+    assert_distortion_equal(calculator.compute_distortion(file_id_list, reference_dir, generation_dir, file_ext, feature_dim,
+                                                          num_workers=num_workers), expected)
+    ## reference data kept in memory instead of read from reference_dir
+    assert_distortion_equal(calculator.compute_distortion(file_id_list, None, generation_dir, file_ext, feature_dim,
+                                                          reference_data[stream_name], num_workers=num_workers), expected)
+
+
+def test_compute_stream_distortions(tmp_path):
+  """Tests all streams and sets scored in one pass."""
+  file_id_list = ['utt_%02d' % i for i in range(12)]
+  reference_dir, generation_dir, reference_data = write_utterances(tmp_path, file_id_list)
+  file_id_set_dict = {'valid': file_id_list[:5], 'test': file_id_list[5:]}
+  stream_dict = {}
+  for (stream_name, (file_ext, feature_dim)) in STREAMS.items():
+    stream_dict[stream_name] = (reference_dir, file_ext, feature_dim, reference_data[stream_name] if stream_name == 'bap' else None)
+
+  distortions = IndividualDistortionComp().compute_stream_distortions(file_id_set_dict, stream_dict, generation_dir, num_workers=0)
+
+  for (stream_name, (file_ext, feature_dim)) in STREAMS.items():
+    for (set_name, set_file_id_list) in file_id_set_dict.items():
+      assert_distortion_equal(distortions[stream_name][set_name],
+                              reference_distortion(set_file_id_list, reference_dir, generation_dir, file_ext, feature_dim))
@@ -0,0 +1,83 @@
+"""Tests FrameBatchDataset, the streamed Keras training data.
+"""
+
+import os
+import sys
+import numpy
+import pytest
+# pylint: disable=g-import-not-at-top
+sys.path.append(os.path.join(os.path.dirname(__file__), '../src'))
+keras = pytest.importorskip('keras')
+from io_funcs.binary_io import BinaryIOCollection
+from keras_lib.data_stream import FrameBatchDataset
+
+
+def make_corpus(data_dir, frame_numbers):
+  """Input and output feature files whose outputs are a function of the inputs."""
+  io_funcs = BinaryIOCollection()
+  rng = numpy.random.RandomState(0)
+  inp_file_list = []
+  out_file_list = []
+  for (i, frame_number) in enumerate(frame_numbers):
+    inp_features = rng.rand(frame_number, 5).astype(numpy.float32)
+    inp_file_list.append(str(data_dir / ('%d.lab' % i)))
+    out_file_list.append(str(data_dir / ('%d.cmp' % i)))
+    io_funcs.array_to_binary_file(inp_features, inp_file_list[-1])
+    io_funcs.array_to_binary_file(inp_features[:, :2] * 2.0, out_file_list[-1])
+  return inp_file_list, out_file_list
+
+
+def epoch_frames(dataset, indices):
+  """The batches of the given indices, checked and stacked."""
+  batches = [dataset[index] for index in indices]
+  for (batch_x, batch_y) in batches:
+    numpy.testing.assert_allclose(batch_y, batch_x[:, :2] * 2.0)
+  return numpy.concatenate([batch_x for (batch_x, batch_y) in batches])
+
+
+def test_frame_batch_dataset_epochs(tmp_path):
+  """Tests two epochs of batches looked up by index.
+
+  Args:
+    tmp_path: pytest temporary directory
+  """
+  inp_file_list, out_file_list = make_corpus(tmp_path, [37, 52, 11, 80])
+  all_frames = numpy.concatenate([BinaryIOCollection().load_binary_file(file_name, 5) for file_name in inp_file_list])
+
+  dataset = FrameBatchDataset(inp_file_list, out_file_list, 5, 2, batch_size=32, shuffle_buffer_frames=64, max_queue_size=2)
+  assert len(dataset) == 6
+
+  ## a peek at a batch does not shift the ones after it
+  peeked_x, peeked_y = dataset[2]
+  first_epoch = epoch_frames(dataset, range(len(dataset)))
+  numpy.testing.assert_array_equal(peeked_x, first_epoch[64:96])
+  with pytest.raises(IndexError):
+    dataset[len(dataset)]
+
+  ## a batch no longer kept is made again
+  numpy.testing.assert_array_equal(dataset[0][0], first_epoch[0:32])
+
+  dataset.on_epoch_end()
+  second_epoch = epoch_frames(dataset, range(len(dataset)))
+
+  for frames in [first_epoch, second_epoch]:
+    assert frames.shape == all_frames.shape
+    numpy.testing.assert_array_equal(numpy.unique(frames, axis=0), numpy.unique(all_frames, axis=0))
+  assert not numpy.array_equal(first_epoch, second_epoch)
+
+
+def test_frame_batch_dataset_fit(tmp_path):
+  """Tests training a model on the data set for two epochs.
+
+  Args:
+    tmp_path: pytest temporary directory
+  """
+  inp_file_list, out_file_list = make_corpus(tmp_path, [37, 52, 11, 80])
+  dataset = FrameBatchDataset(inp_file_list, out_file_list, 5, 2, batch_size=32, shuffle_buffer_frames=64)
+
+  model = keras.Sequential([keras.Input((5,)), keras.layers.Dense(2)])
+  model.compile(optimizer='sgd', loss='mse')
+  history = model.fit(dataset, epochs=2, verbose=0)
+
+  assert len(history.history['loss']) == 2
+  assert history.history['loss'][1] < history.history['loss'][0]
@@ -0,0 +1,86 @@
+"""Tests FeatureStatistics against single-pass and two-pass statistics.
+"""
+
+import os
+import sys
+import numpy
+import pytest
+# pylint: disable=g-import-not-at-top
+sys.path.append(os.path.join(os.path.dirname(__file__), '../src'))
+from io_funcs.binary_io import BinaryIOCollection
+from frontend.feature_statistics import FeatureStatistics, compute_file_statistics
+from frontend.mean_variance_norm import MeanVarianceNorm
+
+
+def feature_blocks(seed=0, dimension=6):
+  """Blocks of frames with offsets much larger than their spread, including empty ones."""
+  rng = numpy.random.RandomState(seed)
+  blocks = []
+  for frame_number in [1, 0, 40, 3, 250, 0, 17, 1]:
+    blocks.append((rng.randn(frame_number, dimension) * rng.uniform(0.01, 2.0, dimension)
+                   + rng.uniform(-1000.0, 1000.0, dimension)).astype(numpy.float32))
+  return blocks
+
+
+def check_statistics(statistics, frames):
+  frames = frames.astype(numpy.float64)
+  assert statistics.frame_number == frames.shape[0]
+  numpy.testing.assert_allclose(statistics.mean_vector, frames.mean(axis=0), rtol=1e-12)
+  numpy.testing.assert_allclose(statistics.variance(), frames.var(axis=0), rtol=1e-9)
+  numpy.testing.assert_allclose(statistics.std(), frames.std(axis=0), rtol=1e-9)
+  numpy.testing.assert_array_equal(statistics.min_vector, frames.min(axis=0))
+  numpy.testing.assert_array_equal(statistics.max_vector, frames.max(axis=0))
+
+
+def test_merge_matches_single_pass():
+  """Tests merging block statistics in different groupings."""
+  blocks = feature_blocks()
+  frames = numpy.concatenate(blocks)
+
+  check_statistics(FeatureStatistics(6).update(frames), frames)
+
+  updated = FeatureStatistics(6)
+  for block in blocks:
+    updated.update(block)
+  check_statistics(updated, frames)
+
+  ## statistics of the first and second halves, merged either way round
+  first = FeatureStatistics(6)
+  second = FeatureStatistics(6)
+  for block in blocks[:4]:
+    first.update(block)
+  for block in blocks[4:]:
+    second.update(block)
+  check_statistics(FeatureStatistics(6).merge(second).merge(first), frames)
+  check_statistics(first.merge(FeatureStatistics(6)).merge(second), frames)
+
+
+@pytest.mark.parametrize('num_workers', [1, 3])
+def test_file_statistics(tmp_path, num_workers):
+  """Tests file statistics against the two-pass compute_mean and compute_std.
+
+  Args:
+    tmp_path: pytest temporary directory
+    num_workers: worker processes reading the files
+  """
+  io_funcs = BinaryIOCollection()
+  file_list = []
+  for (i, block) in enumerate(feature_blocks(1) + feature_blocks(2)):
+    if block.shape[0] == 0:
+      continue
+    file_list.append(str(tmp_path / ('%d.cmp' % i)))
+    io_funcs.array_to_binary_file(block, file_list[-1])
+
+  statistics = compute_file_statistics(file_list, 6, num_workers)
+  check_statistics(statistics, numpy.concatenate([io_funcs.load_binary_file(file_name, 6) for file_name in file_list]))
+
+  ## the two-pass functions sum the float32 frames in float32
+  normaliser = MeanVarianceNorm(6)
+  mean_vector = normaliser.compute_mean(file_list, 0, 6)
+  std_vector = normaliser.compute_std(file_list, mean_vector, 0, 6)
+  numpy.testing.assert_allclose(statistics.mean_vector, mean_vector[0], rtol=1e-5)
+  numpy.testing.assert_allclose(statistics.std(), std_vector[0], rtol=1e-3)
+
+  single_pass_mean, single_pass_std = MeanVarianceNorm(6).compute_mean_std(file_list, 2, 5, num_workers)
+  numpy.testing.assert_array_equal(single_pass_mean, statistics.mean_vector[2:5].reshape(1, 3))
+  numpy.testing.assert_array_equal(single_pass_std, statistics.std()[2:5].reshape(1, 3))
@@ -0,0 +1,404 @@
+"""Tests the label memo, the context table, the worker backends and the frame expansion of HTSLabelNormalisation.
+"""
+
+import glob
+import os
+import sys
+import numpy
+import pytest
+# pylint: disable=g-import-not-at-top
+sys.path.append(os.path.join(os.path.dirname(__file__), '../src'))
+from frontend.label_normalisation import HTSLabelNormalisation
+
+MERLIN_DIR = os.path.join(os.path.dirname(__file__), '..')
+QUESTION_FILE = os.path.join(MERLIN_DIR, 'misc/questions/questions-radio_dnn_416.hed')
+LABEL_FILES = sorted(glob.glob(os.path.join(MERLIN_DIR, 'misc/scripts/frontend/festival_utt_to_lab/test/labels/full/*.lab')))
+
+
+def phone_labels():
+  """The full-context labels of the test utterances, one list per utterance."""
+  utterances = []
+  for label_file in LABEL_FILES:
+    with open(label_file) as fid:
+      utterances.append([line.split()[-1] for line in fid if line.strip()])
+  return utterances
+
+
+def write_labels(label_dir, file_number, label_type='state_align', seed=0):
+  """State- or phone-aligned label files of the test utterances with random durations.
+
+  Args:
+    label_dir: directory of the files
+    file_number: number of files, the utterances being repeated
+    label_type: state_align or phone_align
+    seed: random seed of the durations
+
+  Returns:
+    the file names
+  """
+  rng = numpy.random.RandomState(seed)
+  utterances = phone_labels()
+  os.makedirs(str(label_dir), exist_ok=True)
+  file_list = []
+  for i in range(file_number):
+    lines = []
+    start_time = 0
+    for label in utterances[i % len(utterances)]:
+      state_frames = rng.randint(1, 6, 5)
+      if label_type == 'state_align':
+        for (state, frame_number) in enumerate(state_frames):
+          lines.append('%d %d %s[%d]' % (start_time, start_time + frame_number * 50000, label, state + 2))
+          start_time += frame_number * 50000
+      else:
+        lines.append('%d %d %s' % (start_time, start_time + state_frames.sum() * 50000, label))
+        start_time += state_frames.sum() * 50000
+    file_list.append(os.path.join(str(label_dir), 'utt_%03d.lab' % i))
+    with open(file_list[-1], 'w') as fid:
+      fid.write('\n'.join(lines) + '\n')
+  return file_list
+
+
+def distinct_contexts(file_list):
+  contexts = set()
+  for file_name in file_list:
+    with open(file_name) as fid:
+      contexts.update(line.split()[2][:-3] for line in fid if line.strip())
+  return contexts
+
+
+def read_files(file_list):
+  contents = []
+  for file_name in file_list:
+    with open(file_name, 'rb') as fid:
+      contents.append(fid.read())
+  return contents
+
+
+def test_process_backend_label_cache(tmp_path):
+  """Tests that the memo counters and entries of worker processes reach the parent and its cache file.
+
+  Args:
+    tmp_path: pytest temporary directory
+  """
+  label_file_list = write_labels(tmp_path / 'lab', 12)
+  contexts = distinct_contexts(label_file_list)
+  cache_dir = str(tmp_path / 'cache')
+
+  thread_normaliser = HTSLabelNormalisation(question_file_name=QUESTION_FILE)
+  thread_file_list = [str(tmp_path / ('thread_%d.lab' % i)) for i in range(len(label_file_list))]
+  thread_normaliser.perform_normalisation(label_file_list, thread_file_list, backend='thread', num_workers=1)
+  thread_stats = thread_normaliser.label_cache_stats()
+  assert thread_stats['misses'] == len(contexts)
+
+  process_normaliser = HTSLabelNormalisation(question_file_name=QUESTION_FILE, label_cache_dir=cache_dir)
+  process_file_list = [str(tmp_path / ('process_%d.lab' % i)) for i in range(len(label_file_list))]
+  process_normaliser.perform_normalisation(label_file_list, process_file_list, backend='process', num_workers=3)
+  process_stats = process_normaliser.label_cache_stats()
+  ## each worker matches the contexts it has not seen itself
+  assert process_stats['hits'] + process_stats['misses'] == thread_stats['hits'] + thread_stats['misses']
+  assert len(contexts) <= process_stats['misses'] < 3 * len(contexts)
+  assert process_stats['size'] == len(contexts)
+  assert read_files(process_file_list) == read_files(thread_file_list)
+
+  ## the saved memo answers every label of the next run
+  reloaded_normaliser = HTSLabelNormalisation(question_file_name=QUESTION_FILE, label_cache_dir=cache_dir)
+  assert set(reloaded_normaliser.label_cache) == contexts
+  reloaded_normaliser.perform_normalisation(label_file_list, process_file_list, backend='process', num_workers=3)
+  assert reloaded_normaliser.label_cache_stats()['misses'] == 0
+  assert read_files(process_file_list) == read_files(thread_file_list)
+
+
+@pytest.mark.parametrize('backend', ['thread', 'process'])
+@pytest.mark.parametrize('label_type,subphone_feats', [('state_align', 'full'), ('phone_align', 'minimal_phoneme')])
+def test_context_table(tmp_path, monkeypatch, backend, label_type, subphone_feats):
+  """Tests that label and duration files are the same with and without the context table.
+
+  Args:
+    tmp_path: pytest temporary directory
+    monkeypatch: pytest fixture to set the context chunk size
+    backend: label normalisation backend
+    label_type: state_align or phone_align
+    subphone_feats: frame features of label_type
+  """
+  ## several chunks of contexts for the workers
+  monkeypatch.setattr(HTSLabelNormalisation, 'context_chunk_size', 7)
+  label_file_list = write_labels(tmp_path / 'lab', 8, label_type)
+  outputs = {}
+  for context_table in [False, True]:
+    normaliser = HTSLabelNormalisation(question_file_name=QUESTION_FILE, subphone_feats=subphone_feats, context_table=context_table)
+    lab_file_list = [str(tmp_path / ('%s_%d.lab' % (context_table, i))) for i in range(len(label_file_list))]
+    normaliser.perform_normalisation(label_file_list, lab_file_list, label_type, backend=backend, num_workers=2)
+    dur_file_lists = []
+    for feature_type in ['numerical', 'binary']:
+      dur_file_lists.append([str(tmp_path / ('%s_%s_%d.dur' % (context_table, feature_type, i))) for i in range(len(label_file_list))])
+      normaliser.prepare_dur_data(label_file_list, dur_file_lists[-1], label_type, feature_type)
+    outputs[context_table] = [read_files(file_list) for file_list in [lab_file_list] + dur_file_lists]
+    if context_table:
+      ## every label was answered by the table
+      assert normaliser.label_cache_stats()['contexts'] == len(set(sum(phone_labels(), [])))
+      assert normaliser.label_cache_stats()['misses'] == 0
+
+  assert outputs[True] == outputs[False]
+
+
+def test_label_cache(tmp_path):
+  """Tests the eviction and counters of the label memo, and its file kept per question set.
+
+  Args:
+    tmp_path: pytest temporary directory
+  """
+  labels = sum(phone_labels(), [])[:10]
+  cache_dir = str(tmp_path / 'cache')
+  normaliser = HTSLabelNormalisation(question_file_name=QUESTION_FILE, label_cache_size=4, label_cache_dir=cache_dir)
+  for label in labels[:6]:
+    normaliser.pattern_matching_label(label)
+  ## the least recently used labels are evicted first
+  assert list(normaliser.label_cache) == labels[2:6]
+  normaliser.pattern_matching_label(labels[2])
+  normaliser.pattern_matching_label(labels[6])
+  assert list(normaliser.label_cache) == [labels[4], labels[5], labels[2], labels[6]]
+  assert normaliser.label_cache_stats() == {'hits': 1, 'misses': 7, 'size': 4, 'contexts': 0}
+
+  ## memoised vectors are those of the matcher, shared and read-only
+  label_binary_vector, label_continuous_vector = normaliser.pattern_matching_label(labels[6])
+  binary_vector, continuous_vector = normaliser.question_matcher.match(labels[6])
+  numpy.testing.assert_array_equal(label_binary_vector, binary_vector)
+  numpy.testing.assert_array_equal(label_continuous_vector, continuous_vector)
+  assert not label_binary_vector.flags.writeable
+  assert normaliser.label_cache_stats()['hits'] == 2
+
+  normaliser.save_label_cache()
+  cache_files = os.listdir(cache_dir)
+  assert len(cache_files) == 1
+  reloaded_normaliser = HTSLabelNormalisation(question_file_name=QUESTION_FILE, label_cache_size=4, label_cache_dir=cache_dir)
+  assert list(reloaded_normaliser.label_cache) == list(normaliser.label_cache)
+  for label in normaliser.label_cache:
+    for (vector, reloaded_vector) in zip(normaliser.label_cache[label], reloaded_normaliser.label_cache[label]):
+      numpy.testing.assert_array_equal(reloaded_vector, vector)
+      assert not reloaded_vector.flags.writeable
+  reloaded_normaliser.pattern_matching_label(labels[4])
+  assert reloaded_normaliser.label_cache_stats()['hits'] == 1
+  assert reloaded_normaliser.label_cache_stats()['misses'] == 0
+  ## a smaller cache keeps the most recently used of the saved labels
+  smaller_normaliser = HTSLabelNormalisation(question_file_name=QUESTION_FILE, label_cache_size=2, label_cache_dir=cache_dir)
+  assert list(smaller_normaliser.label_cache) == labels[2:3] + labels[6:7]
+
+  ## another question set has a cache file of its own
+  question_file = str(tmp_path / 'questions.hed')
+  with open(QUESTION_FILE) as fid:
+    questions = fid.read()
+  with open(question_file, 'w') as fid:
+    fid.write(questions + '\nQS "C-Extra"  {*-zz+*}\n')
+  other_normaliser = HTSLabelNormalisation(question_file_name=question_file, label_cache_size=4, label_cache_dir=cache_dir)
+  assert len(other_normaliser.label_cache) == 0
+  other_normaliser.pattern_matching_label(labels[0])
+  other_normaliser.save_label_cache()
+  assert len(os.listdir(cache_dir)) == 2
+  assert other_normaliser.label_cache_file != normaliser.label_cache_file
+
+
+def write_alignments(label_dir, label_type, seed=0):
+  """State- or phone-aligned label files of three test utterances, whose states may have no frames."""
+  rng = numpy.random.RandomState(seed)
+  os.makedirs(str(label_dir), exist_ok=True)
+  file_list = []
+  for (i, utterance) in enumerate(phone_labels()[:3]):
+    lines = []
+    start_time = 0
+    for label in utterance:
+      state_frames = rng.randint(0, 5, 5)
+      state_frames[rng.randint(5)] += 1
+      if label_type == 'state_align':
+        for (state, frame_number) in enumerate(state_frames):
+          lines.append('%d %d %s[%d]' % (start_time, start_time + frame_number * 50000, label, state + 2))
+          start_time += frame_number * 50000
+      else:
+        lines.append('%d %d %s' % (start_time, start_time + state_frames.sum() * 50000, label))
+        start_time += state_frames.sum() * 50000
+    file_list.append(os.path.join(str(label_dir), 'utt_%d.lab' % i))
+    with open(file_list[-1], 'w') as fid:
+      fid.write('\n'.join(lines) + '\n')
+  return file_list
+
+
+def reference_coarse_coding(normaliser, phone_duration):
+  """The coarse coding features of a phone, frame by frame as extract_coarse_coding_features_relative did."""
+  dur = int(phone_duration)
+  cc_feat_matrix = numpy.zeros((dur, 3))
+  for i in range(dur):
+    rel_indx = int((200/float(dur))*i)
+    cc_feat_matrix[i, 0] = normaliser.cc_features[0, 300+rel_indx]
+    cc_feat_matrix[i, 1] = normaliser.cc_features[1, 200+rel_indx]
+    cc_feat_matrix[i, 2] = normaliser.cc_features[2, 100+rel_indx]
+  return cc_feat_matrix
+
+
+def reference_label_vector(normaliser, full_label):
+  return numpy.concatenate([normaliser.pattern_matching_binary(full_label),
+                            normaliser.pattern_matching_continous_position(full_label)], axis=1)
+
+
+def reference_state_alignment(normaliser, file_name):
+  """The frames of a state-aligned file as the per-frame loop of load_labels_with_state_alignment made them."""
+  dict_size = normaliser.dict_size
+  with open(file_name) as fid:
+    utt_labels = [line.strip() for line in fid if line.strip()]
+  blocks = []
+  for (current_index, line) in enumerate(utt_labels):
+    (start_time, end_time, full_label) = line.split()
+    frame_number = int(int(end_time)/50000) - int(int(start_time)/50000)
+    state_index = int(full_label[-2]) - 1
+    state_index_backward = 6 - state_index
+    full_label = full_label[:-3]
+    if state_index == 1:
+      current_frame_number = 0
+      phone_duration = frame_number
+      state_duration_base = 0
+      label_vector = reference_label_vector(normaliser, full_label)
+      for i in range(4):
+        temp_list = utt_labels[current_index + i + 1].split()
+        phone_duration += int((int(temp_list[1]) - int(temp_list[0]))/50000)
+      if normaliser.subphone_feats == 'coarse_coding':
+        cc_feat_matrix = reference_coarse_coding(normaliser, phone_duration)
+
+    block = numpy.zeros((frame_number, dict_size + normaliser.frame_feature_size))
+    for i in range(frame_number):
+      block[i, 0:dict_size] = label_vector
+      if normaliser.subphone_feats == 'full':
+        block[i, dict_size] = float(i+1) / float(frame_number)
+        block[i, dict_size+1] = float(frame_number - i) / float(frame_number)
+        block[i, dict_size+2] = float(frame_number)
+        block[i, dict_size+3] = float(state_index)
+        block[i, dict_size+4] = float(state_index_backward)
+        block[i, dict_size+5] = float(phone_duration)
+        block[i, dict_size+6] = float(frame_number) / float(phone_duration)
+        block[i, dict_size+7] = float(phone_duration - i - state_duration_base) / float(phone_duration)
+        block[i, dict_size+8] = float(state_duration_base + i + 1) / float(phone_duration)
+      elif normaliser.subphone_feats == 'state_only':
+        block[i, dict_size] = float(state_index)
+      elif normaliser.subphone_feats == 'frame_only':
+        current_frame_number += 1
+        block[i, dict_size] = float(current_frame_number) / float(phone_duration)
+      elif normaliser.subphone_feats == 'uniform_state':
+        current_frame_number += 1
+        block[i, dict_size] = float(current_frame_number) / float(phone_duration)
+        block[i, dict_size+1] = float(max(1, round(float(current_frame_number)/float(phone_duration)*5)))
+      elif normaliser.subphone_feats == 'coarse_coding':
+        block[i, dict_size:dict_size+3] = cc_feat_matrix[current_frame_number]
+        block[i, dict_size+3] = float(phone_duration)
+        current_frame_number += 1
+      elif normaliser.subphone_feats == 'minimal_frame':
+        block[i, dict_size] = float(i+1) / float(frame_number)
+        block[i, dict_size+1] = float(state_index)
+      elif normaliser.subphone_feats != 'none':
+        sys.exit('unknown subphone_feats type')
+    blocks.append(block)
+    state_duration_base += frame_number
+  return numpy.concatenate(blocks, axis=0)
+
+
+def reference_phone_alignment(normaliser, file_name):
+  """The frames of a phone-aligned file as the per-frame loop of load_labels_with_phone_alignment made them."""
+  dict_size = normaliser.dict_size
+  blocks = []
+  with open(file_name) as fid:
+    for line in fid:
+      if not line.strip():
+        continue
+      (start_time, end_time, full_label) = line.split()
+      frame_number = int(int(end_time)/50000) - int(int(start_time)/50000)
+      if normaliser.subphone_feats == 'coarse_coding':
+        cc_feat_matrix = reference_coarse_coding(normaliser, frame_number)
+      label_vector = reference_label_vector(normaliser, full_label)
+      block = numpy.zeros((frame_number, dict_size + normaliser.frame_feature_size))
+      for i in range(frame_number):
+        block[i, 0:dict_size] = label_vector
+        if normaliser.subphone_feats == 'minimal_phoneme':
+          block[i, dict_size] = float(i+1)/float(frame_number)
+          block[i, dict_size+1] = float(frame_number - i)/float(frame_number)
+          block[i, dict_size+2] = float(frame_number)
+        elif normaliser.subphone_feats == 'coarse_coding':
+          block[i, dict_size:dict_size+3] = cc_feat_matrix[i]
+          block[i, dict_size+3] = float(frame_number)
+        elif normaliser.subphone_feats != 'none':
+          sys.exit('unknown subphone_feats type')
+      blocks.append(block)
+  return numpy.concatenate(blocks, axis=0)
+
+
+def reference_durational_features(normaliser, dur_data):
+  """The frame features of durations as the per-frame loop of extract_durational_features made them."""
+  duration_feature_array = numpy.zeros((int(sum(dur_data.ravel())), normaliser.frame_feature_size))
+  frame_index = 0
+  for i in range(len(dur_data)):
+    if normaliser.subphone_feats == 'coarse_coding':
+      frame_number = int(dur_data[i, 0])
+      cc_feat_matrix = reference_coarse_coding(normaliser, frame_number)
+      for j in range(frame_number):
+        duration_feature_array[frame_index, 0:3] = cc_feat_matrix[j]
+        duration_feature_array[frame_index, 3] = float(frame_number)
+        frame_index += 1
+    elif normaliser.subphone_feats == 'full':
+      phone_duration = sum(dur_data[i, :])
+      state_duration_base = 0
+      for state_index in range(1, 6):
+        frame_number = int(dur_data[i][state_index-1])
+        for j in range(frame_number):
+          duration_feature_array[frame_index] = [float(j+1) / float(frame_number), float(frame_number - j) / float(frame_number),
+                                                 float(frame_number), float(state_index), float(6 - state_index), float(phone_duration),
+                                                 float(frame_number) / float(phone_duration),
+                                                 float(phone_duration - j - state_duration_base) / float(phone_duration),
+                                                 float(state_duration_base + j + 1) / float(phone_duration)]
+          frame_index += 1
+        state_duration_base += frame_number
+  return duration_feature_array
+
+
+SUBPHONE_FEATS = ['full', 'minimal_frame', 'state_only', 'frame_only', 'uniform_state', 'minimal_phoneme', 'coarse_coding', 'none']
+
+
+def test_segment_frame_positions():
+  normaliser = HTSLabelNormalisation(question_file_name=QUESTION_FILE)
+  (segment_index, frame_position) = normaliser.segment_frame_positions([2, 0, 3, 1])
+  assert segment_index.tolist() == [0, 0, 2, 2, 2, 3]
+  assert frame_position.tolist() == [0, 1, 0, 1, 2, 0]
+  (segment_index, frame_position) = normaliser.segment_frame_positions([])
+  assert len(segment_index) == len(frame_position) == 0
+
+
+@pytest.mark.parametrize('label_type', ['state_align', 'phone_align'])
+@pytest.mark.parametrize('subphone_feats', SUBPHONE_FEATS)
+def test_frame_feature_expansion(tmp_path, label_type, subphone_feats):
+  """Tests that the frames expanded for a whole utterance at once are those of the per-frame loops, bit for bit.
+
+  Args:
+    tmp_path: pytest temporary directory
+    label_type: state_align or phone_align
+    subphone_feats: frame features
+  """
+  normaliser = HTSLabelNormalisation(question_file_name=QUESTION_FILE, subphone_feats=subphone_feats)
+  for file_name in write_alignments(tmp_path, label_type):
+    if label_type == 'state_align':
+      (reference, load_labels) = (reference_state_alignment, normaliser.load_labels_with_state_alignment)
+    else:
+      (reference, load_labels) = (reference_phone_alignment, lambda file_name: normaliser.load_labels_with_phone_alignment(file_name, None))
+    try:
+      expected = reference(normaliser, file_name)
+    except SystemExit:
+      ## modes of the other alignment stop the loop, and the expansion too
+      with pytest.raises(SystemExit):
+        load_labels(file_name)
+      continue
+    label_feature_matrix = load_labels(file_name)
+    assert label_feature_matrix.dtype == expected.dtype
+    numpy.testing.assert_array_equal(label_feature_matrix, expected)
+
+  ## the frame features of predicted durations, five states or one phone per row
+  rng = numpy.random.RandomState(1)
+  if subphone_feats == 'coarse_coding':
+    dur_data = rng.randint(1, 30, (20, 1)).astype(numpy.float32)
+  else:
+    dur_data = rng.randint(0, 6, (20, 5)).astype(numpy.float32)
+    dur_data[:, 2] += 1
+  numpy.testing.assert_array_equal(normaliser.extract_durational_features(dur_data=dur_data),
+                                   reference_durational_features(normaliser, dur_data))
@@ -0,0 +1,82 @@
+"""Tests the banded MLPG solver against the dense reference implementation.
+"""
+
+import os
+import sys
+import numpy as np
+# pylint: disable=g-import-not-at-top
+sys.path.append(os.path.join(os.path.dirname(__file__), '../src'))
+from frontend.mlpg_banded import MLParameterGeneration as BandedMLPG
+from frontend.mlpg_fast import MLParameterGeneration as DenseMLPG
+from frontend.mlpg_fast2 import StreamingMLParameterGeneration
+
+
+def random_stream(rng, frame_number, static_dimension, tied_variance):
+  """Means and variances of a stream, with one variance vector tiled over time if tied_variance."""
+  features = rng.randn(frame_number, static_dimension * 3)
+  if tied_variance:
+    covariance = np.tile(rng.uniform(0.01, 1.0, static_dimension * 3), (frame_number, 1))
+  else:
+    covariance = rng.uniform(0.01, 1.0, (frame_number, static_dimension * 3))
+  return features, covariance
+
+
+def test_banded_matches_dense():
+  """Tests the banded solver with time-varying variances."""
+  rng = np.random.RandomState(1234)
+  for frame_number in [1, 2, 3, 7, 50, 203]:
+    features, covariance = random_stream(rng, frame_number, 4, False)
+    np.testing.assert_allclose(BandedMLPG().generation(features, covariance, 4),
+                               DenseMLPG().generation(features, covariance, 4), rtol=1e-8, atol=1e-8)
+
+
+def test_cached_factors_match_dense():
+  """Tests reusing the factor of a tied variance over utterances of different lengths."""
+  rng = np.random.RandomState(1234)
+  banded = BandedMLPG(cache_factors=True)
+  features, covariance = random_stream(rng, 300, 5, True)
+  ## the longest utterance first, so that later ones take a truncated factor
+  for frame_number in [300, 120, 300, 4, 3, 299, 301]:
+    if frame_number > features.shape[0]:
+      features, covariance = random_stream(rng, frame_number, 5, True)
+    utt_features = features[:frame_number] + rng.randn(frame_number, 15)
+    utt_covariance = covariance[:frame_number]
+    np.testing.assert_allclose(banded.generation(utt_features, utt_covariance, 5),
+                               DenseMLPG().generation(utt_features, utt_covariance, 5), rtol=1e-8, atol=1e-8)
+  assert len(banded.factor_cache) == 2
+
+
+def test_streaming_with_full_look_ahead():
+  """Tests that the streaming generator gives the full solution when it sees the whole utterance."""
+  rng = np.random.RandomState(1234)
+  features, covariance = random_stream(rng, 90, 3, True)
+  streaming = StreamingMLParameterGeneration(BandedMLPG(), look_ahead=90, look_back=90)
+  np.testing.assert_allclose(streaming.generation(features, covariance, 3, chunk_size=20),
+                             DenseMLPG().generation(features, covariance, 3), rtol=1e-8, atol=1e-8)
+
+
+def test_streaming_with_bounded_look_ahead():
+  """Tests that a look-ahead of some tens of frames stays close to the full solution for any chunk size."""
+  rng = np.random.RandomState(1234)
+  ## bounds on the max abs error by look-ahead, with tied and with time-varying variances: a tied
+  ## variance far smaller on the statics than on the dynamics couples frames further apart
+  max_errors = {True: {20: 2e-2, 30: 1e-3}, False: {20: 1e-5, 30: 1e-7}}
+  for tied_variance in [True, False]:
+    features, covariance = random_stream(rng, 250, 4, tied_variance)
+    for chunk_size in [1, 7, 20, 64]:
+      errors = []
+      for look_ahead in [20, 30]:
+        streaming = StreamingMLParameterGeneration(BandedMLPG(), look_ahead=look_ahead, look_back=look_ahead)
+        deviation = streaming.deviation_from_full(features, covariance, 4, chunk_size=chunk_size)
+        assert sorted(deviation) == ['max_abs_error', 'max_abs_error_per_dim', 'rms_error']
+        assert isinstance(deviation['max_abs_error'], float)
+        assert isinstance(deviation['rms_error'], float)
+        assert deviation['max_abs_error_per_dim'].shape == (4,)
+        assert deviation['max_abs_error'] == deviation['max_abs_error_per_dim'].max()
+        assert deviation['rms_error'] <= deviation['max_abs_error'] < max_errors[tied_variance][look_ahead]
+        errors.append(deviation['max_abs_error'])
+      assert errors[1] < errors[0]
+
+  ## a short look-ahead is not enough
+  streaming = StreamingMLParameterGeneration(BandedMLPG(), look_ahead=2, look_back=2)
+  assert streaming.deviation_from_full(features, covariance, 4, chunk_size=1)['max_abs_error'] > 1e-3
@@ -0,0 +1,124 @@
+"""Tests the normalisation kernels against the MVN and min-max formulas they replace.
+"""
+
+import os
+import sys
+import numpy
+import pytest
+# pylint: disable=g-import-not-at-top
+sys.path.append(os.path.join(os.path.dirname(__file__), '../src'))
+from io_funcs.binary_io import BinaryIOCollection
+from frontend.mean_variance_norm import MeanVarianceNorm
+from frontend.min_max_norm import MinMaxNormalisation
+from frontend.normalisation_kernels import AffineKernel
+
+
+def write_features(tmp_path, dimension=7, seed=0):
+  """Feature files with a constant dimension, and the frames they hold."""
+  io_funcs = BinaryIOCollection()
+  rng = numpy.random.RandomState(seed)
+  file_list = []
+  blocks = []
+  for i in range(5):
+    block = (rng.randn(rng.randint(10, 80), dimension) * 3.0 + 10.0).astype(numpy.float32)
+    block[:, 3] = 2.5
+    blocks.append(block)
+    file_list.append(str(tmp_path / ('%d.cmp' % i)))
+    io_funcs.array_to_binary_file(block, file_list[-1])
+  return file_list, blocks
+
+
+def load_files(file_list, dimension=7):
+  io_funcs = BinaryIOCollection()
+  return [io_funcs.load_binary_file(file_name, dimension) for file_name in file_list]
+
+
+def test_affine_kernel():
+  """Tests a kernel in and out of place, with excluded columns."""
+  rng = numpy.random.RandomState(0)
+  features = rng.randn(20, 4).astype(numpy.float32)
+  centre, scale, offset = rng.randn(4), rng.rand(4) + 0.5, rng.randn(4)
+  kernel = AffineKernel(centre, scale, offset, exclude_columns=[2])
+
+  expected = (features.astype(numpy.float64) - centre) * scale + offset
+  expected[:, 2] = features[:, 2]
+  result = kernel.apply(features)
+  assert result.dtype == numpy.float32
+  assert not numpy.shares_memory(result, features)
+  numpy.testing.assert_allclose(result, expected, rtol=1e-5, atol=1e-5)
+
+  in_place = kernel.apply(features, in_place=True)
+  assert numpy.shares_memory(in_place, features)
+  numpy.testing.assert_array_equal(in_place, result)
+
+  ## float64 input is converted, never modified
+  features64 = rng.randn(5, 4)
+  copy64 = features64.copy()
+  kernel.apply(features64, in_place=True)
+  numpy.testing.assert_array_equal(features64, copy64)
+
+
+@pytest.mark.parametrize('num_workers', [1, 2])
+def test_mean_variance_norm(tmp_path, num_workers):
+  """Tests MVN and denormalisation against (features - mean) / std and back.
+
+  Args:
+    tmp_path: pytest temporary directory
+    num_workers: worker processes
+  """
+  file_list, blocks = write_features(tmp_path)
+  ## keep the constant dimension out of the division
+  blocks = [block[:, [0, 1, 2, 4, 5, 6]] for block in blocks]
+  io_funcs = BinaryIOCollection()
+  for (file_name, block) in zip(file_list, blocks):
+    io_funcs.array_to_binary_file(block, file_name)
+  norm_list = [file_name + '.norm' for file_name in file_list]
+  denorm_list = [file_name + '.denorm' for file_name in file_list]
+
+  normaliser = MeanVarianceNorm(6)
+  mean_vector, std_vector = normaliser.feature_normalisation(file_list, norm_list, num_workers=num_workers)
+  frames = numpy.concatenate(blocks).astype(numpy.float64)
+  numpy.testing.assert_allclose(mean_vector[0], frames.mean(axis=0), rtol=1e-9)
+  numpy.testing.assert_allclose(std_vector[0], frames.std(axis=0), rtol=1e-7)
+
+  for (norm_features, block) in zip(load_files(norm_list, 6), blocks):
+    numpy.testing.assert_allclose(norm_features, (block - mean_vector) / std_vector, rtol=1e-5, atol=1e-5)
+
+  normaliser.feature_denormalisation(norm_list, denorm_list, mean_vector, std_vector, num_workers=num_workers)
+  for (norm_features, denorm_features) in zip(load_files(norm_list, 6), load_files(denorm_list, 6)):
+    numpy.testing.assert_allclose(denorm_features, norm_features * std_vector + mean_vector, rtol=1e-5, atol=1e-5)
+
+
+@pytest.mark.parametrize('num_workers', [1, 2])
+def test_min_max_normalisation(tmp_path, num_workers):
+  """Tests min-max (de)normalisation against the tiled formulas it replaced.
+
+  Args:
+    tmp_path: pytest temporary directory
+    num_workers: worker processes
+  """
+  file_list, blocks = write_features(tmp_path)
+  norm_list = [file_name + '.norm' for file_name in file_list]
+  denorm_list = [file_name + '.denorm' for file_name in file_list]
+
+  normaliser = MinMaxNormalisation(7, min_value=0.01, max_value=0.99, exclude_columns=[6])
+  normaliser.find_min_max_values(file_list, num_workers=num_workers)
+  frames = numpy.concatenate(blocks)
+  numpy.testing.assert_array_equal(normaliser.min_vector, frames.min(axis=0).reshape(1, 7))
+  numpy.testing.assert_array_equal(normaliser.max_vector, frames.max(axis=0).reshape(1, 7))
+
+  fea_max_min_diff = normaliser.max_vector - normaliser.min_vector
+  target_max_min_diff = numpy.full((1, 7), 0.99 - 0.01)
+  target_max_min_diff[fea_max_min_diff <= 0.0] = 1.0
+  fea_max_min_diff[fea_max_min_diff <= 0.0] = 1.0
+
+  normaliser.normalise_data(file_list, norm_list, num_workers=num_workers)
+  for (norm_features, block) in zip(load_files(norm_list), blocks):
+    expected = target_max_min_diff / fea_max_min_diff * (block - normaliser.min_vector) + 0.01
+    expected[:, 6] = block[:, 6]
+    numpy.testing.assert_allclose(norm_features, expected, rtol=1e-5, atol=1e-6)
+
+  normaliser.denormalise_data(norm_list, denorm_list, num_workers=num_workers)
+  for (denorm_features, norm_features) in zip(load_files(denorm_list), load_files(norm_list)):
+    expected = fea_max_min_diff / target_max_min_diff * (norm_features - 0.01) + normaliser.min_vector
+    numpy.testing.assert_allclose(denorm_features, expected, rtol=1e-5, atol=1e-5)
@@ -0,0 +1,33 @@
+"""Tests PrefetchReader.
+"""
+
+import os
+import sys
+import threading
+import time
+# pylint: disable=g-import-not-at-top
+sys.path.append(os.path.join(os.path.dirname(__file__), '../src'))
+from io_funcs.prefetch_reader import PrefetchReader
+
+
+def test_prefetch_reader_queue_depth():
+  """Tests that items come in order with at most queue_depth of them loaded at a time."""
+  lock = threading.Lock()
+  state = {'held': 0, 'most_held': 0}
+
+  def load(item):
+    with lock:
+      state['held'] += 1
+      state['most_held'] = max(state['most_held'], state['held'])
+    time.sleep(0.002)
+    return item
+
+  items = []
+  for item in PrefetchReader(list(range(30)), load, queue_depth=3):
+    items.append(item)
+    time.sleep(0.005)
+    with lock:
+      state['held'] -= 1
+
+  assert items == list(range(30))
+  assert state['most_held'] == 3
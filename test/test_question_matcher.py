@@ -0,0 +1,91 @@
+"""Tests HTSQuestionMatcher against the regular expression question matching.
+"""
+
+import glob
+import os
+import re
+import sys
+import numpy
+import pytest
+# pylint: disable=g-import-not-at-top
+sys.path.append(os.path.join(os.path.dirname(__file__), '../src'))
+from frontend.label_normalisation import HTSLabelNormalisation
+
+MERLIN_DIR = os.path.join(os.path.dirname(__file__), '..')
+QUESTION_FILES = sorted(glob.glob(os.path.join(MERLIN_DIR, 'misc/questions/*.hed')))
+LABEL_FILES = sorted(glob.glob(os.path.join(MERLIN_DIR, 'misc/scripts/frontend/festival_utt_to_lab/test/labels/full/*.lab')))
+
+## questions whose alternatives the matcher answers with its regular expressions
+FALLBACK_QUESTIONS = '''QS "C-a_inner"  {*-a*x+*,*^p?u-*}
+QS "LL-Vowel"  {a^*,x^*}
+QS "C-Phone_end"  {*=l,*=x}
+QS "R-Phone_repeat"  {*+m+*,*/A:1_1*}
+CQS "Pos_C-Syl_in_C-Word(Fw)"  {@(\\d+)_}
+CQS "Pos_Float"  {/K:([\\d\\.]+)/}
+CQS "Pos_Float_end"  {/K:([\\d\\.]+)}
+CQS "Num-Frames"  {-(\\d+)}
+CQS "Inner"  {*_(\\d+)/A:}
+'''
+
+
+def question_values(question_file):
+  """The alphanumeric values the questions of a file look for."""
+  with open(question_file) as fid:
+    return sorted(set(re.findall(r'[0-9A-Za-z]+', fid.read())))
+
+
+def mutated_labels(labels, values, number, seed):
+  """Labels with random fields replaced by question values and numbers."""
+  rng = numpy.random.RandomState(seed)
+  values = values + ['x', '0', '1', '10', '12', '1.5', '0.25', '.5', '3.']
+  mutated = []
+  for _ in range(number):
+    parts = re.split(r'([0-9A-Za-z\.]+)', labels[rng.randint(len(labels))])
+    for i in range(1, len(parts), 2):
+      if rng.rand() < 0.3:
+        parts[i] = values[rng.randint(len(values))]
+    mutated.append(''.join(parts))
+  return mutated
+
+
+def full_context_labels():
+  labels = []
+  for label_file in LABEL_FILES:
+    with open(label_file) as fid:
+      labels.extend(line.split()[-1] for line in fid if line.strip())
+  return labels
+
+
+def check_matcher(label_normaliser, labels):
+  for label in labels:
+    binary_vector, continuous_vector = label_normaliser.question_matcher.match(label)
+    numpy.testing.assert_array_equal(binary_vector, label_normaliser.pattern_matching_binary(label), err_msg=label)
+    numpy.testing.assert_array_equal(continuous_vector, label_normaliser.pattern_matching_continous_position(label), err_msg=label)
+
+
+@pytest.mark.parametrize('question_file', QUESTION_FILES, ids=os.path.basename)
+def test_question_matcher(question_file):
+  """Tests the question sets of misc/questions on real and mutated labels.
+
+  Args:
+    question_file: HTS question set
+  """
+  label_normaliser = HTSLabelNormalisation(question_file_name=question_file)
+  labels = full_context_labels()
+  check_matcher(label_normaliser, labels + mutated_labels(labels, question_values(question_file), 2000, 1234))
+
+
+def test_question_matcher_fallback(tmp_path):
+  """Tests questions that keep their regular expressions next to field lookups.
+
+  Args:
+    tmp_path: pytest temporary directory
+  """
+  question_file = str(tmp_path / 'questions.hed')
+  with open(question_file, 'w') as fid:
+    fid.write(FALLBACK_QUESTIONS)
+  label_normaliser = HTSLabelNormalisation(question_file_name=question_file)
+  labels = full_context_labels()
+  labels += [label + '/K:1.5' for label in labels[:20]] + [label + '/K:12/' for label in labels[20:40]]
+  labels += [label + '=l' for label in labels[40:60]]
+  check_matcher(label_normaliser, labels + mutated_labels(labels, question_values(question_file), 2000, 4321))
@@ -0,0 +1,209 @@
+"""Tests silence removal and trimming.
+"""
+
+import os
+import sys
+import numpy
+# pylint: disable=g-import-not-at-top
+sys.path.append(os.path.join(os.path.dirname(__file__), '../src'))
+from io_funcs.binary_io import BinaryIOCollection
+from io_funcs.feature_archive import archive_member_path
+from frontend.silence_remover import SilenceRangeCache, SilenceRemover, trim_silence, trim_silence_streams
+
+
+def make_labels(frame_number, silence_frames, dimension=3):
+  """Binary labels whose first dimension flags the given frames as silence."""
+  labels = numpy.random.RandomState(frame_number).rand(frame_number, dimension).astype(numpy.float32)
+  labels[:, 0] = 0.0
+  labels[silence_frames, 0] = 1.0
+  return labels
+
+
+def test_trim_silence_archived_labels(tmp_path):
+  """Tests trimming with binary labels kept in a feature archive.
+
+  Args:
+    tmp_path: pytest temporary directory
+  """
+  io_funcs = BinaryIOCollection()
+  label_archive = str(tmp_path / 'binary_label.pack')
+
+  in_list = []
+  label_list = []
+  expected = []
+  for (utt, frame_number) in [('u1', 20), ('u2', 15)]:
+    silence_frames = list(range(3)) + list(range(frame_number - 4, frame_number))
+    labels = make_labels(frame_number, silence_frames)
+    label_file = archive_member_path(label_archive, utt + '.lab')
+    io_funcs.array_to_binary_file(labels, label_file)
+    label_list.append(label_file)
+
+    data = numpy.arange(frame_number * 2, dtype=numpy.float32).reshape(-1, 2)
+    in_file = str(tmp_path / (utt + '.mgc'))
+    io_funcs.array_to_binary_file(data, in_file)
+    in_list.append(in_file)
+    expected.append(data[3:frame_number - 4])
+
+  out_list = [str(tmp_path / (utt + '.trim.mgc')) for utt in ['u1', 'u2']]
+  trim_silence(in_list, out_list, 2, label_list, 3, 0)
+  for (out_file, expected_data) in zip(out_list, expected):
+    numpy.testing.assert_array_equal(io_funcs.load_binary_file(out_file, 2), expected_data)
+
+  ## a second pass takes the ranges from the cache
+  trimmed_data_dict = trim_silence_streams({'mgc': in_list}, {'mgc': 2}, label_list, 3, 0)
+  for (trimmed_data, expected_data) in zip(trimmed_data_dict['mgc'], expected):
+    numpy.testing.assert_array_equal(trimmed_data, expected_data)
+
+  ## labels written again to the archive are not taken from the cache
+  labels = make_labels(20, [0, 19])
+  io_funcs.array_to_binary_file(labels, label_list[0])
+  trimmed_data_dict = trim_silence_streams({'mgc': in_list[:1]}, {'mgc': 2}, label_list[:1], 3, 0)
+  numpy.testing.assert_array_equal(trimmed_data_dict['mgc'][0], io_funcs.load_binary_file(in_list[0], 2)[1:19])
+
+
+def write_state_alignment(file_name, phone_frames):
+  """An HTS state alignment with five states of the given lengths per phone."""
+  lines = []
+  start_time = 0
+  for (full_label, state_frames) in phone_frames:
+    for (state_index, frame_number) in enumerate(state_frames):
+      end_time = start_time + frame_number * 50000
+      lines.append('%d %d %s[%d]' % (start_time, end_time, full_label, state_index + 2))
+      start_time = end_time
+  with open(file_name, 'w') as fid:
+    fid.write('\n'.join(lines) + '\n')
+
+
+def test_remove_silence_state_align_with_durations(tmp_path):
+  """Tests that state alignments are used even when durations are given.
+
+  Args:
+    tmp_path: pytest temporary directory
+  """
+  io_funcs = BinaryIOCollection()
+  align_file = str(tmp_path / 'u1.lab')
+  write_state_alignment(align_file, [('x^x-#+a=b', [1, 2, 1, 1, 2]),
+                                     ('x^#-a+b=#', [2, 2, 1, 3, 1]),
+                                     ('#^a-b+#=x', [1, 1, 1, 1, 1]),
+                                     ('a^b-#+x=x', [2, 1, 1, 1, 1])])
+  frame_number = 7 + 9 + 5 + 6
+  data = numpy.arange(frame_number * 2, dtype=numpy.float32).reshape(-1, 2)
+  in_file = str(tmp_path / 'u1.cmp')
+  out_file = str(tmp_path / 'u1.trim.cmp')
+  io_funcs.array_to_binary_file(data, in_file)
+  ## durations that do not match the alignment, which state_align ignores
+  dur_file = str(tmp_path / 'u1.dur')
+  io_funcs.array_to_binary_file(numpy.ones((4, 1), dtype=numpy.float32), dur_file)
+
+  remover = SilenceRemover(n_cmp=2, silence_pattern=['*-#+*'], label_type='state_align')
+  remover.remove_silence([in_file], [align_file], [out_file], [dur_file])
+
+  numpy.testing.assert_array_equal(io_funcs.load_binary_file(out_file, 2), data[7:21])
+  numpy.testing.assert_array_equal(io_funcs.load_binary_file(out_file, 2), data[remover.load_alignment(align_file)])
+
+
+def test_trim_silence_keeps_file_format(tmp_path, monkeypatch):
+  """Tests that trimming in place keeps headers, and header=False drops them.
+
+  Args:
+    tmp_path: pytest temporary directory
+    monkeypatch: pytest fixture to set the feature_headers setting
+  """
+  monkeypatch.setattr(BinaryIOCollection, 'feature_headers', True)
+  io_funcs = BinaryIOCollection()
+  stream_layout = [('mgc', 3), ('vuv', 1)]
+
+  label_file = str(tmp_path / 'u1.lab')
+  io_funcs.array_to_binary_file(make_labels(12, [0, 1, 11]), label_file, header=False)
+  data = numpy.arange(12 * 4, dtype=numpy.float32).reshape(-1, 4)
+  cmp_file = str(tmp_path / 'u1.cmp')
+  io_funcs.array_to_binary_file(data, cmp_file, stream_layout=stream_layout)
+
+  ref_file = str(tmp_path / 'u1.ref.cmp')
+  trim_silence([cmp_file], [ref_file], 4, [label_file], 3, 0, header=False)
+  trim_silence([cmp_file], [cmp_file], 4, [label_file], 3, 0)
+
+  assert io_funcs.feature_stream_layout(cmp_file) == stream_layout
+  numpy.testing.assert_array_equal(io_funcs.load_binary_file(cmp_file, 4), data[2:11])
+  assert io_funcs.feature_stream_layout(ref_file) is None
+  numpy.testing.assert_array_equal(numpy.fromfile(ref_file, dtype=numpy.float32).reshape(-1, 4), data[2:11])
+
+
+def test_silence_range_cache(tmp_path, monkeypatch):
+  """Tests that alignments are parsed once per file and settings, and kept in cache_dir.
+
+  Args:
+    tmp_path: pytest temporary directory
+    monkeypatch: pytest fixture to start from an empty cache
+  """
+  monkeypatch.setattr(SilenceRangeCache, 'entries', {})
+  monkeypatch.setattr(SilenceRangeCache, 'loaded_dir', None)
+  monkeypatch.setattr(SilenceRangeCache, 'modified', False)
+  monkeypatch.setattr(SilenceRangeCache, 'cache_dir', str(tmp_path / 'cache'))
+  align_file = str(tmp_path / 'u1.lab')
+  write_state_alignment(align_file, [('x^x-#+a=b', [1, 1, 1, 1, 1]), ('x^#-a+b=#', [2, 2, 1, 3, 1]), ('#^a-b+#=x', [1, 1, 1, 1, 1])])
+
+  parsed_files = []
+  def counting_remover(**kwargs):
+    remover = SilenceRemover(n_cmp=2, label_type='state_align', **kwargs)
+    load_alignment = remover.load_alignment
+    remover.load_alignment = lambda *args: parsed_files.append(args[0]) or load_alignment(*args)
+    return remover
+
+  remover = counting_remover()
+  assert remover.alignment_ranges(align_file).tolist() == [[5, 19]]
+  assert remover.alignment_ranges(align_file).tolist() == [[5, 19]]
+  assert counting_remover().alignment_ranges(align_file).tolist() == [[5, 19]]
+  assert len(parsed_files) == 1
+
+  ## other settings of what is silence are another entry
+  assert counting_remover(silence_pattern=['*-b+*']).alignment_ranges(align_file).tolist() == [[0, 14]]
+  assert len(parsed_files) == 2
+  assert len(SilenceRangeCache.entries) == 2
+
+  ## a rewritten file is parsed again
+  write_state_alignment(align_file, [('x^x-#+a=b', [1, 1, 1, 1, 1]), ('x^#-a+b=#', [2, 2, 1, 3, 1]), ('#^a-#+#=x', [1, 1, 1, 1, 2])])
+  assert remover.alignment_ranges(align_file).tolist() == [[5, 14]]
+  assert len(parsed_files) == 3
+
+  ## saved to cache_dir and loaded from there by a new process
+  SilenceRangeCache.save()
+  assert os.path.isfile(str(tmp_path / 'cache' / 'silence_ranges.pkl'))
+  monkeypatch.setattr(SilenceRangeCache, 'entries', {})
+  monkeypatch.setattr(SilenceRangeCache, 'loaded_dir', None)
+  assert counting_remover().alignment_ranges(align_file).tolist() == [[5, 14]]
+  ## the saved entry of this pattern is of the file before it was rewritten
+  assert counting_remover(silence_pattern=['*-b+*']).alignment_ranges(align_file).tolist() == [[0, 20]]
+  assert len(parsed_files) == 4
+
+
+def test_remove_silence_streams_in_memory(tmp_path):
+  """Tests that streams trimmed in memory are those written by remove_silence.
+
+  Args:
+    tmp_path: pytest temporary directory
+  """
+  io_funcs = BinaryIOCollection()
+  rng = numpy.random.RandomState(0)
+  align_list = []
+  in_data_list_dict = {'mgc': [], 'lf0': []}
+  dimension_dict = {'mgc': 3, 'lf0': 1}
+  for utt in ['u1', 'u2', 'u3']:
+    phone_frames = [('x^x-#+a=b', rng.randint(1, 4, 5)), ('x^#-a+b=#', rng.randint(1, 4, 5)), ('#^a-b+#=x', rng.randint(1, 4, 5)),
+                    ('a^b-#+x=x', rng.randint(1, 4, 5))]
+    align_list.append(str(tmp_path / (utt + '.lab')))
+    write_state_alignment(align_list[-1], phone_frames)
+    frame_number = sum(state_frames.sum() for (_, state_frames) in phone_frames)
+    for feature_name in dimension_dict:
+      in_data_list_dict[feature_name].append(str(tmp_path / ('%s.%s' % (utt, feature_name))))
+      io_funcs.array_to_binary_file(rng.rand(frame_number, dimension_dict[feature_name]).astype(numpy.float32), in_data_list_dict[feature_name][-1])
+
+  remover = SilenceRemover(n_cmp=3, label_type='state_align')
+  trimmed_data_dict = remover.remove_silence_streams(in_data_list_dict, dimension_dict, align_list)
+  assert sorted(trimmed_data_dict) == ['lf0', 'mgc']
+  for feature_name in dimension_dict:
+    out_list = [file_name + '.trim' for file_name in in_data_list_dict[feature_name]]
+    SilenceRemover(n_cmp=dimension_dict[feature_name], label_type='state_align').remove_silence(in_data_list_dict[feature_name], align_list, out_list)
+    for (trimmed_data, out_file) in zip(trimmed_data_dict[feature_name], out_list):
+      assert trimmed_data.shape[1] == dimension_dict[feature_name]
+      numpy.testing.assert_array_equal(trimmed_data, io_funcs.load_binary_file(out_file, dimension_dict[feature_name]))
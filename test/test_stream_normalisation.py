@@ -0,0 +1,117 @@
+"""Tests per-stream normalisation against the MVN and min-max normalisers.
+"""
+
+import os
+import sys
+import numpy
+import pytest
+# pylint: disable=g-import-not-at-top
+sys.path.append(os.path.join(os.path.dirname(__file__), '../src'))
+from io_funcs.binary_io import BinaryIOCollection
+from frontend.mean_variance_norm import MeanVarianceNorm
+from frontend.min_max_norm import MinMaxNormalisation
+from frontend.stream_normalisation import StreamNormalisation
+
+OUT_DIMENSION_DICT = {'mgc': 4, 'lf0': 2, 'vuv': 1}
+STREAM_METHODS = {'mgc': 'MVN', 'lf0': 'MINMAX', 'vuv': 'none'}
+MVN_COLUMNS = slice(0, 4)
+MINMAX_COLUMNS = slice(4, 6)
+
+
+def write_features(tmp_path, file_number=5, seed=0):
+  """Composed features with a constant MINMAX column and a binary vuv column, and their file list."""
+  io_funcs = BinaryIOCollection()
+  rng = numpy.random.RandomState(seed)
+  file_list = []
+  for i in range(file_number):
+    features = (rng.randn(rng.randint(10, 60), 7) * [1.0, 3.0, 0.1, 20.0, 2.0, 1.0, 1.0] + [0.0, 5.0, -1.0, 100.0, 5.0, 0.0, 0.0])
+    features[:, 5] = 0.5
+    features[:, 6] = rng.rand(features.shape[0]) < 0.6
+    file_list.append(str(tmp_path / ('utt_%d.cmp' % i)))
+    io_funcs.array_to_binary_file(features.astype(numpy.float32), file_list[-1])
+  return file_list
+
+
+def load_files(file_list):
+  io_funcs = BinaryIOCollection()
+  return [io_funcs.load_binary_file(file_name, 7) for file_name in file_list]
+
+
+def test_statistics_file(tmp_path):
+  """Tests saving and loading the statistics, and the errors of files that do not match.
+
+  Args:
+    tmp_path: pytest temporary directory
+  """
+  file_list = write_features(tmp_path)
+  normaliser = StreamNormalisation(OUT_DIMENSION_DICT, STREAM_METHODS, min_value=0.1, max_value=0.9)
+  normaliser.compute_statistics(file_list)
+  norm_info_file = str(tmp_path / 'norm_info.dat')
+  normaliser.save_statistics(norm_info_file)
+
+  loaded_normaliser = StreamNormalisation(OUT_DIMENSION_DICT, STREAM_METHODS).load_statistics(norm_info_file)
+  assert (loaded_normaliser.target_min_value, loaded_normaliser.target_max_value) == (pytest.approx(0.1), pytest.approx(0.9))
+  for name in ['mean_vector', 'std_vector', 'min_vector', 'max_vector']:
+    numpy.testing.assert_array_equal(getattr(loaded_normaliser, name), getattr(normaliser, name).astype(numpy.float32))
+    assert getattr(loaded_normaliser, name).shape == (1, 7)
+
+  ## another method or stream order is another layout
+  with pytest.raises(ValueError, match='layout mismatch'):
+    StreamNormalisation(OUT_DIMENSION_DICT, dict(STREAM_METHODS, lf0='MVN')).load_statistics(norm_info_file)
+  with pytest.raises(ValueError, match='layout mismatch'):
+    StreamNormalisation({'lf0': 2, 'mgc': 4, 'vuv': 1}, STREAM_METHODS).load_statistics(norm_info_file)
+
+  with open(norm_info_file, 'rb') as fid:
+    contents = fid.read()
+  newer_file = str(tmp_path / 'newer.dat')
+  with open(newer_file, 'wb') as fid:
+    fid.write(contents[:8] + numpy.array([2], dtype=numpy.int32).tobytes() + contents[12:])
+  with pytest.raises(ValueError, match='version 2'):
+    StreamNormalisation(OUT_DIMENSION_DICT, STREAM_METHODS).load_statistics(newer_file)
+
+  ## the files of MeanVarianceNorm and MinMaxNormalisation have no header
+  numpy.concatenate((normaliser.mean_vector, normaliser.std_vector), axis=None).astype(numpy.float32).tofile(newer_file)
+  with pytest.raises(ValueError, match='not a stream normalisation file'):
+    StreamNormalisation(OUT_DIMENSION_DICT, STREAM_METHODS).load_statistics(newer_file)
+
+  with pytest.raises(ValueError):
+    StreamNormalisation(OUT_DIMENSION_DICT, dict(STREAM_METHODS, vuv='LOG'))
+
+
+@pytest.mark.parametrize('num_workers', [1, 2])
+def test_stream_normalisation(tmp_path, num_workers):
+  """Tests each stream against its normaliser, and that denormalisation restores the features.
+
+  Args:
+    tmp_path: pytest temporary directory
+    num_workers: worker processes
+  """
+  file_list = write_features(tmp_path)
+  norm_file_list = [file_name + '.norm' for file_name in file_list]
+  denorm_file_list = [file_name + '.denorm' for file_name in file_list]
+  normaliser = StreamNormalisation(OUT_DIMENSION_DICT, STREAM_METHODS)
+  normaliser.compute_statistics(file_list, num_workers=num_workers)
+  normaliser.normalise_data(file_list, norm_file_list, num_workers=num_workers)
+  normaliser.denormalise_data(norm_file_list, denorm_file_list, num_workers=num_workers)
+
+  ## MVN of the MVN streams alone, as the constant column has no std
+  io_funcs = BinaryIOCollection()
+  mvn_in_file_list = [file_name + '.mgc' for file_name in file_list]
+  for (features, mvn_in_file) in zip(load_files(file_list), mvn_in_file_list):
+    io_funcs.array_to_binary_file(features[:, MVN_COLUMNS], mvn_in_file)
+  mvn_file_list = [file_name + '.mvn' for file_name in file_list]
+  MeanVarianceNorm(4).feature_normalisation(mvn_in_file_list, mvn_file_list)
+  min_max_file_list = [file_name + '.minmax' for file_name in file_list]
+  min_max_normaliser = MinMaxNormalisation(7, min_value=0.01, max_value=0.99)
+  min_max_normaliser.find_min_max_values(file_list)
+  min_max_normaliser.normalise_data(file_list, min_max_file_list)
+
+  mvn_features_list = [io_funcs.load_binary_file(file_name, 4) for file_name in mvn_file_list]
+  for (features, norm_features, denorm_features, mvn_features, min_max_features) in zip(
+      load_files(file_list), load_files(norm_file_list), load_files(denorm_file_list), mvn_features_list, load_files(min_max_file_list)):
+    numpy.testing.assert_allclose(norm_features[:, MVN_COLUMNS], mvn_features, rtol=1e-5, atol=1e-5)
+    numpy.testing.assert_allclose(norm_features[:, MINMAX_COLUMNS], min_max_features[:, MINMAX_COLUMNS], rtol=1e-6, atol=1e-6)
+    ## the constant column is at the bottom of the range and vuv is left as it is
+    numpy.testing.assert_array_equal(norm_features[:, 5], numpy.float32(0.01))
+    numpy.testing.assert_array_equal(norm_features[:, 6], features[:, 6])
+    numpy.testing.assert_allclose(denorm_features, features, rtol=1e-5, atol=1e-4)